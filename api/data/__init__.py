@@ -28,3 +28,13 @@ DOC_LENGTH = int(7)
 TIIP_FTP_SERVER = os.environ.get('FTP_SERVER')
 TIIP_FTP_ACC = os.environ.get('TIIP_FTP_ACC')
 TIIP_FTP_PASS = os.environ.get('TIIP_FTP_PASS')
+
+# PDF page extraction
+PDF_POOL_MIN_PAGES = int(os.environ.get('PDF_POOL_MIN_PAGES', 16))
+PDF_POOL_WORKERS = int(os.environ.get('PDF_POOL_WORKERS', os.cpu_count() or 1))
+
+# Streaming loaders
+LOADER_BLOCK_LENGTH = int(20000)
+LOADER_CSV_ROWS = int(500)
+INDEX_BATCH_SIZE = int(os.environ.get('INDEX_BATCH_SIZE', 64))
+SUMMARY_MAX_LENGTH = int(200000)
@@ -9,7 +9,6 @@ import json
 from typing import Iterator, List
 from datetime import datetime, timedelta
 
-import pandas as pd
 from starlette.datastructures import UploadFile
 from colorama import Fore
 from PyPDF2 import PdfReader
@@ -24,6 +23,8 @@ from es import TIIP_INDEX
 from es.elastic import LingtelliElastic
 from data.tiip.doc import TIIPDocument, TIIPDocumentList, DocumentPosSeparatorList, DocumentPosSeparator
 from data.tiip.qa import TIIP_QA_Pair, TIIP_QA_PairList
+from data.pdf_cache import PDFPageCache
+from data.loaders import docx_lines, load_documents
 from data import Q_SEP, A_SEP, DOC_SEP_LIST_1, DOC_SEP_LIST_2, DOC_SEP_LIST_3, DOC_SEP_LIST_4, DOC_LENGTH, TIIP_FTP_SERVER, TIIP_FTP_ACC, TIIP_FTP_PASS
 from settings.settings import DATA_DIR, TIIP_PDF_DIR, TIIP_CSV_DIR, TIIP_DOC_DIR, TEMP_DIR
 from errors.errors import DataError
@@ -45,6 +46,7 @@ class PDFImporter(PdfReader):
         super().__init__(stream, strict, password)
         self.logger = errObj = DataError(__file__, self.__class__.__name__)
         self.source_file = stream
+        self.password = password
         self.page_indexes = {}
         try:
             self._extract_contents(skip_pages)
@@ -62,13 +64,12 @@ class PDFImporter(PdfReader):
         text = ""
         if len(self.pages) > 0:
             if len(self.pages) == 1:
-                page = self.pages[0]
-                text = page.extract_text()
+                text = self._extract_pages([0])[0]
             else:
                 content_length = 0
-                for index, page in enumerate(self.pages[skip_pages:]):
-                    # print("Currently scanning page #{}".format(index))
-                    content = page.extract_text()
+                contents = self._extract_pages(
+                    list(range(skip_pages, len(self.pages))))
+                for index, content in enumerate(contents):
                     if content is not None:
                         content = content.strip("\n").strip()
                         text += content
@@ -81,6 +82,23 @@ class PDFImporter(PdfReader):
 
         self._text = text
 
+    def _extract_pages(self, page_numbers: List[int]) -> List[str | None]:
+        """
+        Returns the extracted text of each page in `page_numbers`.
+        Files given by path go through the on-disk `PDFPageCache` (and a process
+        pool for larger files); anything else is extracted serially.
+        """
+        if isinstance(self.source_file, str) and os.path.isfile(self.source_file):
+            try:
+                cache = PDFPageCache(self.source_file, self.password)
+            except Exception as err:
+                self.logger.msg = "Could NOT initialize page cache for %s!" % self.source_file
+                self.logger.warning(extra_msg=str(err))
+            else:
+                return cache.extract(self, page_numbers)
+
+        return [self.pages[num].extract_text() for num in page_numbers]
+
     @property
     def text(self):
         """
@@ -575,17 +593,10 @@ class CSVLoader(object):
         self.source = os.path.split(file)[1]
         temp_name = os.path.join(TEMP_DIR, self.index, self.source)
 
-        # Retrieve file's content from temp. file
+        # Retrieve file's content from temp. file (streamed row by row, see `data.loaders`)
         try:
-            df = pd.read_csv(temp_name)
-            for stuff in df.iterrows():
-                part_stuff = stuff
-                if isinstance(stuff, tuple):
-                    part_stuff = " ".join(stuff[1].values).replace("\n", "")
-                # self.logger.msg = "Current 'stuff': %s" % str(part_stuff)
-                # self.logger.info()
-                content.append(part_stuff)
-            del df
+            for document in load_documents(temp_name, "csv", values_only=True):
+                content.append(document.page_content)
         except Exception as err:
             self.logger.msg = "Could not create string contents from CSV file!"
             self.logger.error(orgErr=err)
@@ -793,10 +804,10 @@ class WordDocumentReader(object):
         all_text = []
         last_pos = 0
 
-        for par in doc.paragraphs:
-            chunks.append(par.text)
+        for line in docx_lines(doc):
+            chunks.append(line)
 
-            failed_chunks.append(par.text)
+            failed_chunks.append(line)
 
         for index, chunk in enumerate(chunks):
             if index < (len(chunks) - 1):
@@ -891,11 +902,8 @@ File [{TEMP_DIR}/{index}/{Fore.LIGHTRED_EX + file + Fore.RESET}] does not exist!
         """
         Assigns content from `filepath` (.docx file) to attribute `.text`
         """
-        doc = Document(filepath)
-        full_text = []
-        for para in doc.paragraphs:
-            full_text.append(para.text)
-        self.text = '\n'.join(full_text)
+        self.text = '\n'.join(
+            document.page_content.rstrip("\n") for document in load_documents(filepath, "docx"))
 
     def _to_elk_format(self) -> ElasticDoc:
         """
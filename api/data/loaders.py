@@ -0,0 +1,188 @@
+"""
+Module holding the registry of file loaders used when uploading files.
+Every loader is a generator that lazily yields LangChain `Document` objects,
+which are then split and indexed in fixed-size batches. This way, the peak
+memory of an upload is bounded by the batch size instead of the file size.
+"""
+import csv
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+import pandas as pd
+from colorama import Fore
+from docx import Document as DocxDocument
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from langchain.schema import Document
+from langchain.text_splitter import TextSplitter
+from PyPDF2 import PdfReader
+
+from data import LOADER_BLOCK_LENGTH, LOADER_CSV_ROWS, PDF_POOL_MIN_PAGES, PDF_POOL_WORKERS
+from data.pdf_cache import PDFPageCache
+from errors.errors import DataError
+
+LoaderFunc = Callable[..., Iterator[Document]]
+
+LOADERS: dict[str, LoaderFunc] = {}
+
+
+def register_loader(*filetypes: str) -> Callable[[LoaderFunc], LoaderFunc]:
+    """
+    Decorator registering a loader function for one or more filetypes, e.g.:\n
+    `@register_loader("md", "txt")`\n
+    The decorated function takes the filepath as first argument (plus optional
+    keyword arguments) and must return an iterator of `Document` objects.
+    """
+    def decorator(func: LoaderFunc) -> LoaderFunc:
+        for filetype in filetypes:
+            LOADERS[filetype.lower()] = func
+        return func
+    return decorator
+
+
+def get_loader(filetype: str) -> LoaderFunc:
+    """
+    Returns the loader registered for `filetype`.
+    Raises a `DataError` if there is no such loader.
+    """
+    loader = LOADERS.get(filetype.lower(), None)
+    if loader is None:
+        logger = DataError(__file__, "data.loaders:get_loader")
+        logger.msg = "Unable to detect any of the acceptable filetypes!"
+        logger.error(extra_msg="Acceptable filetypes: %s\nReceived: %s" % (
+            ", ".join("." + key for key in LOADERS.keys()),
+            Fore.LIGHTRED_EX + filetype + Fore.RESET))
+        raise logger
+    return loader
+
+
+def load_documents(file: str, filetype: str, **kwargs) -> Iterator[Document]:
+    """
+    Shortcut for `get_loader(filetype)(file, **kwargs)`.
+    """
+    return get_loader(filetype)(file, **kwargs)
+
+
+def split_documents(documents: Iterable[Document], splitter: TextSplitter) -> Iterator[Document]:
+    """
+    Lazily splits each incoming document into chunks with `splitter`.
+    """
+    for document in documents:
+        for chunk in splitter.split_documents([document]):
+            yield chunk
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Yields lists of (at most) `size` items from `iterable`.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _text_blocks(lines: Iterable[str], block_length: int = LOADER_BLOCK_LENGTH) -> Iterator[str]:
+    """
+    Groups lines of text into blocks of roughly `block_length` characters,
+    only ever cutting between lines.
+    """
+    block = []
+    length = 0
+    for line in lines:
+        block.append(line)
+        length += len(line)
+        if length >= block_length:
+            yield "".join(block)
+            block = []
+            length = 0
+    if block:
+        yield "".join(block)
+
+
+@register_loader("csv")
+def load_csv(file: str, content_col: str = None, values_only: bool = False, **kwargs) -> Iterator[Document]:
+    """
+    Yields one document per row.\n
+    Without `content_col`, the content is every `column: value` pair of the row
+    (same format as LangChain's `CSVLoader`). With `content_col`, only that column
+    becomes content and the rest of the columns become metadata (same as `DataFrameLoader`).
+    With `values_only`, the content is the values of the row joined by spaces
+    (format of the legacy `data.importer.CSVLoader`).
+    """
+    if content_col is not None:
+        for frame in pd.read_csv(file, chunksize=LOADER_CSV_ROWS):
+            for _, row in frame.iterrows():
+                metadata = row.to_dict()
+                content = metadata.pop(content_col)
+                yield Document(page_content=str(content), metadata=metadata)
+        return
+
+    with open(file, newline="", encoding="utf-8-sig") as csv_file:
+        for i, row in enumerate(csv.DictReader(csv_file)):
+            if values_only:
+                content = " ".join(str(value) for value in row.values()).replace("\n", "")
+            else:
+                content = "\n".join(
+                    f"{str(key).strip()}: {str(value).strip()}" for key, value in row.items())
+            yield Document(page_content=content, metadata={"source": file, "row": i})
+
+
+def docx_lines(doc: DocxDocument) -> Iterator[str]:
+    """
+    Yields the text of a Word document in reading order: one line per paragraph
+    and one line per table row (cells joined by " | ", merged cells only once).
+    """
+    for child in doc.element.body.iterchildren():
+        if child.tag.endswith("}p"):
+            yield Paragraph(child, doc).text
+        elif child.tag.endswith("}tbl"):
+            for row in Table(child, doc).rows:
+                cells = []
+                for cell in row.cells:
+                    text = cell.text.strip()
+                    # A merged cell is returned once per grid column it spans
+                    if text and (not cells or cells[-1] != text):
+                        cells.append(text)
+                yield " | ".join(cells)
+
+
+@register_loader("docx")
+def load_docx(file: str, **kwargs) -> Iterator[Document]:
+    """
+    Yields blocks of paragraphs and table rows from a Word document.
+    """
+    doc = DocxDocument(file)
+    lines = (line + "\n" for line in docx_lines(doc))
+    for block in _text_blocks(lines):
+        if block.strip():
+            yield Document(page_content=block, metadata={"source": file})
+
+
+@register_loader("pdf")
+def load_pdf(file: str, password: str = None, **kwargs) -> Iterator[Document]:
+    """
+    Yields one document per page, extracting the pages window by window through
+    the on-disk `PDFPageCache` (process pool included).
+    """
+    reader = PdfReader(file, False, password)
+    cache = PDFPageCache(file, password)
+    window = PDF_POOL_MIN_PAGES * max(PDF_POOL_WORKERS, 1)
+    for start in range(0, len(reader.pages), window):
+        page_numbers = list(
+            range(start, min(start + window, len(reader.pages))))
+        for num, text in zip(page_numbers, cache.extract(reader, page_numbers)):
+            if text:
+                yield Document(page_content=text, metadata={"source": file, "page": num})
+
+
+@register_loader("txt")
+def load_txt(file: str, encoding: str = "utf-8", **kwargs) -> Iterator[Document]:
+    """
+    Yields blocks of lines from a plain text file.
+    """
+    with open(file, encoding=encoding) as text_file:
+        for block in _text_blocks(text_file):
+            yield Document(page_content=block, metadata={"source": file})
@@ -0,0 +1,143 @@
+"""
+Module that takes care of extracting the text of PDF files page by page.
+Larger files are spread over a process pool and every extracted page is
+cached on disk, keyed by the file's hash and the page number, so that
+unchanged files never have to be parsed twice.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from colorama import Fore
+from PyPDF2 import PdfReader
+
+from data import PDF_POOL_MIN_PAGES, PDF_POOL_WORKERS
+from errors.errors import DataError
+from settings.settings import PDF_CACHE_DIR
+
+
+def _extract_page_range(filepath: str, password: str, page_numbers: list[int]) -> list[tuple[int, str | None]]:
+    """
+    Worker function for the process pool.
+    Opens its own reader (readers can't be pickled) and extracts the text
+    of each page number in `page_numbers`.
+    """
+    reader = PdfReader(filepath, False, password)
+    return [(num, reader.pages[num].extract_text()) for num in page_numbers]
+
+
+def file_hash(filepath: str) -> str:
+    """
+    Returns the SHA-256 hex digest of the file found at `filepath`.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PDFPageCache(object):
+    """
+    Class keeping track of the extracted text of every page within a PDF file.\n
+    The cache lives in `PDF_CACHE_DIR/<sha256 of file>.json` as:
+    `{"source": <filename>, "pages": {"<page_no>": <text | null>, ...}}`
+    """
+
+    def __init__(self, filepath: str, password: str = None):
+        self.logger = DataError(__file__, self.__class__.__name__)
+        self.filepath = filepath
+        self.password = password
+        self.hash = file_hash(filepath)
+        self.cache_file = os.path.join(PDF_CACHE_DIR, self.hash + ".json")
+        self.pages: dict[int, str | None] = self._load()
+
+    def _load(self) -> dict[int, str | None]:
+        """
+        Loads previously extracted pages (if any) from the cache file.
+        """
+        if not os.path.isfile(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, encoding="utf8") as cache_file:
+                data = json.load(cache_file)
+            return {int(num): text for num, text in data["pages"].items()}
+        except Exception as err:
+            self.logger.msg = "Could NOT load cached pages from [%s]!" % self.cache_file
+            self.logger.warning(extra_msg=str(err))
+            return {}
+
+    def _save(self) -> None:
+        """
+        Writes all known pages into the cache file.
+        The file is written to a temporary file first and then moved into place
+        so that a crash mid-write never leaves a broken cache behind.
+        """
+        if not os.path.isdir(PDF_CACHE_DIR):
+            os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        temp_file = self.cache_file + ".tmp"
+        with open(temp_file, "w", encoding="utf8") as cache_file:
+            json.dump({
+                "source": os.path.split(self.filepath)[1],
+                "pages": {str(num): text for num, text in self.pages.items()}
+            }, cache_file, ensure_ascii=False)
+        os.replace(temp_file, self.cache_file)
+
+    def _extract_parallel(self, page_numbers: list[int]) -> list[tuple[int, str | None]]:
+        """
+        Splits `page_numbers` into one contiguous range per worker and extracts
+        them within a process pool.
+        """
+        workers = min(PDF_POOL_WORKERS, len(page_numbers))
+        size = -(-len(page_numbers) // workers)
+        ranges = [page_numbers[i:i + size]
+                  for i in range(0, len(page_numbers), size)]
+
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for extracted in pool.map(_extract_page_range,
+                                      [self.filepath] * len(ranges),
+                                      [self.password] * len(ranges),
+                                      ranges):
+                results.extend(extracted)
+        return results
+
+    def extract(self, reader: PdfReader, page_numbers: list[int]) -> list[str | None]:
+        """
+        Returns the text of each page in `page_numbers` (in the same order).\n
+        Pages found in the cache are not extracted again; missing pages are
+        extracted across a process pool if there are at least `PDF_POOL_MIN_PAGES`
+        of them, otherwise serially through the already opened `reader`.
+        """
+        missing = [num for num in page_numbers if num not in self.pages]
+
+        if len(missing) == 0:
+            self.logger.msg = "Loaded %s page(s) from " % len(page_numbers) + \
+                Fore.LIGHTGREEN_EX + "cache" + Fore.RESET + "!"
+            self.logger.info(extra_msg="Cache file: %s" % self.cache_file)
+            return [self.pages[num] for num in page_numbers]
+
+        extracted = None
+        if len(missing) >= PDF_POOL_MIN_PAGES and PDF_POOL_WORKERS > 1:
+            try:
+                extracted = self._extract_parallel(missing)
+            except Exception as err:
+                self.logger.msg = "Parallel page extraction failed! Extracting serially instead..."
+                self.logger.warning(extra_msg=str(err))
+        if extracted is None:
+            extracted = [(num, reader.pages[num].extract_text())
+                         for num in missing]
+
+        self.pages.update(extracted)
+        self.logger.msg = "Extracted %s page(s), %s page(s) from cache." % (
+            len(missing), len(page_numbers) - len(missing))
+        self.logger.info()
+
+        try:
+            self._save()
+        except Exception as err:
+            self.logger.msg = "Could NOT save extracted pages into cache!"
+            self.logger.warning(extra_msg=str(err))
+
+        return [self.pages[num] for num in page_numbers]
@@ -13,8 +13,9 @@ class DocumentPosSeparator(object):
     """
 
     def __init__(self, position: Tuple[int, int]):
-        self.logger = DataError(__file__, self.__class__.__name__)
+        # Created in bulk, so the logger is only created when there is something to log
         if not isinstance(position, tuple):
+            self.logger = DataError(__file__, self.__class__.__name__)
             self.logger.msg = "Argument 'position' must be of type {}!".format(
                 type(tuple).__name__)
             self.logger.error(extra_msg="Got type: {}".format(
@@ -34,6 +35,7 @@ class DocumentPosSeparator(object):
 
     def __lt__(self, other):
         if not isinstance(other, DocumentPosSeparator):
+            self.logger = DataError(__file__, self.__class__.__name__)
             self.logger.msg = "Cannot compare {} objects to {} objects!".format(
                 type(other).__name__, self.__class__.__name__)
             self.logger.error()
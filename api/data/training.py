@@ -48,9 +48,12 @@ class OOVService(object):
 
             if req.response.ok:
                 segments = set(req.response.json()["segmentresult"])
-                # 2. Send a similar request to Elasticsearch's /_analyze endpoint
+                # 2. Send the same content to Elasticsearch's /_analyze endpoint,
+                #       line by line in batched requests
                 es = LingtelliElastic()
-                analyzer_segments = es.analyze(text)
+                lines = [line for line in str(req.data).splitlines()
+                         if line.strip()]
+                analyzer_segments = set().union(*es.analyze_batch(lines))
                 # 3. Compare results by figuring out which terms exist in OOV result
                 #       that does not exist in the /_analyze results.
                 results = segments - analyzer_segments
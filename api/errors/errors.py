@@ -1,14 +1,17 @@
+import logging
 import os
-import json
 from datetime import datetime
 from logging import Logger
-from traceback import print_tb, format_tb
+from traceback import format_tb
 from colorama import Fore
 from gettext import gettext as translate
 from typing import Dict
 from stats import COLUMN_NAMES
 
 from settings.settings import BASE_DIR, LOG_DIR
+from errors.logs import get_logger
+from errors.message_log import get_message_log
+from stats.counters import get_stats_counters
 
 
 class BaseError(Exception):
@@ -27,7 +30,24 @@ class BaseError(Exception):
         return self.msg
 
     def _get_logger(self) -> Logger:
-        return Logger(f"{self.file}: {self.cls}")
+        # Module-level (shared) logger, see `errors.logs`
+        return get_logger(self.file)
+
+    def enabled(self, level: int) -> bool:
+        """
+        Whether messages of `level` (e.g. `logging.DEBUG`) are logged at all;
+        check before building expensive messages.
+        """
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, msg: str, *args, extra_msg: str = None, exc_info=None) -> None:
+        """
+        Logs `msg % args` at `level`. The message is only formatted (by the
+        logging thread) if `level` is enabled.
+        """
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, exc_info=exc_info,
+                            extra={"cls": self.cls, "details": extra_msg})
 
     def _get_full_msg(self, level: str | int, extra_msg: str = "") -> None:
         """
@@ -103,38 +123,41 @@ class BaseError(Exception):
     def msg(self):
         self._msg = ""
 
+    def debug(self, extra_msg: str = None) -> None:
+        """
+        Log a message (.msg attribute) with a | DEBUG | tag.
+        """
+        self.details = extra_msg
+        self.log(logging.DEBUG, "%s", self.msg, extra_msg=extra_msg)
+
     def info(self, extra_msg: str = None) -> None:
         """
-        Log a message (.msg attribute) to console preceded with a | INFO | tag.
+        Log a message (.msg attribute) with a | INFO | tag.
         """
-        self._get_full_msg('INFO', extra_msg)
-        print(self._full_msg)
-        self.logger.info(self._full_msg)
+        self.details = extra_msg
+        self.log(logging.INFO, "%s", self.msg, extra_msg=extra_msg)
 
     def warning(self, extra_msg: str = None) -> None:
         """
-        Log a message (.msg attribute) to console preceded with a | WARN | tag.
+        Log a message (.msg attribute) with a | WARN | tag.
         """
-        self._get_full_msg('WARN', extra_msg)
-        self.logger.warning(self._full_msg)
+        self.details = extra_msg
+        self.log(logging.WARNING, "%s", self.msg, extra_msg=extra_msg)
 
     def error(self, extra_msg: str = None, orgErr: Exception = None, save: bool = False) -> None:
         """
-        Log a message (.msg attribute) to console preceded with a | ERROR | tag.
+        Log a message (.msg attribute) with a | ERROR | tag (and the traceback of `orgErr`).
         """
-        if orgErr:
-            self.tb_list = format_tb(orgErr.__traceback__)
-            if extra_msg:
-                extra_msg += "\n" + "".join(msg for msg in self.tb_list)
-            else:
-                extra_msg = "\n" + "".join(msg for msg in self.tb_list)
-
-        self._get_full_msg('ERROR', extra_msg)
-        self.logger.error(self._full_msg)
+        self.details = extra_msg
+        self.log(logging.ERROR, "%s", self.msg, extra_msg=extra_msg, exc_info=(
+            type(orgErr), orgErr, orgErr.__traceback__) if orgErr else None)
 
-        if orgErr:
-            print_tb(orgErr.__traceback__)
         if save:
+            if orgErr:
+                self.tb_list = format_tb(orgErr.__traceback__)
+                extra_msg = (extra_msg or "") + "\n" + \
+                    "".join(msg for msg in self.tb_list)
+            self._get_full_msg('ERROR', extra_msg)
             self._save_log()
 
     def save_log(self, index: str, data: str):
@@ -148,9 +171,9 @@ class BaseError(Exception):
 
     def save_message_log(self, data: dict[str, str]):
         """
-        Save data into a .log file for later reference.
+        Save data into the message log for later reference.
 
-        This will save the log file within './log/<date>.json'
+        This will append a line to './log/<date>.jsonl' (in the background, see `errors.message_log`).
         `data: dict[str, str]` What data (messages) to save into log file.
         Example of data:
         ```python
@@ -163,31 +186,13 @@ class BaseError(Exception):
         }
         ```
         """
-        timestamp = datetime.now().strftime('%Y-%m-%d')
-        file_name = LOG_DIR + f"/{timestamp}.json"
-        folder = os.path.split(file_name)[0]
-        messages = []
         try:
             self.validate_message_data(data)
-            if not os.path.isdir(folder):
-                os.mkdir(folder)
-            else:
-                if os.path.exists(file_name):
-                    with open(file_name) as json_log_file:
-                        messages = json.loads(json_log_file.read())
-
-            messages.append(data)
-
-            with open(file_name, 'w+') as log_file:
-                log_file.write(json.dumps(messages))
+            get_message_log().write(data)
         except Exception as err:
-            self.msg = "Could not save log into .log file!"
+            self.msg = "Could not save message into the message log!"
             self.error(extra_msg=str(err), orgErr=err)
             raise self from err
-        else:
-            self.msg = "Saved file {}".format(
-                os.path.split(file_name)[1]) + Fore.LIGHTGREEN_EX + " successfully" + Fore.RESET + "!"
-            self.info(extra_msg="Saved in path: {}".format(file_name))
 
     def validate_message_data(self, data: dict[str, str]) -> None:
         """
@@ -246,12 +251,13 @@ class ElasticError(BaseError):
 
     def _save_stats(self, data: Dict[str, str]) -> None:
         """
-        Processes and saves data that tells which index the context was derived from (QA / GPT).
+        Processes and saves data that tells which index the context was derived from (QA / GPT),
+        and increments the QA / GPT counters (see `stats.counters`).
         """
         try:
-            full_string = self._build_stats_str(data) + "\n"
-            with open(LOG_DIR + '/stats.csv', "a+") as stats_file:
-                stats_file.write(full_string)
+            full_string = self._build_stats_str(data)
+            get_stats_counters().add(full_string, str(data.get("vendor_id", "")),
+                                     bool(data.get("QA", False)), bool(data.get("GPT", False)))
         except ElasticError as err:
             raise self from err
         except Exception as err:
@@ -0,0 +1,111 @@
+"""
+Module holding the logging setup of the API project.\n
+- Loggers are module-level (`get_logger(__file__)`), so no `logging.Logger` is
+  created per error/logger object.\n
+- Callers only put records on an in-memory queue (`QueueHandler`); a
+  `QueueListener` thread formats them and does the console I/O.\n
+- Records are NOT formatted before being queued: `%`-style arguments and
+  tracebacks are only turned into strings by the listener, and not at all when
+  the level is disabled (`LOG_LEVEL`).\n
+- `LOG_FORMAT=json` writes one JSON object per line; `console` keeps the
+  colored `| LEVEL | time | file | class message` lines.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+from datetime import datetime
+
+from colorama import Fore
+
+from settings.settings import BASE_DIR, LOG_FORMAT, LOG_LEVEL
+
+ROOT_LOGGER = "lingtelli"
+ANSI_CODES = re.compile(r"\x1b\[[0-9;]*m")
+LEVEL_COLORS = {"DEBUG": Fore.LIGHTBLACK_EX, "INFO": Fore.CYAN,
+                "WARNING": Fore.LIGHTYELLOW_EX, "ERROR": Fore.RED, "CRITICAL": Fore.RED}
+
+_listener: logging.handlers.QueueListener | None = None
+_setup_lock = threading.Lock()
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    `QueueHandler` that queues records as they are: the stock handler formats
+    the message (and traceback) in the calling thread before queueing.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "cls": getattr(record, "cls", record.funcName),
+            "msg": ANSI_CODES.sub("", record.getMessage())
+        }
+        details = getattr(record, "details", None)
+        if details:
+            entry["details"] = ANSI_CODES.sub("", str(details))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = LEVEL_COLORS.get(record.levelname, "") + \
+            "| %s | %s | %s | %s" % (record.levelname, datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S"),
+                                    record.name, getattr(record, "cls", record.funcName)) + \
+            Fore.RESET + " " + record.getMessage()
+        details = getattr(record, "details", None)
+        if details:
+            text += "\nDetails:\n" + str(details)
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """
+    Routes the project's loggers through a queue to a listener thread
+    (once per process; called by `get_logger()`).
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JSONFormatter() if fmt ==
+                             "json" else ConsoleFormatter())
+        records: queue.SimpleQueue = queue.SimpleQueue()
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level)
+        root.addHandler(LazyQueueHandler(records))
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(records, handler)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(file: str) -> logging.Logger:
+    """
+    Returns the logger of a module, e.g. `get_logger(__file__)` within
+    'es/lc_service.py' returns the 'lingtelli.es.lc_service' logger.
+    """
+    setup_logging()
+    name = os.path.splitext(file.replace(BASE_DIR, "").strip(os.sep))[
+        0].replace(os.sep, ".")
+    return logging.getLogger(ROOT_LOGGER + "." + name if name else ROOT_LOGGER)
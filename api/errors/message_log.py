@@ -0,0 +1,159 @@
+"""
+Module holding the message log: one JSON line per answered question in
+`./log/<date>.jsonl`.\n
+Records are put on an in-memory queue on the request path and a background
+thread appends them in batches (every `MESSAGE_LOG_FLUSH_INTERVAL` seconds or
+`MESSAGE_LOG_BATCH_SIZE` records). Every batch is ONE `write()` to a file opened
+with `O_APPEND`, so the workers of the API never overwrite each other's lines.\n
+How often the file is fsync'ed is set by `MESSAGE_LOG_FSYNC`:\n
+- `always`: after every batch (nothing acknowledged by the OS is lost on a crash).\n
+- `interval`: at most every `MESSAGE_LOG_FSYNC_INTERVAL` seconds.\n
+- `never`: left to the OS.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Iterator
+
+from settings.settings import LOG_DIR, MESSAGE_LOG_FSYNC, MESSAGE_LOG_FSYNC_POLICIES, MESSAGE_LOG_FSYNC_INTERVAL, MESSAGE_LOG_FLUSH_INTERVAL, MESSAGE_LOG_BATCH_SIZE
+
+# Put on the queue to make the writer flush and stop
+_STOP = None
+
+
+def message_log_file(date: str, log_dir: str = LOG_DIR) -> str:
+    return os.path.join(log_dir, date + ".jsonl")
+
+
+class MessageLogWriter(object):
+    """
+    Buffered, append-only JSONL writer. Use `get_message_log()` to get the
+    process-wide instance.
+    """
+
+    def __init__(self, log_dir: str = LOG_DIR, fsync: str = MESSAGE_LOG_FSYNC,
+                 flush_interval: float = MESSAGE_LOG_FLUSH_INTERVAL, batch_size: int = MESSAGE_LOG_BATCH_SIZE):
+        # Imported here as 'errors.errors' uses this module
+        from errors.errors import LogError
+        self.logger = LogError(__file__, self.__class__.__name__)
+        if fsync not in MESSAGE_LOG_FSYNC_POLICIES:
+            self.logger.msg = "Unknown fsync policy: %s" % fsync
+            self.logger.error(extra_msg="Acceptable: %s" %
+                              ", ".join(MESSAGE_LOG_FSYNC_POLICIES))
+            raise self.logger
+
+        self.log_dir = log_dir
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.last_fsync = time.monotonic()
+        self.records: queue.Queue = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._run, name="message-log", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, data: dict) -> None:
+        """
+        Queues `data` for the log file of today (never blocks on disk).
+        """
+        self.records.put((datetime.now().strftime('%Y-%m-%d'),
+                          json.dumps(data, ensure_ascii=False)))
+
+    def _next_batch(self) -> tuple[list[tuple[str, str]], bool]:
+        """
+        Waits up to `flush_interval` for records and returns them (at most
+        `batch_size`), together with whether the writer was told to stop.
+        """
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                record = self.records.get(
+                    timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if record is _STOP:
+                return batch, True
+            batch.append(record)
+        return batch, False
+
+    def _append(self, batch: list[tuple[str, str]]) -> None:
+        lines: dict[str, list[str]] = {}
+        for date, line in batch:
+            lines.setdefault(date, []).append(line)
+
+        sync = self.fsync == "always" or (self.fsync == "interval" and
+                                          time.monotonic() - self.last_fsync >= MESSAGE_LOG_FSYNC_INTERVAL)
+        os.makedirs(self.log_dir, exist_ok=True)
+        for date, date_lines in lines.items():
+            data = ("\n".join(date_lines) + "\n").encode("utf-8")
+            fd = os.open(message_log_file(date, self.log_dir),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                written = os.write(fd, data)
+                # Regular files only write partially when e.g. the disk is full
+                while written < len(data):
+                    written += os.write(fd, data[written:])
+                if sync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+        if sync:
+            self.last_fsync = time.monotonic()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if len(batch) == 0:
+                continue
+            try:
+                self._append(batch)
+            except Exception as err:
+                self.logger.msg = "Could NOT append %s message(s) to the message log!" % len(
+                    batch)
+                self.logger.error(extra_msg=str(err), orgErr=err)
+
+    def close(self, timeout: float = 10) -> None:
+        """
+        Flushes the queued records and stops the writer.
+        """
+        if self.thread.is_alive():
+            self.records.put(_STOP)
+            self.thread.join(timeout)
+
+
+def iter_messages(file: str) -> Iterator[dict]:
+    """
+    Streams the records of a message log file, line by line. Legacy `.json`
+    files (one JSON list per day) are loaded whole.
+    """
+    with open(file, encoding="utf8") as log_file:
+        if not file.endswith(".jsonl"):
+            data = json.loads(log_file.read())
+            yield from data if isinstance(data, list) else [data]
+            return
+        for line in log_file:
+            # A line can only be incomplete while it is being appended
+            if line.endswith("\n") and line.strip():
+                yield json.loads(line)
+
+
+_writer: MessageLogWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_message_log() -> MessageLogWriter:
+    """
+    Returns the process-wide `MessageLogWriter` (started on first use).
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = MessageLogWriter()
+        return _writer
@@ -15,3 +15,118 @@ MAX_CONTEXT_LENGTH = 800
 TEXT_FIELD_TYPES = ['text', 'keyword']
 NUMBER_FIELD_TYPES = ['long', 'integer', 'short', 'byte',
                       'double', 'float', 'half_float', 'scaled_float', 'unsigned_long']
+
+# Legacy index metadata (LingtelliElastic.known_indices)
+MAPPINGS_TTL = int(os.environ.get("MAPPINGS_TTL", 300))
+LEGACY_INDEX_PATTERNS = ["*", "-.*", "-hist_*",
+                         "-info_*", "-template_*", "-answers_*"]
+MAPPINGS_FILTER_PATH = ["*.mappings._meta.main_field",
+                        "*.mappings.properties.*.type"]
+
+# Analyzer client (LingtelliElastic.analyze)
+ANALYZER_CACHE_SIZE = int(os.environ.get("ANALYZER_CACHE_SIZE", 4096))
+ANALYZER_CACHE_MAX_TEXT = int(2000)
+ANALYZER_POOL_SIZE = int(10)
+ANALYZER_TIMEOUT = int(10)
+# Texts per batched '/_analyze' request (Elasticsearch caps the tokens of one request)
+ANALYZER_BATCH_TEXTS = int(64)
+
+# Vector store (es.vectorstore.LingtelliVectorStore)
+VECTOR_FIELD = "vector"
+VECTOR_TEXT_FIELD = "text"
+VECTOR_METADATA_FIELD = "metadata"
+KNN_HNSW_M = int(16)
+KNN_EF_CONSTRUCTION = int(100)
+KNN_CANDIDATES_FACTOR = int(10)
+KNN_MIN_CANDIDATES = int(50)
+KNN_MAX_CANDIDATES = int(10000)
+
+# Retrieval (es.vectorstore.LingtelliVectorStore): "vector" unless set per vendor
+# in 'template_<vendor_id>' (POST /set-retrieval) or for all vendors with RETRIEVAL_MODE
+RETRIEVAL_MODES = ["vector", "bm25", "hybrid"]
+FUSION_METHODS = ["rrf", "weighted"]
+DEFAULT_RETRIEVAL = {
+    "mode": os.environ.get("RETRIEVAL_MODE", "vector"),
+    "fusion": os.environ.get("RETRIEVAL_FUSION", "rrf"),
+    "vector_weight": float(os.environ.get("RETRIEVAL_VECTOR_WEIGHT", 0.5))
+}
+RETRIEVAL_TTL = int(os.environ.get("RETRIEVAL_TTL", 300))
+RRF_RANK_CONSTANT = int(60)
+HYBRID_CANDIDATES_FACTOR = int(3)
+
+# Quantized vectors: 'byte' (int8) indexed vectors need Elasticsearch >= 8.6
+VECTOR_STORAGE_TYPES = ["float", "byte"]
+VECTOR_STORAGE = os.environ.get("VECTOR_STORAGE", "float")
+VECTOR_FULL_FIELD = "vector_full"
+RESCORE_FACTOR = int(4)
+
+# LLM completion cache (es.llm_cache)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", 1024))
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 86400))
+LLM_CACHE_VERSION_TTL = int(5)
+
+# Prompt assembly (es.prompt.PromptBuilder)
+PROMPT_MODEL = os.environ.get("PROMPT_MODEL", "gpt-3.5-turbo")
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 3000))
+PROMPT_HISTORY_SHARE = float(0.3)
+PROMPT_MIN_TRIM_TOKENS = int(50)
+
+# Answer selection (es.answer_selector), scores on the (1 + cos) / 2 scale
+ANSWER_ACCEPT_SCORE = float(os.environ.get("ANSWER_ACCEPT_SCORE", 0.96))
+ANSWER_REJECT_SCORE = float(os.environ.get("ANSWER_REJECT_SCORE", 0.88))
+ANSWER_MARGIN = float(os.environ.get("ANSWER_MARGIN", 0.01))
+ANSWER_AUDIT_RATE = float(os.environ.get("ANSWER_AUDIT_RATE", 0.05))
+ANSWER_CALIBRATION_PRECISION = float(0.95)
+ANSWER_CALIBRATION_MIN_SAMPLES = int(30)
+ANSWER_CALIBRATION_WINDOW = int(1000)
+ANSWER_CALIBRATION_TTL = int(600)
+
+# Agent toolsets (LingtelliElastic2.generate_index_tools)
+TOOLSET_TTL = int(os.environ.get("TOOLSET_TTL", 3600))
+
+# Agent budget (LingtelliElastic2.answer_agent)
+AGENT_DEADLINE = float(os.environ.get("AGENT_DEADLINE", 20))
+AGENT_MAX_STEPS = int(os.environ.get("AGENT_MAX_STEPS", 3))
+AGENT_PARALLEL_TOOLS = int(4)
+# Share of AGENT_DEADLINE kept for asking the remaining tools in parallel
+AGENT_FANOUT_SHARE = float(0.25)
+AGENT_POOL_SIZE = int(16)
+
+# Translation service (es.translation): distinct texts translated concurrently
+TRANSLATION_WORKERS = int(8)
+TRANSLATION_TIMEOUT = int(120)
+
+# Outbound LLM gateway (es.llm_gateway)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+# Per-model overrides, e.g. "gpt-4=2,text-embedding-ada-002=16"
+LLM_MODEL_CONCURRENCY = {
+    model.strip(): int(limit) for model, limit in (
+        pair.split("=") for pair in os.environ.get("LLM_MODEL_CONCURRENCY", "gpt-4=4").split(",") if "=" in pair)
+}
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 30))
+LLM_HEDGING = os.environ.get("LLM_HEDGING", "1") != "0"
+LLM_HEDGE_MIN_SAMPLES = int(20)
+# Only completions of at most this many tokens are hedged
+LLM_HEDGE_MAX_TOKENS = int(500)
+LLM_LATENCY_WINDOW = int(200)
+LLM_BREAKER_WINDOW = int(20)
+LLM_BREAKER_ERROR_RATE = float(os.environ.get("LLM_BREAKER_ERROR_RATE", 0.5))
+LLM_BREAKER_COOLDOWN = int(os.environ.get("LLM_BREAKER_COOLDOWN", 30))
+LLM_MAX_RETRIES = int(2)
+
+# Embedding backends (es.embeddings); each index records the backend it was built with
+EMBEDDING_BACKENDS = ["openai", "local"]
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "openai")
+# Directory with an ONNX sentence-embedding model ('model_quantized.onnx' or 'model.onnx') and its 'tokenizer.json'
+LOCAL_EMBEDDING_MODEL = os.environ.get("LOCAL_EMBEDDING_MODEL", os.path.join(
+    "data", "models", "paraphrase-multilingual-MiniLM-L12-v2"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.environ.get("LOCAL_EMBEDDING_BATCH_SIZE", 32))
+LOCAL_EMBEDDING_THREADS = int(os.environ.get("LOCAL_EMBEDDING_THREADS", 4))
+LOCAL_EMBEDDING_MAX_LENGTH = int(256)
+EMBEDDING_META_TTL = int(300)
+
+# Shared LLM clients (es.llm_clients) and their HTTP sessions (es.llm_gateway)
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", 60))
+LLM_POOL_CONNECTIONS = int(4)
+LLM_POOL_MAXSIZE = int(16)
@@ -0,0 +1,139 @@
+"""
+Module holding a pooled client for Elasticsearch's `/_analyze` endpoint.
+Results are kept in an LRU cache keyed on `(analyzer, text)` and many texts
+can be analyzed with ONE request by using the `text` array form. Cache hits,
+misses and requests are served on `/metrics` (see `stats.metrics`).
+"""
+import json
+import threading
+from bisect import bisect_right
+
+import requests
+from cachetools import LRUCache
+from colorama import Fore
+from requests.adapters import HTTPAdapter
+
+from errors.errors import ElasticError
+from stats.metrics import ANALYZER_LOOKUPS, ANALYZER_REQUESTS
+from stats.tracing import span
+from . import ELASTIC_IP, ELASTIC_PORT, DEFAULT_ANALYZER, ANALYZER_CACHE_SIZE, ANALYZER_CACHE_MAX_TEXT, ANALYZER_POOL_SIZE, ANALYZER_TIMEOUT, ANALYZER_BATCH_TEXTS
+
+
+def _java_length(text: str) -> int:
+    """
+    Length of `text` in UTF-16 code units, which is what Elasticsearch's
+    token offsets are counted in.
+    """
+    return len(text.encode('utf-16-le')) // 2
+
+
+class AnalyzerClient(object):
+    """
+    Keep-alive client for `/_analyze` with an LRU token cache.\n
+    Use `get_analyzer_client()` to get the process-wide instance.
+    """
+
+    def __init__(self, cache_size: int = ANALYZER_CACHE_SIZE):
+        self.logger = ElasticError(__file__, self.__class__.__name__)
+        self.address = "http://" + ELASTIC_IP + \
+            ':' + str(ELASTIC_PORT) + '/_analyze'
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(
+            pool_connections=1, pool_maxsize=ANALYZER_POOL_SIZE))
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        self.cache: LRUCache = LRUCache(maxsize=cache_size)
+        self.lock = threading.Lock()
+
+    def _post(self, analyzer: str, text: str | list[str]) -> list[dict]:
+        """
+        Sends the actual request and returns the list of tokens.
+        """
+        ANALYZER_REQUESTS.inc()
+        with span("es POST", path="/_analyze", analyzer=analyzer) as current:
+            response = self.session.post(self.address, data=json.dumps(
+                {"analyzer": analyzer, "text": text}), timeout=ANALYZER_TIMEOUT)
+            if current is not None:
+                current.set(status=response.status_code)
+
+        if response.ok:
+            return response.json().get('tokens', [])
+
+        self.logger.msg = "Got a non-200 code from Elasticsearch!"
+        self.logger.error(extra_msg="Got code: {} Reason: {} Content: {}".format(
+            Fore.LIGHTRED_EX + str(response.status_code) + Fore.RESET, response.reason, response.text))
+        raise self.logger
+
+    def _lookup(self, analyzer: str, text: str) -> set | None:
+        with self.lock:
+            tokens = self.cache.get((analyzer, text), None)
+        ANALYZER_LOOKUPS.labels(result="miss" if tokens is None else "hit").inc()
+        return tokens
+
+    def _store(self, analyzer: str, text: str, tokens: set) -> None:
+        if len(text) <= ANALYZER_CACHE_MAX_TEXT:
+            with self.lock:
+                self.cache[(analyzer, text)] = tokens
+
+    def analyze(self, text: str, analyzer: str = DEFAULT_ANALYZER) -> set:
+        """
+        Returns the set of tokens `analyzer` segments `text` into.
+        """
+        tokens = self._lookup(analyzer, text)
+        if tokens is not None:
+            return set(tokens)
+
+        tokens = frozenset(item['token']
+                           for item in self._post(analyzer, text))
+        self._store(analyzer, text, tokens)
+        return set(tokens)
+
+    def analyze_batch(self, texts: list[str], analyzer: str = DEFAULT_ANALYZER) -> list[set]:
+        """
+        Returns one token set per text in `texts`.\n
+        Texts not found in the cache are sent together, `ANALYZER_BATCH_TEXTS` per
+        request (i.e. ONE request for up to that many texts). Elasticsearch
+        returns the tokens of all texts in one list, with offsets that continue
+        from one text to the next (+1 offset gap), so the tokens are assigned back
+        to their texts by their `start_offset`.
+        """
+        results: list[set | None] = [
+            self._lookup(analyzer, text) for text in texts]
+        missing = list(dict.fromkeys(
+            text for text, tokens in zip(texts, results) if tokens is None))
+
+        analyzed = {}
+        for first in range(0, len(missing), ANALYZER_BATCH_TEXTS):
+            batch = missing[first:first + ANALYZER_BATCH_TEXTS]
+            starts = []
+            offset = 0
+            for text in batch:
+                starts.append(offset)
+                offset += _java_length(text) + 1
+
+            token_sets = [set() for _ in batch]
+            for item in self._post(analyzer, batch):
+                token_sets[bisect_right(
+                    starts, item['start_offset']) - 1].add(item['token'])
+
+            for text, tokens in zip(batch, token_sets):
+                analyzed[text] = frozenset(tokens)
+                self._store(analyzer, text, analyzed[text])
+
+        return [set(tokens if tokens is not None else analyzed[text])
+                for text, tokens in zip(texts, results)]
+
+
+_client: AnalyzerClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_analyzer_client() -> AnalyzerClient:
+    """
+    Returns the process-wide `AnalyzerClient` (created on first use).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AnalyzerClient()
+        return _client
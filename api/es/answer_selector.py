@@ -0,0 +1,148 @@
+"""
+Module deciding whether one of the pre-set answers (`answers_<vendor_id>`) answers
+a question, based on the similarity scores alone whenever they are decisive:\n
+- `accept`: the top hit scores above the accept threshold AND beats the second hit
+  by at least the margin -> the top answer is returned directly.\n
+- `reject`: the top hit scores below the reject threshold -> no answer.\n
+- `judge`: anything in between is left to the LLM judge (as well as a random
+  `ANSWER_AUDIT_RATE` of the decisive cases, so that calibration keeps getting data).\n
+Every judge verdict is logged (with the scores it was given) into
+`log/answers/<vendor_id>.jsonl`, and the thresholds of each vendor are calibrated
+from its most recent verdicts once there are enough of them.
+"""
+import json
+import os
+import random
+import threading
+from collections import deque
+from datetime import datetime
+
+from cachetools import TTLCache
+
+from errors.errors import ElasticError
+from settings.settings import LOG_DIR
+from . import ANSWER_AUDIT_RATE, ANSWER_ACCEPT_SCORE, ANSWER_REJECT_SCORE, ANSWER_MARGIN, ANSWER_CALIBRATION_PRECISION, ANSWER_CALIBRATION_MIN_SAMPLES, ANSWER_CALIBRATION_WINDOW, ANSWER_CALIBRATION_TTL
+
+ANSWER_LOG_DIR = os.path.join(LOG_DIR, "answers")
+
+_thresholds: TTLCache = TTLCache(maxsize=1024, ttl=ANSWER_CALIBRATION_TTL)
+_thresholds_lock = threading.Lock()
+
+
+def _log_file(vendor_id: str) -> str:
+    return os.path.join(ANSWER_LOG_DIR, vendor_id + ".jsonl")
+
+
+def record_verdict(vendor_id: str, scores: list[float], choice: int) -> None:
+    """
+    Logs the verdict of the LLM judge: `choice` is the index of the chosen answer
+    (`-1` if none) among the hits with `scores` (best first).
+    """
+    try:
+        os.makedirs(ANSWER_LOG_DIR, exist_ok=True)
+        with open(_log_file(vendor_id), "a", encoding="utf8") as log_file:
+            log_file.write(json.dumps({
+                "timestamp": datetime.now().astimezone().isoformat(),
+                "scores": [round(score, 6) for score in scores],
+                "choice": choice
+            }) + "\n")
+    except Exception as err:
+        logger = ElasticError(__file__, "es.answer_selector:record_verdict")
+        logger.msg = "Could NOT log the verdict of the answer judge!"
+        logger.warning(extra_msg=str(err))
+
+
+def load_verdicts(vendor_id: str, window: int = ANSWER_CALIBRATION_WINDOW) -> list[dict]:
+    """
+    Returns the (at most `window`) most recent verdicts logged for `vendor_id`.
+    """
+    if not os.path.isfile(_log_file(vendor_id)):
+        return []
+    with open(_log_file(vendor_id), encoding="utf8") as log_file:
+        lines = deque(log_file, maxlen=window)
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def calibrate(verdicts: list[dict], precision: float = ANSWER_CALIBRATION_PRECISION,
+              min_samples: int = ANSWER_CALIBRATION_MIN_SAMPLES) -> dict[str, float]:
+    """
+    Derives the thresholds from logged verdicts:\n
+    - `accept`: the lowest top score above which (with enough margin) the judge
+      picked the top answer in at least `precision` of the cases.\n
+    - `reject`: the highest top score below which the judge picked nothing in at
+      least `precision` of the cases.\n
+    A threshold is only moved away from its default when at least `min_samples`
+    verdicts back it up, and `reject` always stays below `accept`.
+    """
+    thresholds = {"accept": ANSWER_ACCEPT_SCORE,
+                  "reject": ANSWER_REJECT_SCORE, "margin": ANSWER_MARGIN}
+    samples = [(verdict["scores"][0],
+                verdict["scores"][0] - (verdict["scores"][1]
+                                        if len(verdict["scores"]) > 1 else 0.0),
+                verdict["choice"])
+               for verdict in verdicts if verdict.get("scores")]
+
+    # Walk down from the best top score while the judge keeps agreeing
+    accepted = total = 0
+    for top, margin, choice in sorted(samples, key=lambda sample: sample[0], reverse=True):
+        if margin < thresholds["margin"]:
+            continue
+        total += 1
+        accepted += choice == 0
+        if accepted / total < precision:
+            break
+        if total >= min_samples:
+            thresholds["accept"] = top
+
+    # Walk up from the worst top score while the judge keeps rejecting
+    rejected = total = 0
+    for top, _, choice in sorted(samples, key=lambda sample: sample[0]):
+        total += 1
+        rejected += choice == -1
+        if rejected / total < precision:
+            break
+        if total >= min_samples:
+            thresholds["reject"] = top
+
+    thresholds["reject"] = min(thresholds["reject"], thresholds["accept"])
+    return thresholds
+
+
+def get_thresholds(vendor_id: str) -> dict[str, float]:
+    """
+    Returns the (cached) calibrated thresholds of `vendor_id`.
+    """
+    with _thresholds_lock:
+        if vendor_id in _thresholds:
+            return _thresholds[vendor_id]
+
+    try:
+        thresholds = calibrate(load_verdicts(vendor_id))
+    except Exception as err:
+        logger = ElasticError(__file__, "es.answer_selector:get_thresholds")
+        logger.msg = "Could NOT calibrate answer thresholds of [%s]! Using defaults..." % vendor_id
+        logger.warning(extra_msg=str(err))
+        thresholds = {"accept": ANSWER_ACCEPT_SCORE,
+                      "reject": ANSWER_REJECT_SCORE, "margin": ANSWER_MARGIN}
+
+    with _thresholds_lock:
+        _thresholds[vendor_id] = thresholds
+    return thresholds
+
+
+def decide(vendor_id: str, scores: list[float]) -> str:
+    """
+    Returns `'accept'`, `'reject'` or `'judge'` for hits with `scores` (best first).
+    """
+    if len(scores) == 0:
+        return "reject"
+    thresholds = get_thresholds(vendor_id)
+    top = scores[0]
+    margin = top - scores[1] if len(scores) > 1 else top
+    if top >= thresholds["accept"] and margin >= thresholds["margin"]:
+        decision = "accept"
+    elif top < thresholds["reject"]:
+        decision = "reject"
+    else:
+        return "judge"
+    return "judge" if random.random() < ANSWER_AUDIT_RATE else decision
@@ -0,0 +1,244 @@
+"""
+Benchmarks for the vector store. Random unit vectors are used as documents
+and queries, so no OpenAI calls are made.\n
+- `latency`: brute-force `script_score` vs native `knn` search (p50/p99) at
+  different corpus sizes.\n
+- `quantization`: 'float' vs 'byte' vector storage (disk size, vector RAM and
+  recall@k with and without rescoring).\n
+- `embeddings`: query latency (p50/p95) and bulk throughput of every embedding
+  backend that can be loaded (this one DOES call OpenAI for the 'openai' backend).
+
+Usage:
+`python -m es.benchmark latency --sizes 10000 100000 1000000 --queries 200`
+`python -m es.benchmark quantization --sizes 100000 -k 10`
+`python -m es.benchmark embeddings --queries 50 --sizes 1000`
+"""
+import argparse
+import time
+
+import numpy as np
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk
+
+from errors.errors import ElasticError
+from es.embeddings import get_embeddings
+from es.vectorstore import LingtelliVectorStore, get_client, knn_mapping, plain_mapping, num_candidates, quantize, encode_vector
+from . import VECTOR_FIELD, VECTOR_TEXT_FIELD, VECTOR_METADATA_FIELD, VECTOR_FULL_FIELD, EMBEDDING_BACKENDS
+
+BENCHMARK_PREFIX = "benchmark_vectors"
+
+# Typical questions / chunks, numbered so that no two texts are the same
+SAMPLE_TEXTS = [
+    "請問你們的營業時間是幾點到幾點？",
+    "退貨需要在收到商品後幾天內申請？",
+    "本產品保固期間為一年，保固期間內非人為損壞可免費維修。",
+    "How long does shipping to Taichung usually take?",
+    "The membership fee is charged monthly and can be cancelled at any time.",
+]
+
+
+def random_vectors(num: int, dims: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Returns `num` random vectors of length 1 (as OpenAI embeddings are).
+    """
+    vectors = rng.standard_normal((num, dims), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def clustered_vectors(num: int, dims: int, rng: np.random.Generator, centers: np.ndarray) -> np.ndarray:
+    """
+    Returns `num` unit vectors scattered around random `centers`, which (unlike
+    uniformly random vectors) have meaningful nearest neighbours, like real embeddings.
+    """
+    picked = centers[rng.integers(0, len(centers), num)]
+    vectors = picked + 0.5 * random_vectors(num, dims, rng)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def generate_batches(size: int, dims: int, seed: int, batch: int = 1000, centers: np.ndarray = None):
+    """
+    Yields `(first id, vectors)` batches of `size` random vectors in total.
+    The same `seed` always results in the same vectors.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, size, batch):
+        num = min(batch, size - start)
+        yield start, random_vectors(num, dims, rng) if centers is None else clustered_vectors(num, dims, rng, centers)
+
+
+def fill_index(client: Elasticsearch, index: str, mapping: dict, size: int, dims: int, seed: int, centers: np.ndarray = None) -> None:
+    """
+    (Re-)creates `index` and bulk-indexes `size` random vectors into it.
+    Indices with 'byte' vectors get the same documents as `LingtelliVectorStore` would index.
+    """
+    client.indices.delete(index=index, ignore_unavailable=True)
+    client.indices.create(index=index, mappings=mapping,
+                          settings={"number_of_replicas": 0, "refresh_interval": -1})
+    uses_bytes = mapping["properties"][VECTOR_FIELD].get(
+        "element_type", "float") == "byte"
+    for start, vectors in generate_batches(size, dims, seed, centers=centers):
+        bulk(client, ({
+            "_index": index,
+            "_id": start + i,
+            VECTOR_TEXT_FIELD: "doc %s" % (start + i),
+            VECTOR_METADATA_FIELD: {},
+            **({VECTOR_FIELD: quantize(vector), VECTOR_FULL_FIELD: encode_vector(vector)}
+               if uses_bytes else {VECTOR_FIELD: vector.tolist()})
+        } for i, vector in enumerate(vectors)))
+    client.indices.put_settings(index=index, settings={"refresh_interval": "1s"})
+    client.indices.refresh(index=index)
+    client.indices.forcemerge(index=index, max_num_segments=1)
+
+
+def time_queries(client: Elasticsearch, index: str, queries: np.ndarray, k: int, use_knn: bool) -> np.ndarray:
+    """
+    Runs every query against `index` and returns the latencies in milliseconds.
+    """
+    latencies = []
+    for query in queries:
+        if use_knn:
+            body = {"knn": {"field": VECTOR_FIELD, "query_vector": query.tolist(),
+                            "k": k, "num_candidates": num_candidates(k)}}
+        else:
+            body = {"query": {"script_score": {
+                "query": {"match_all": {}},
+                "script": {
+                    "source": "(cosineSimilarity(params.query_vector, '%s') + 1.0) / 2.0" % VECTOR_FIELD,
+                    "params": {"query_vector": query.tolist()}
+                }
+            }}}
+        start = time.perf_counter()
+        client.search(index=index, size=k, source=False, **body)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def exact_neighbours(queries: np.ndarray, size: int, dims: int, seed: int, k: int, centers: np.ndarray) -> list[set[str]]:
+    """
+    Brute-forces the true `k` nearest neighbours (ids) of every query, batch by batch.
+    """
+    best_scores = np.full((len(queries), k), -np.inf)
+    best_ids = np.zeros((len(queries), k), dtype=np.int64)
+    for start, vectors in generate_batches(size, dims, seed, centers=centers):
+        scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(
+            np.arange(start, start + len(vectors)), (len(queries), len(vectors)))], axis=1)
+        top = np.argsort(-scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return [set(str(_id) for _id in row) for row in best_ids]
+
+
+def vector_usage(client: Elasticsearch, index: str) -> tuple[int, int]:
+    """
+    Returns the disk size of `index` and the size of its kNN vector files
+    (what has to fit in the page cache for fast searches), both in bytes.
+    """
+    size = client.indices.stats(index=index, metric="store")[
+        "indices"][index]["primaries"]["store"]["size_in_bytes"]
+    usage = client.indices.disk_usage(index=index, run_expensive_tasks=True)
+    vectors = usage[index]["fields"].get(VECTOR_FIELD, {}).get(
+        "knn_vectors_in_bytes", 0)
+    return size, vectors
+
+
+def run_quantization(sizes: list[int], dims: int, num_queries: int, k: int, keep: bool) -> None:
+    client = get_client().options(request_timeout=3600)
+    rng = np.random.default_rng(0)
+    centers = random_vectors(100, dims, rng)
+    queries = clustered_vectors(num_queries, dims, rng, centers)
+
+    print("%10s | %-14s | %10s | %12s | %10s" %
+          ("chunks", "storage", "disk (MB)", "vectors (MB)", "recall@%s" % k))
+    print("-" * 68)
+    for size in sizes:
+        truth = exact_neighbours(queries, size, dims, size, k, centers)
+        for storage in ["float", "byte"]:
+            index = "_".join([BENCHMARK_PREFIX, storage, str(size)])
+            fill_index(client, index, knn_mapping(dims, storage),
+                       size, dims, seed=size, centers=centers)
+            disk, vectors = vector_usage(client, index)
+            for rescore in ([False, True] if storage == "byte" else [False]):
+                store = LingtelliVectorStore(
+                    index, None, client=client, rescore=rescore)
+                recall = np.mean([len(truth[i] & set(hit["_id"] for hit in store._search_vector(
+                    query.tolist(), k))) / k for i, query in enumerate(queries)])
+                print("%10s | %-14s | %10.1f | %12.1f | %10.3f" % (
+                    size, storage + (" + rescore" if rescore else ""), disk / 2**20, vectors / 2**20, recall))
+            if not keep:
+                client.indices.delete(index=index)
+
+
+def run_latency(sizes: list[int], dims: int, num_queries: int, k: int, keep: bool) -> None:
+    client = get_client().options(request_timeout=3600)
+    queries = random_vectors(num_queries, dims, np.random.default_rng(0))
+
+    print("%10s | %-12s | %10s | %10s" % ("chunks", "search", "p50 (ms)", "p99 (ms)"))
+    print("-" * 52)
+    for size in sizes:
+        for name, mapping, use_knn in [("script_score", plain_mapping(dims), False), ("knn", knn_mapping(dims), True)]:
+            index = "_".join([BENCHMARK_PREFIX, name, str(size)])
+            fill_index(client, index, mapping, size, dims, seed=size)
+            # Warm up caches (and load the HNSW graph) before measuring
+            time_queries(client, index, queries[:10], k, use_knn)
+            latencies = time_queries(client, index, queries, k, use_knn)
+            print("%10s | %-12s | %10.1f | %10.1f" % (size, name, np.percentile(
+                latencies, 50), np.percentile(latencies, 99)))
+            if not keep:
+                client.indices.delete(index=index)
+
+
+def sample_texts(num: int) -> list[str]:
+    return ["%s (%s)" % (SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)], i) for i in range(num)]
+
+
+def run_embeddings(num_queries: int, num_docs: int) -> None:
+    print("%-8s | %6s | %10s | %10s | %12s" %
+          ("backend", "dims", "p50 (ms)", "p95 (ms)", "docs / s"))
+    print("-" * 58)
+    for backend in EMBEDDING_BACKENDS:
+        try:
+            embeddings = get_embeddings(backend)
+            dims = len(embeddings.embed_query(SAMPLE_TEXTS[0]))
+        except ElasticError as err:
+            print("%-8s | skipped: %s" % (backend, err.msg))
+            continue
+
+        latencies = []
+        for query in sample_texts(num_queries):
+            start = time.perf_counter()
+            embeddings.embed_query(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        docs = sample_texts(num_docs)
+        start = time.perf_counter()
+        embeddings.embed_documents(docs)
+        throughput = num_docs / (time.perf_counter() - start)
+        print("%-8s | %6s | %10.1f | %10.1f | %12.1f" % (backend, dims, np.percentile(
+            latencies, 50), np.percentile(latencies, 95), throughput))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares p50/p99 latency of 'script_score' and 'knn' vector search ('latency') "
+                    "or disk size, vector RAM and recall of 'float' and 'byte' vectors ('quantization') "
+                    "or latency and throughput of the embedding backends ('embeddings').")
+    parser.add_argument("benchmark", nargs="?", choices=["latency", "quantization", "embeddings"], default="latency",
+                        help="Benchmark to run.")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10000, 100000, 1000000], help="Number of chunks per index (embeddings: texts embedded in bulk).")
+    parser.add_argument("--dims", type=int, default=1536,
+                        help="Vector dimensions (1536 for OpenAI embeddings).")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="Number of measured queries per index.")
+    parser.add_argument("-k", type=int, default=4,
+                        help="Number of hits per query.")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the benchmark indices afterwards.")
+    args = parser.parse_args()
+    if args.benchmark == "embeddings":
+        run_embeddings(args.queries, args.sizes[0])
+    elif args.benchmark == "quantization":
+        run_quantization(args.sizes, args.dims, args.queries, args.k, args.keep)
+    else:
+        run_latency(args.sizes, args.dims, args.queries, args.k, args.keep)
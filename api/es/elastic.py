@@ -2,13 +2,16 @@
 # managing the data flow between API and Elasticsearch server.
 import time
 import json
+import heapq
+import threading
 from pprint import pprint
 from colorama import Fore
 from datetime import datetime
 from typing import Any, List, Dict
 
+import numpy as np
 import requests
-from elasticsearch import Elasticsearch
+from cachetools import TTLCache
 from elasticsearch.exceptions import ApiError
 
 from params.definitions import ElasticDoc, SearchDocTimeRange, SearchDocument,\
@@ -17,12 +20,23 @@ from errors.errors import ElasticError
 from helpers.times import check_timestamp, get_tz, date_to_str
 from helpers.helpers import get_language, get_synonymns
 from helpers import TODAY
+from es.analyzer import get_analyzer_client
+from es.traced_client import TracedElasticsearch
 from es.query import QueryMaker
 from es.gpt3 import GPT3Request
 from . import ELASTIC_IP, ELASTIC_PORT, DEFAULT_ANALYZER, OLD_ANALYZER, OLD_ANALYZER_NAME, OLD_SEARCH_ANALYZER, MIN_DOC_SCORE, MIN_QA_DOC_SCORE, MAX_CONTEXT_LENGTH, TEXT_FIELD_TYPES, NUMBER_FIELD_TYPES
+from . import MAPPINGS_TTL, LEGACY_INDEX_PATTERNS, MAPPINGS_FILTER_PATH
 
+# Process-wide cache of 'known_indices', shared by all LingtelliElastic objects.
+# Refreshes swap in a new dict, so readers never see one being updated.
+_known_indices: dict[str, dict[str, str]] | None = None
+_known_indices_expire: float = 0.0
+_known_indices_lock = threading.RLock()
+# Indices looked up without a (legacy) mapping, so they aren't fetched again on every request
+_missing_indices: TTLCache = TTLCache(maxsize=1024, ttl=MAPPINGS_TTL)
 
-class LingtelliElastic(Elasticsearch):
+
+class LingtelliElastic(TracedElasticsearch):
     def __init__(self):
         self.logger = ElasticError(__file__, self.__class__.__name__, msg="Initializing Elasticsearch client at: {}:{}".format(
             ELASTIC_IP, ELASTIC_PORT))
@@ -227,7 +241,7 @@ class LingtelliElastic(Elasticsearch):
                         "\nDetails: %s" % response.content.decode()
 
                 self.logger.info(extra_msg=extra_msg)
-                self._get_mappings()
+                self._get_mappings(index)
 
                 return
 
@@ -262,61 +276,18 @@ class LingtelliElastic(Elasticsearch):
     def _get_gpt_context(self, hits: List | Dict) -> str:
         """
         Method for extracting context for GPT service.
+        The selected (normalized) scores are kept in `self.score_data`.
         """
-        # Here we create a temporary function that we use
-        # to filter low score documents out.
-
-        # Grab average length first for normalizing later
-        avg_length = sum([len(hit["source"]["context"])
-                         for hit in hits]) / len(hits)
-
-        # To calculate a normalized score, we need to use a function we can use with map().
-        def normalize_score(doc):
-            doc["score"] = round(doc["score"] *
-                                 (avg_length / len(doc["source"]["context"])), 2)
-            return doc
-
-        # Define the function provided to map() function below.
-        def filter_context(doc):
-            if doc["score"] >= MIN_DOC_SCORE:
-                if doc["score"] > 10 and not self.gpt3_strict:
-                    self.logger.msg = "Score" + Fore.LIGHTGREEN_EX + "> 10" + Fore.RESET + "found!"
-                    self.logger.info()
-                    self.gpt3_strict = True
-                return doc
-
         context = ""
         if isinstance(hits, list):
-            # Turning the irrelevant (low score) documents into 'None'.
-            try:
-                hits = map(normalize_score, hits)
-                hits = sorted(hits, key=lambda hit: hit["score"], reverse=True)
-            except Exception as err:
-                self.logger.msg = "Could NOT normalize scores for fetched documents!"
-                self.logger.warning(extra_msg=str(err))
-            else:
-                self.score_data = [doc["score"] for doc in hits]
-                self.logger.msg = "Normalized scores: %s" % str(
-                    self.score_data)
-                self.logger.info(extra_msg="Max: " + Fore.LIGHTGREEN_EX + str(max(self.score_data)) +
-                                 Fore.RESET + "\nMin: " + Fore.LIGHTRED_EX + str(min(self.score_data)) + Fore.RESET)
-
+            if len(hits) == 0:
+                return context
             try:
-                hits = map(filter_context, hits)
+                context, self.score_data = self._select_context(hits)
             except Exception as err:
-                self.logger.msg = "Could NOT filter documents properly!"
+                self.logger.msg = "Could NOT select context from fetched documents!"
                 self.logger.warning(extra_msg=str(err))
 
-            # Then we remove those 'None' values, leaving only relevant documents.
-            hits = [hit for hit in hits if hit]
-            for hit in hits:
-                if (len(context) + len(hit["source"]["context"])) <= MAX_CONTEXT_LENGTH:
-                    context += hit["source"]["context"]
-                    if '\"' in context:
-                        context = context.replace('\"', '')
-                else:
-                    break
-
         elif isinstance(hits, dict):
             if (len(context) + len(hits["source"]["context"]) <= MAX_CONTEXT_LENGTH) and (hits.get('score', None)):
                 if hits['score'] >= MIN_DOC_SCORE:
@@ -326,32 +297,120 @@ class LingtelliElastic(Elasticsearch):
 
         return context
 
-    def _get_mappings(self) -> None:
+    def _select_context(self, hits: list[dict]) -> tuple[str, np.ndarray]:
         """
-        Method that simply makes a request to 'elastic_server:9200/_mapping'
-        and organizes the response into the attribute 'known_indices'.
+        Vectorized scorer for the GPT context:\n
+        1. Normalizes all scores by document length at once
+        (`score * avg_length / length`, rounded to 2 decimals).\n
+        2. Drops documents scoring below `MIN_DOC_SCORE`.\n
+        3. Pops the best documents off a heap until the next one would
+        exceed `MAX_CONTEXT_LENGTH`.\n
+        Returns the context (joined once) and the array of the selected scores.
         """
-        address = "http://" + ELASTIC_IP + \
-            ":" + str(ELASTIC_PORT) + "/_mapping"
-        try:
-            resp = requests.get(address)
-        except ConnectionRefusedError as err:
-            self.logger.msg = "Connection refused when trying to get [%s]!" % address
-            self.logger.error(extra_msg=str(err), orgErr=err)
-            raise self.logger from err
-        except Exception as err:
-            self.logger.msg = "Unknown error when trying to get [%s]!" % address
-            self.logger.error(extra_msg=str(err), orgErr=err)
-            raise self.logger from err
-        else:
-            if not resp.ok:
+        texts = [hit["source"]["context"].replace('"', '') for hit in hits]
+        lengths = np.fromiter((len(hit["source"]["context"]) for hit in hits),
+                              dtype=np.float64, count=len(hits))
+        scores = np.fromiter((hit["score"] for hit in hits),
+                             dtype=np.float64, count=len(hits))
+        normalized = np.round(
+            scores * (lengths.mean() / np.maximum(lengths, 1)), 2)
+
+        self.logger.msg = "Normalized scores: %s" % str(normalized.tolist())
+        self.logger.info(extra_msg="Max: " + Fore.LIGHTGREEN_EX + str(normalized.max()) +
+                         Fore.RESET + "\nMin: " + Fore.LIGHTRED_EX + str(normalized.min()) + Fore.RESET)
+
+        candidates = np.flatnonzero(normalized >= MIN_DOC_SCORE)
+        if not self.gpt3_strict and (normalized[candidates] > 10).any():
+            self.logger.msg = "Score" + Fore.LIGHTGREEN_EX + "> 10" + Fore.RESET + "found!"
+            self.logger.info()
+            self.gpt3_strict = True
+
+        # Ties are popped in their original (ES) order, just like a stable sort.
+        heap = [(-normalized[i], i) for i in candidates]
+        heapq.heapify(heap)
+        selected = []
+        length = 0
+        while heap:
+            _, i = heapq.heappop(heap)
+            if length + len(texts[i]) > MAX_CONTEXT_LENGTH:
+                break
+            selected.append(i)
+            length += len(texts[i])
+
+        return "".join(texts[i] for i in selected), normalized[selected]
+
+    def _get_mappings(self, index: str | list[str] = None) -> None:
+        """
+        Method that organizes the mappings of the legacy indices into the attribute 'known_indices'.\n
+        The result is cached process-wide for `MAPPINGS_TTL` seconds and only the
+        index patterns in `LEGACY_INDEX_PATTERNS` are fetched (with a `filter_path`
+        so that only the fields we look at are returned).\n
+        `index: str | list[str]` If provided, only the mappings of this/these
+        index/indices are fetched and merged into the cache (incremental refresh).
+        """
+        global _known_indices, _known_indices_expire
+
+        with _known_indices_lock:
+            if index is None and _known_indices is not None and time.time() < _known_indices_expire:
+                return
+
+            try:
+                mappings = self.indices.get_mapping(
+                    index=index if index is not None else LEGACY_INDEX_PATTERNS,
+                    filter_path=MAPPINGS_FILTER_PATH,
+                    ignore_unavailable=True,
+                    allow_no_indices=True).body
+            except ApiError as err:
                 self.logger.msg = "ELK server responded with code " + \
-                    Fore.LIGHTRED_EX + resp.status_code + Fore.RESET + "!"
-                self.logger.error()
-                raise self.logger
+                    Fore.LIGHTRED_EX + str(err.status_code) + Fore.RESET + "!"
+                self.logger.error(extra_msg=str(err), orgErr=err)
+                raise self.logger from err
+            except Exception as err:
+                self.logger.msg = "Unknown error when trying to get mappings!"
+                self.logger.error(extra_msg=str(err), orgErr=err)
+                raise self.logger from err
+
+            final_mapping = self._parse_mappings(mappings)
+
+            if index is None:
+                _known_indices = final_mapping
+                _known_indices_expire = time.time() + MAPPINGS_TTL
+                _missing_indices.clear()
+            else:
+                _known_indices = {**(_known_indices or {}), **final_mapping}
+                for name in [index] if isinstance(index, str) else index:
+                    if name in final_mapping:
+                        _missing_indices.pop(name, None)
+                    else:
+                        _missing_indices[name] = True
+
+        self.logger.msg = "Mapping loading: " + \
+            Fore.LIGHTGREEN_EX + "SUCCESS" + Fore.RESET + "!"
+        self.logger.info(extra_msg="Indices: %s" % (
+            "ALL" if index is None else str(index)))
+
+    @property
+    def known_indices(self) -> dict[str, dict[str, str]]:
+        """
+        Snapshot of the process-wide `{<index>: {"context": <main field>}}` cache.
+        """
+        return _known_indices or {}
 
-            mappings = json.loads((resp.content.decode('utf-8')))
+    def _resolve_mappings(self, indices: list[str]) -> None:
+        """
+        Fetches the mappings of those `indices` that are neither cached nor known
+        to be missing, with ONE request (none at all on a warm cache).
+        """
+        unknown = [index for index in dict.fromkeys(indices)
+                   if index not in self.known_indices and index not in _missing_indices]
+        if len(unknown) > 0:
+            self._get_mappings(unknown)
 
+    def _parse_mappings(self, mappings: dict) -> dict[str, dict[str, str]]:
+        """
+        Turns the (filtered) response of `GET <indices>/_mapping` into
+        `{<index>: {"context": <main field>}}`.
+        """
         final_mapping = {}
         for index in mappings.keys():
             if len(mappings[index].keys()) > 0:
@@ -378,17 +437,15 @@ class LingtelliElastic(Elasticsearch):
                     extra_msg='Mapping keys: [%s]' % str(mappings[index].keys()))
                 continue
 
-        self.logger.msg = "Mapping loading: " + \
-            Fore.LIGHTGREEN_EX + "SUCCESS" + Fore.RESET + "!"
-        self.logger.info()
-
-        self.known_indices = final_mapping
+        return final_mapping
 
     def _get_query(self, doc: SearchDocTimeRange | SearchDocument | SearchPhraseDoc) -> dict:
         """
         Method that creates query objects (QueryMaker) to easen the process of
         creating correct queries on-the-fly.
         """
+        # Index created by another process after our cache was filled?
+        self._resolve_mappings([doc.vendor_id])
         queryObj = QueryMaker(self.known_indices)
         if isinstance(doc, SearchDocTimeRange):
             queryObj.create_query_from_timestamps(doc.start, doc.end)
@@ -467,25 +524,15 @@ class LingtelliElastic(Elasticsearch):
         """
         Method meant to be used as a shortcut for requesting
         segmented results from Elasticsearch analyzers.
+        Goes through the pooled & cached `AnalyzerClient`.
         """
-        data = {
-            "analyzer": analyzer,
-            "text": text
-        }
-        json_data = json.dumps(data)
-        response = requests.post("http://" +
-                                 ELASTIC_IP + ':' + str(ELASTIC_PORT) + '/_analyze', data=json_data, headers={"Content-Type": "application/json"})
-
-        if response.ok:
-            json_resp = response.json()
-            if json_resp.get('tokens', None):
-                return set([item['token']
-                            for item in json_resp['tokens']])
+        return get_analyzer_client().analyze(text, analyzer)
 
-        self.logger.msg = "Got a non-200 code from Elasticsearch!"
-        self.logger.error(extra_msg="Got code: {} Reason: {} Content: {}".format(
-            Fore.LIGHTRED_EX + str(response.status_code) + Fore.RESET, response.reason, response.text))
-        raise self.logger
+    def analyze_batch(self, texts: list[str], analyzer: str = DEFAULT_ANALYZER) -> list[set]:
+        """
+        Same as `analyze()`, but for many texts at once (ONE request to `/_analyze`).
+        """
+        return get_analyzer_client().analyze_batch(texts, analyzer)
 
     def delete_index(self, index: str) -> None:
         """
@@ -682,33 +729,33 @@ class LingtelliElastic(Elasticsearch):
         qa_timer = time.time()
 
         try:
-            self.logger.msg = "Searching within %s with document: " % qa_doc.vendor_id + \
+            self.logger.msg = "Searching within %s and %s with document: " % (qa_doc.vendor_id, doc.vendor_id) + \
                 str(qa_doc)
             self.logger.info()
-            resp = self.search_qa(qa_doc)
+            resp, content_hits = self.search_qa_content(doc, qa_doc)
         except ElasticError as err:
+            self.logger.msg = "No hits from ELK!"
+            self.logger.warning()
+            if self.docs_found:
+                self.docs_found = False
+            raise self.logger from err
+        except Exception as err:
+            self.logger.msg = "Error occurred!"
+            self.logger.error(extra_msg=str(err), orgErr=err)
+            if self.docs_found:
+                self.docs_found = False
+            raise self.logger from err
+
+        if resp is None:
+            self.logger.msg = "No hits from" + Fore.RED + \
+                " %s." % qa_doc.vendor_id + Fore.RESET + " Asking Chat-GPT..."
+            self.logger.info()
+            gpt_timer = time.time()
+
             try:
-                self.logger.msg = "No hits from" + Fore.RED + \
-                    " %s." % qa_doc.vendor_id + Fore.RESET + " Asking Chat-GPT..."
-                self.logger.info()
-                gpt_timer = time.time()
-                resp = self.search(doc)
-            except ElasticError as err:
-                self.logger.msg = "No hits from ELK!"
-                self.logger.warning()
-                if self.docs_found:
-                    self.docs_found = False
-                raise self.logger from err
-            except Exception as err:
-                self.logger.msg = "Error occurred!"
-                self.logger.error(extra_msg=str(err), orgErr=err)
-                if self.docs_found:
-                    self.docs_found = False
-                raise self.logger from err
-            else:
                 # Throw another request to GPT-3 service to get answer from there.
                 context = ""
-                context += self._get_gpt_context(resp["hits"])
+                context += self._get_gpt_context(content_hits)
 
                 if (doc.strict and len(context) == 0) or len(context) == 0:
                     self.logger.msg = "No context found!"
@@ -716,15 +763,6 @@ class LingtelliElastic(Elasticsearch):
                     self.docs_found = False
                     raise self.logger
 
-                # self.logger.msg = "Querying GPT-3..."
-                # self.logger.info()
-                # self.logger.msg = "Question: {}".format(
-                #     self.doc.match.search_term)
-                # self.logger.info()
-                # self.logger.msg = "Context: {}".format(context)
-                # self.logger.info()
-                # self.logger.msg = "Vendor ID: {}".format(self.doc.vendor_id)
-
                 gpt3 = GPT3Request(doc.match.search_term,
                                    context, doc.vendor_id, self.gpt3_strict, session_id=doc.session_id)
 
@@ -763,20 +801,19 @@ class LingtelliElastic(Elasticsearch):
                 }
 
                 self.logger.save_stats(stats)
+            except Exception as err:
+                self.logger.msg = "Error occurred!"
+                self.logger.error(extra_msg=str(err), orgErr=err)
+                if self.docs_found:
+                    self.docs_found = False
+                raise self.logger from err
 
-                self.logger.msg = "Response from " + Fore.LIGHTCYAN_EX + "GPT-3 service: " + Fore.RESET + "%s" % str(
-                    gpt3.results)
-                self.logger.info(extra_msg="Took " + Fore.LIGHTCYAN_EX + "%s" %
-                                 str(round(time.time() - gpt_timer, 2)) + Fore.RESET + "s.")
+            self.logger.msg = "Response from " + Fore.LIGHTCYAN_EX + "GPT-3 service: " + Fore.RESET + "%s" % str(
+                gpt3.results)
+            self.logger.info(extra_msg="Took " + Fore.LIGHTCYAN_EX + "%s" %
+                             str(round(time.time() - gpt_timer, 2)) + Fore.RESET + "s.")
 
-                return gpt3.results
-
-        except Exception as err:
-            self.logger.msg = "Error occurred!"
-            self.logger.error(extra_msg=str(err), orgErr=err)
-            if self.docs_found:
-                self.docs_found = False
-            raise self.logger from err
+            return gpt3.results
 
         stats = {
             "timestamp": date_to_str(datetime.now().astimezone()),
@@ -903,6 +940,86 @@ class LingtelliElastic(Elasticsearch):
             self.logger.error(extra_msg=str(err))
             raise self.logger from err
 
+    def search_qa_content(self, doc: SearchGPT, qa_doc: SearchDocument) -> tuple[str | None, list | dict | None]:
+        """
+        Issues the whole legacy QA-then-content lookup as ONE `_msearch` request:\n
+        1. `match_phrase` on `<vendor_id>-qa`\n
+        2. `match` on `<vendor_id>-qa` where every query term must match
+        (`minimum_should_match: 100%`, replacing the former `/_analyze` round trip)\n
+        3. `match` on `<vendor_id>` (context for GPT)\n
+        Missing indices are skipped through `ignore_unavailable` instead of separate
+        existence checks. The decision is then made locally on the responses.\n
+        The mappings the queries need come from the process-wide cache; on a cold
+        cache, both indices are resolved with ONE mapping request beforehand.\n
+        Returns `(<QA answer>, None)` if any QA query was confident enough
+        (score >= `MIN_QA_DOC_SCORE`), otherwise `(None, <content hits>)`.
+        """
+        self._resolve_mappings([qa_doc.vendor_id, doc.vendor_id])
+        phrase_doc = SearchPhraseDoc(
+            vendor_id=qa_doc.vendor_id, match_phrase=qa_doc.match.search_term)
+        qa_query = self._get_query(qa_doc)
+        qa_query["match"][qa_doc.match.name]["minimum_should_match"] = "100%"
+
+        searches = []
+        for index, query, size in [(qa_doc.vendor_id, self._get_query(phrase_doc), 1),
+                                   (qa_doc.vendor_id, qa_query, 1),
+                                   (doc.vendor_id, self._get_query(doc), self.search_size)]:
+            searches.append({"index": index, "ignore_unavailable": True})
+            searches.append({"query": query, "size": size})
+
+        try:
+            responses = self.msearch(searches=searches)["responses"]
+        except ApiError as err:
+            self.logger.msg = "Unable to run multi-search!"
+            self.logger.error(extra_msg=err.message, orgErr=err)
+            raise self.logger from err
+
+        phrase_resp, qa_resp, content_resp = responses
+
+        # The '-qa' index doesn't exist yet? Create it for the upcoming answer.
+        if qa_resp.get("_shards", {}).get("total", 1) == 0:
+            self._create_qa_index(qa_doc)
+
+        qa_field = self.known_indices.get(
+            qa_doc.vendor_id, {}).get("context", "a")
+        for resp in (phrase_resp, qa_resp):
+            if resp.get("error", None):
+                self.logger.msg = "QA search returned an error!"
+                self.logger.warning(extra_msg=str(resp["error"]))
+                continue
+            hits = resp["hits"]["hits"]
+            if len(hits) > 0 and hits[0]["_score"] >= MIN_QA_DOC_SCORE:
+                return hits[0]["_source"][qa_field], None
+
+        if content_resp.get("error", None):
+            self.logger.msg = "Content search returned an error!"
+            self.logger.error(extra_msg=str(content_resp["error"]))
+            raise self.logger
+        if content_resp.get("_shards", {}).get("total", 1) == 0:
+            self.logger.msg = "Could not search for documents!"
+            self.logger.warning("Index {} does NOT exist!".format(
+                doc.vendor_id))
+            raise self.logger
+
+        hits = self._remove_underlines(content_resp["hits"]["hits"])
+        return None, self._get_context(hits, doc)
+
+    def _create_qa_index(self, doc: SearchDocument) -> None:
+        """
+        Creates the '<vendor_id>-qa' index with fields 'q' and 'a'.
+        """
+        index = Fore.LIGHTCYAN_EX + doc.vendor_id + Fore.RESET
+        self.logger.msg = "Index [%s] does not exist. Attempting to create index..." % index
+        self.logger.info()
+        lang = get_language(doc.match.search_term)
+        mappings = {'q': {'type': 'text'}, 'a': {'type': 'text'}}
+        try:
+            self._create_index(doc.vendor_id, "a",
+                               language=lang, mappings=mappings)
+        except Exception as err:
+            self.logger.msg = "Something went wrong when trying to create index %s!" % index
+            self.logger.warning(extra_msg=str(err))
+
     def search_timerange(self, doc: SearchDocTimeRange, *args, **kwargs):
         """
         This method attempts to search for documents saved into the index of
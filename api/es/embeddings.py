@@ -0,0 +1,180 @@
+"""
+Module holding the embedding backends of the vector store:\n
+- `openai`: OpenAI's `text-embedding-ada-002` (1536 dimensions) through the LLM gateway.\n
+- `local`: a small (optionally int8-quantized) ONNX sentence-embedding model
+  running in-process on the CPU, so embedding a question takes no network round trip.\n
+Vectors of different backends live in different spaces, so every index records
+the backend (and dimensions) it was built with in its `_meta`, and is always
+queried with that backend; `EMBEDDING_BACKEND` only decides for new indices.
+
+The local backend needs `onnxruntime` and `tokenizers`, and a model directory
+(`LOCAL_EMBEDDING_MODEL`) with the exported model and its `tokenizer.json`, e.g.
+an ONNX export of `sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2`.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from cachetools import TTLCache
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import NotFoundError
+from langchain.embeddings.base import Embeddings
+
+from errors.errors import ElasticError
+from stats.tracing import span
+from . import EMBEDDING_BACKENDS, EMBEDDING_BACKEND, LOCAL_EMBEDDING_MODEL, LOCAL_EMBEDDING_BATCH_SIZE, LOCAL_EMBEDDING_THREADS, LOCAL_EMBEDDING_MAX_LENGTH, EMBEDDING_META_TTL
+from .llm_gateway import GatewayOpenAIEmbeddings
+
+# Indices created before backends were recorded were all embedded by OpenAI
+LEGACY_BACKEND = "openai"
+MODEL_FILES = ["model_quantized.onnx", "model.onnx"]
+
+_backends: dict[str, Embeddings] = {}
+_backends_lock = threading.Lock()
+
+_index_backends: TTLCache = TTLCache(maxsize=1024, ttl=EMBEDDING_META_TTL)
+_index_backends_lock = threading.Lock()
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Mean-pooled, normalized sentence embeddings from an ONNX model on the CPU.\n
+    Texts are embedded in batches of `batch_size`, spread over `threads` threads
+    (each inference uses one core, so batches run in parallel).
+    """
+    backend = "local"
+
+    def __init__(self, model_dir: str = LOCAL_EMBEDDING_MODEL, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+                 threads: int = LOCAL_EMBEDDING_THREADS, max_length: int = LOCAL_EMBEDDING_MAX_LENGTH):
+        self.logger = ElasticError(__file__, self.__class__.__name__)
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as err:
+            self.logger.msg = "The local embedding backend needs 'onnxruntime' and 'tokenizers'!"
+            self.logger.error(extra_msg=str(err))
+            raise self.logger from err
+
+        model_files = [os.path.join(model_dir, name) for name in MODEL_FILES
+                       if os.path.isfile(os.path.join(model_dir, name))]
+        if len(model_files) == 0 or not os.path.isfile(os.path.join(model_dir, "tokenizer.json")):
+            self.logger.msg = "Could NOT find a local embedding model in [%s]!" % model_dir
+            self.logger.error(extra_msg="Expected 'tokenizer.json' and one of: %s" %
+                              ", ".join(MODEL_FILES))
+            raise self.logger
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(
+            os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            model_files[0], sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.pool = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="embeddings")
+        self.dims = len(self._embed_batch(["dims"])[0])
+
+        self.logger.msg = "Loaded local embedding model: %s" % model_files[0]
+        self.logger.info(extra_msg="Dimensions: %s, threads: %s" %
+                         (self.dims, threads))
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array(
+            [encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array(
+            [encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask,
+                  "token_type_ids": np.zeros_like(input_ids)}
+
+        token_embeddings = self.session.run(
+            None, {name: inputs[name] for name in self.input_names})[0]
+        # Mean pooling over the actual (non-padding) tokens, then unit length
+        mask = attention_mask[:, :, None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / \
+            np.clip(mask.sum(axis=1), 1e-9, None)
+        return embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = [texts[start:start + self.batch_size]
+                   for start in range(0, len(texts), self.batch_size)]
+        with span("embedding.documents", model="local", texts=len(texts)):
+            return [embedding.tolist() for batch in self.pool.map(self._embed_batch, batches)
+                    for embedding in batch]
+
+    def embed_query(self, text: str) -> list[float]:
+        with span("embedding.query", model="local"):
+            return self._embed_batch([text])[0].tolist()
+
+
+def get_embeddings(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    """
+    Returns the (process-wide) embeddings of `backend`; models are loaded only once.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        logger = ElasticError(__file__, "es.embeddings:get_embeddings")
+        logger.msg = "Unknown embedding backend: %s" % backend
+        logger.error(extra_msg="Acceptable: %s" %
+                     ", ".join(EMBEDDING_BACKENDS))
+        raise logger
+
+    with _backends_lock:
+        if backend not in _backends:
+            _backends[backend] = LocalEmbeddings(
+            ) if backend == "local" else GatewayOpenAIEmbeddings()
+        return _backends[backend]
+
+
+def backend_of(embedding: Embeddings) -> str:
+    return getattr(embedding, "backend", LEGACY_BACKEND)
+
+
+def embedding_meta(embedding: Embeddings, dims: int) -> dict:
+    """
+    The `_meta` entries recording how an index' vectors were made.
+    """
+    return {"embedding_backend": backend_of(embedding), "embedding_dims": dims}
+
+
+def index_backend(client: Elasticsearch, index: str) -> str:
+    """
+    Returns the (cached) embedding backend `index` was built with
+    (`EMBEDDING_BACKEND` if it doesn't exist yet).
+    """
+    with _index_backends_lock:
+        if index in _index_backends:
+            return _index_backends[index]
+
+    try:
+        mappings = client.indices.get_mapping(index=index).body
+    except NotFoundError:
+        return EMBEDDING_BACKEND
+
+    backend = LEGACY_BACKEND
+    for index_mapping in mappings.values():
+        backend = index_mapping["mappings"].get(
+            "_meta", {}).get("embedding_backend", LEGACY_BACKEND)
+
+    with _index_backends_lock:
+        _index_backends[index] = backend
+    return backend
+
+
+def index_embeddings(client: Elasticsearch, index: str) -> Embeddings:
+    """
+    Returns the embeddings to search (or add to) `index` with.
+    """
+    return get_embeddings(index_backend(client, index))
+
+
+def forget_index(index: str) -> None:
+    """
+    Drops the cached backend of `index` (call when it is deleted or re-created).
+    """
+    with _index_backends_lock:
+        _index_backends.pop(index, None)
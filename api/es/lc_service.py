@@ -1,36 +1,87 @@
 import os
 import json
+import logging
 import shutil
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
 from datetime import datetime
 
-import pandas as pd
 from cachetools import TTLCache, cached
 from colorama import Fore
 from elasticsearch import Elasticsearch
 from fastapi.datastructures import UploadFile
-from langchain.agents import initialize_agent, Tool, AgentType
+from langchain.agents import AgentExecutor, Tool
+from langchain.agents.chat.base import ChatAgent
 from langchain.agents.conversational_chat.base import AgentOutputParser
 from langchain.chains import RetrievalQAWithSourcesChain
-from langchain.chat_models import ChatOpenAI
-from langchain.document_loaders import UnstructuredWordDocumentLoader, PyPDFLoader, DataFrameLoader, TextLoader
-from langchain.document_loaders.csv_loader import CSVLoader
-from langchain.embeddings import OpenAIEmbeddings
 from langchain.memory import ConversationBufferWindowMemory
 from langchain.schema import SystemMessage, HumanMessage, Document
 from langchain.text_splitter import TokenTextSplitter
-from langchain.utilities import SerpAPIWrapper
-from langchain.vectorstores import ElasticVectorSearch, Chroma
+from langchain.vectorstores import Chroma
 from pydantic import BaseModel, Field
 from pydantic.typing import Any
 
+from data import INDEX_BATCH_SIZE, SUMMARY_MAX_LENGTH
+from data.loaders import batched, load_documents, split_documents
 from errors.errors import DataError, ElasticError
+from es import DEFAULT_RETRIEVAL, RETRIEVAL_MODES, FUSION_METHODS, RETRIEVAL_TTL, TOOLSET_TTL
+from es import AGENT_DEADLINE, AGENT_MAX_STEPS, AGENT_PARALLEL_TOOLS, AGENT_POOL_SIZE, AGENT_FANOUT_SHARE
+from es.answer_selector import decide, record_verdict
+from es.llm_cache import cached_generate, invalidate_vendor
+from es.embeddings import forget_index, get_embeddings, index_embeddings
+from es.llm_clients import get_chat_model
+from es.llm_gateway import CircuitOpenError
+from es.prompt import CONTEXT_PLACEHOLDER, PromptBuilder
+from es.translation import get_translation_service
+from es.traced_client import TracedElasticsearch
+from es.vectorstore import LingtelliVectorStore, get_client
+from stats.metrics import stage
+from stats.tracing import in_context
 from helpers.times import date_to_str
 from helpers.helpers import get_language, includes_chinese, summarize_text, convert_file_to_index
-from params.definitions import QueryVendorSession, VendorFileQuery, TemplateModel, VendorFile, QueryVendorSessionFile
+from params.definitions import QueryVendorSession, VendorFileQuery, TemplateModel, VendorFile, QueryVendorSessionFile, RetrievalModel
 from settings.settings import get_settings
 
 cache = TTLCache(maxsize=100, ttl=86400)
+retrieval_cache = TTLCache(maxsize=1000, ttl=RETRIEVAL_TTL)
+# Per vendor: (signature, tools) and per (vendor, language): (signature, agent)
+toolset_cache = TTLCache(maxsize=256, ttl=TOOLSET_TTL)
+agent_cache = TTLCache(maxsize=512, ttl=TOOLSET_TTL)
+toolset_lock = threading.Lock()
+# Agents run in here so that a request can stop waiting at its deadline
+agent_pool = ThreadPoolExecutor(
+    max_workers=AGENT_POOL_SIZE, thread_name_prefix="agent")
+
+AGENT_STOPPED = "Agent stopped due to"
+UNKNOWN_ANSWERS = ["don't know", "do not know", "不知道", "無法回答"]
+
+
+def _known_answer(observation: Any) -> str:
+    """
+    Returns the answer within a tool's output (`RetrievalQAWithSourcesChain` returns
+    a `dict` with 'answer' and 'sources'), or "" if the tool didn't know.
+    """
+    answer = observation.get("answer", "") if isinstance(
+        observation, dict) else str(observation)
+    answer = answer.strip()
+    if not answer or any(unknown in answer.lower() for unknown in UNKNOWN_ANSWERS):
+        return ""
+    return answer
+
+
+class CancellableAgentExecutor(AgentExecutor):
+    """
+    `AgentExecutor` that stops before its next step once `cancelled` (a
+    `threading.Event`) is set, e.g. by a request that stopped waiting for it.
+    """
+    cancelled: Any = None
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        if self.cancelled is not None and self.cancelled.is_set():
+            return False
+        return super()._should_continue(iterations, time_elapsed)
 
 
 class FileLoader(object):
@@ -88,6 +139,21 @@ class FileLoader(object):
                 pass
             os.rmdir(os.path.join(self.settings.temp_dir, index))
 
+    def _remove_partial_index(self, client: Elasticsearch, index: str) -> None:
+        """
+        Deletes `index` after a failed upload created it, so no half-filled
+        index is left to answer from (or to be appended to by a re-upload).
+        """
+        try:
+            client.indices.delete(index=index, ignore_unavailable=True)
+            forget_index(index)
+        except Exception as err:
+            self.logger.msg = "Could NOT remove partially filled index [%s]!" % index
+            self.logger.error(extra_msg=str(err), orgErr=err)
+        else:
+            self.logger.msg = "Removed partially filled index [%s]." % index
+            self.logger.warning()
+
     def _check_filetype(self, file: str) -> str:
         """
         Method that checks filetype and returns the corresponding
@@ -106,125 +172,149 @@ class FileLoader(object):
 
     def _load_file(self, file: str):
         """
-        Method that loads documents of type `csv`, `pdf` or `docx` and saves the split document
-        in chunks within Elasticsearch with attached embeddings for each chunk.
+        Method that streams documents of type `csv`, `pdf`, `docx` or `txt` through
+        the loader registry, splits them into chunks and saves the chunks in batches
+        within Elasticsearch with attached embeddings for each chunk.
         """
-        documents: list = []
-
         try:
-            if self.filetype == "docx":
-                documents = UnstructuredWordDocumentLoader(
-                    file).load_and_split(self.splitter)
-            elif self.filetype == "csv":
-                if self.csv_content_col is not None:
-                    documents = DataFrameLoader(pd.read_csv(
-                        file), self.csv_content_col).load_and_split(self.splitter)
-                else:
-                    documents = CSVLoader(file).load_and_split(self.splitter)
-            elif self.filetype == "pdf":
-                documents = PyPDFLoader(file).load_and_split(self.splitter)
-            elif self.filetype == "txt":
-                documents = TextLoader(file).load_and_split(self.splitter)
-            else:
-                # None of the accepted filetypes? ERROR!
-                self.logger.msg = "Unable to detect any of the acceptable filetypes!"
-                self.logger.error(
-                    extra_msg=f"\
-Acceptable filetypes: .docx (Word), .csv, .pdf & .txt\n\
-Received: {Fore.LIGHTRED_EX + self.filetype + Fore.RESET}")
-                raise self.logger
+            documents = load_documents(
+                file, self.filetype, content_col=self.csv_content_col)
+        except Exception as e:
+            self.logger.msg = f"Could not load the {Fore.LIGHTYELLOW_EX + self.filetype + Fore.RESET} file!"
+            self.logger.error(extra_msg=f"Reason: {str(e)}", orgErr=e)
+            raise self.logger from e
 
-            # If no documents, do NOT attempt to save.
-            if len(documents) == 0:
+        full_text = ""
+        num_chunks = 0
+        client = None
+        index_exists = True
+        full_index = '_'.join(
+            ["info", self.index, self.filename, self.filetype])
+        try:
+            client = LingtelliElastic2()
+            index_exists = client.indices.exists(index=full_index).body
+            embeddings = index_embeddings(client, full_index)
+            es = LingtelliVectorStore(full_index, embeddings, client=client)
+
+            for batch in batched(split_documents(documents, self.splitter), INDEX_BATCH_SIZE):
+                # Make sure to add meta data to each Document object
+                for document in batch:
+                    if len(full_text) < SUMMARY_MAX_LENGTH:
+                        full_text += document.page_content
+                    document.metadata.update(
+                        {
+                            'source': os.path.split(file)[1],
+                            'page': num_chunks
+                        })
+                    num_chunks += 1
+                es.add_documents(batch, refresh_indices=False)
+
+            # If no documents, nothing has been saved.
+            if num_chunks == 0:
                 self.logger.msg = "Unable to split file into chunks!"
                 self.logger.error(
-                    extra_msg=f"Length of 'documents': {Fore.LIGHTRED_EX + str(len(documents)) + Fore.RESET}")
+                    extra_msg=f"Number of chunks: {Fore.LIGHTRED_EX + str(num_chunks) + Fore.RESET}")
                 raise self.logger
 
-        except Exception as e:
-            self.logger.msg = f"Could not load the {Fore.LIGHTYELLOW_EX + self.filetype + Fore.RESET} file!"
-            self.logger.error(extra_msg=f"Reason: {str(e)}", orgErr=e)
-            raise self.logger from e
+            client.indices.refresh(index=full_index)
+        except Exception as err:
+            self.logger.msg = "Something went wrong when trying to save documents into ELK!"
+            self.logger.error(
+                extra_msg=f"{Fore.LIGHTRED_EX + str(err) + Fore.RESET}")
+            if not index_exists:
+                self._remove_partial_index(client, full_index)
+            raise self.logger from err
         else:
-            full_text = ""
-            # Make sure to add meta data to each Document object
-            for no, document in enumerate(documents):
-                full_text += document.page_content
-                document.metadata.update(
-                    {
-                        'source': os.path.split(file)[1],
-                        'page': no
-                    })
-            try:
-                embeddings = OpenAIEmbeddings()
-                full_index = '_'.join(
-                    ["info", self.index, self.filename, self.filetype])
-                client = LingtelliElastic2()
-                index_exists = client.indices.exists(index=full_index).body
-                es = ElasticVectorSearch(
-                    'http://localhost:9200', full_index, embeddings)
-                es.add_documents(documents)
-            except Exception as err:
-                self.logger.msg = "Something went wrong when trying to save documents into ELK!"
-                self.logger.error(
-                    extra_msg=f"{Fore.LIGHTRED_EX + str(err) + Fore.RESET}")
-                raise self.logger from err
-            else:
-                self.logger.msg = f"{Fore.LIGHTGREEN_EX + 'Successfully' + Fore.RESET} saved {len(documents)} documents into Elasticsearch!"
+            self.logger.msg = f"{Fore.LIGHTGREEN_EX + 'Successfully' + Fore.RESET} saved {num_chunks} documents into Elasticsearch!"
+            self.logger.info()
+            invalidate_vendor(self.index)
+            if not index_exists:
+                summary = summarize_text(
+                    full_text,
+                    language=get_language(full_text)
+                )
+                self.logger.msg = "Summary of text:\n%s" % summary
                 self.logger.info()
-                if not index_exists:
-                    summary = summarize_text(
-                        full_text,
-                        language=get_language(full_text)
-                    )
-                    self.logger.msg = "Summary of text:\n%s" % summary
-                    self.logger.info()
-
-                    if get_language(summary) != "EN":
-                        summary = client.translate(summary)
-                        self.logger.msg = "Summary was translated!"
-                        self.logger.info(extra_msg=summary)
-
-                    try:
-                        client.indices.put_mapping(
-                            index=full_index,
-                            meta={"description": summary}
-                        )
-                    except Exception as err:
-                        self.logger.msg = "Something went wrong when trying " +\
-                            "to set a description to index: [%s]" % full_index
-                        self.logger.error(extra_msg=str(err), orgErr=err)
-                        raise self.logger from err
-                    else:
-                        self.logger.msg = Fore.LIGHTGREEN_EX + "Successfully" + Fore.RESET + \
-                            " set description for [%s]!" % full_index
-                        self.logger.info(extra_msg=summary)
-
-                template_index = "_".join(["template", self.index])
+
+                if get_language(summary) != "EN":
+                    summary = client.translate(summary)
+                    self.logger.msg = "Summary was translated!"
+                    self.logger.info(extra_msg=summary)
+
                 try:
-                    client.indices.create(
-                        index=template_index,
-                        mappings={"_meta": {
-                            "template": "",
-                            "sentiment": "",
-                            "role": ""
-                        }}
+                    # 'put_mapping' replaces the whole '_meta', so keep the embedding backend
+                    meta = client.indices.get_mapping(index=full_index).body[full_index][
+                        'mappings'].get('_meta', dict())
+                    meta["description"] = summary
+                    client.indices.put_mapping(
+                        index=full_index,
+                        meta=meta
                     )
                 except Exception as err:
-                    self.logger.msg = "Index already exists: [%s]" % (
-                        Fore.LIGHTYELLOW_EX + template_index + Fore.RESET)
-                    self.logger.warning(extra_msg=str(err))
+                    self.logger.msg = "Something went wrong when trying " +\
+                        "to set a description to index: [%s]" % full_index
+                    self.logger.error(extra_msg=str(err), orgErr=err)
+                    raise self.logger from err
                 else:
-                    client.indices.refresh(index=template_index)
-                    self.logger.msg = "Added index: [%s]" % (
-                        Fore.LIGHTYELLOW_EX + template_index + Fore.RESET)
-                    self.logger.info()
+                    self.logger.msg = Fore.LIGHTGREEN_EX + "Successfully" + Fore.RESET + \
+                        " set description for [%s]!" % full_index
+                    self.logger.info(extra_msg=summary)
+
+            template_index = "_".join(["template", self.index])
+            try:
+                client.indices.create(
+                    index=template_index,
+                    mappings={"_meta": {
+                        "template": "",
+                        "sentiment": "",
+                        "role": ""
+                    }}
+                )
+            except Exception as err:
+                self.logger.msg = "Index already exists: [%s]" % (
+                    Fore.LIGHTYELLOW_EX + template_index + Fore.RESET)
+                self.logger.warning(extra_msg=str(err))
+            else:
+                client.indices.refresh(index=template_index)
+                self.logger.msg = "Added index: [%s]" % (
+                    Fore.LIGHTYELLOW_EX + template_index + Fore.RESET)
+                self.logger.info()
 
 
 class QAInput(BaseModel):
     question: str = Field()
 
 
+class LazyRetrievalQA(object):
+    """
+    Callable standing in for the `RetrievalQAWithSourcesChain` of one 'info' index.
+    The vector store, LLM and chain are only built the first time the agent
+    actually invokes the tool, and reused afterwards.
+    """
+
+    def __init__(self, index: str, retrieval: dict):
+        self.index = index
+        self.retrieval = retrieval
+        self.chain: RetrievalQAWithSourcesChain | None = None
+        self.lock = threading.Lock()
+
+    def _get_chain(self) -> RetrievalQAWithSourcesChain:
+        with self.lock:
+            if self.chain is None:
+                vectorstore = LingtelliVectorStore(
+                    self.index, index_embeddings(get_client(), self.index), retrieval=self.retrieval)
+                llm = get_chat_model(
+                    request_timeout=45,
+                    max_tokens=250
+                )
+                self.chain = RetrievalQAWithSourcesChain.from_llm(
+                    llm=llm, retriever=vectorstore.as_retriever(), max_tokens_limit=300, reduce_k_below_max_tokens=True)
+            return self.chain
+
+    def __call__(self, *args, callbacks=None, **kwargs):
+        return self._get_chain()(*args, callbacks=callbacks, **kwargs)
+
+
 class LingtelliOutputParser(AgentOutputParser):
 
     settings = get_settings()
@@ -237,7 +327,7 @@ class LingtelliOutputParser(AgentOutputParser):
         return super().parse(text)
 
 
-class LingtelliElastic2(Elasticsearch):
+class LingtelliElastic2(TracedElasticsearch):
     settings = get_settings()
     chinese_template = """\
 給定以下對話和後續問題，重新詞述後續問題成為一個又是繁體中文又是獨立的問題。回覆時，請以繁體中文回答。
@@ -251,6 +341,8 @@ class LingtelliElastic2(Elasticsearch):
     def __init__(self):
         self.logger: ElasticError = ElasticError(__file__, self.__class__.__name__, msg="Initializing Elasticsearch client at: {}:{}".format(
             self.settings.elastic_server, str(self.settings.elastic_port)))
+        # Set when the LLM was unavailable and only sources could be returned
+        self.degraded = False
         try:
             super().__init__([{"scheme": "http", "host": self.settings.elastic_server, "port": self.settings.elastic_port}],
                              max_retries=3, retry_on_timeout=True, request_timeout=30)
@@ -428,11 +520,41 @@ class LingtelliElastic2(Elasticsearch):
 
         return final_mapping
 
+    def _load_retrieval(self, vendor_id: str) -> dict:
+        """
+        Method that loads the retrieval settings of `vendor_id` from the `_meta`
+        of its 'template_<vendor_id>' index, e.g.:\n
+        `{"mode": "hybrid", "fusion": "rrf", "vector_weight": 0.5}`\n
+        Falls back to `DEFAULT_RETRIEVAL` for any setting not found.
+        """
+        if vendor_id in retrieval_cache:
+            return retrieval_cache[vendor_id]
+
+        template_index = "_".join(["template", vendor_id])
+        retrieval = dict(DEFAULT_RETRIEVAL)
+        try:
+            mappings = self.indices.get_mapping(
+                index=template_index, ignore_unavailable=True, allow_no_indices=True).body
+            retrieval.update(mappings.get(template_index, {}).get(
+                'mappings', {}).get('_meta', {}).get('retrieval', {}))
+        except Exception as err:
+            self.logger.msg = "Could NOT load retrieval settings from [%s]! Using defaults..." % template_index
+            self.logger.warning(extra_msg=str(err))
+
+        retrieval_cache[vendor_id] = retrieval
+        return retrieval
+
+    def _vectorstore(self, index: str, vendor_id: str) -> LingtelliVectorStore:
+        """
+        Returns the vector store for an 'info' index, searching the way `vendor_id` is configured to.
+        """
+        return LingtelliVectorStore(index, index_embeddings(self, index), client=self, retrieval=self._load_retrieval(vendor_id))
+
     def answer_agent(self, vendor_id: str, query: str, memory: ConversationBufferWindowMemory) -> str:
         """
         Utilize agent to get answer to user's question.
         """
-        tools = self.generate_index_tools(vendor_id)
+        signature, tools = self._get_toolset(vendor_id)
 
         results = ""
 
@@ -449,32 +571,112 @@ Then, your final "action_input" should be: "這是最終答案"\
         else:
             suffix = suffix.replace("{language_instruction}", "")
 
-        parser = LingtelliOutputParser()
-
-        agent = initialize_agent(
+        # The agent (prompt compiled from the tools) only depends on the toolset and
+        # the language; only the executor holding this session's memory is new
+        with toolset_lock:
+            cached_agent = agent_cache.get((vendor_id, self.language), None)
+        if cached_agent is not None and cached_agent[0] == signature:
+            chat_agent = cached_agent[1]
+        else:
+            chat_agent = ChatAgent.from_llm_and_tools(
+                get_chat_model(max_tokens=500), tools, system_message_suffix=suffix)
+            with toolset_lock:
+                agent_cache[(vendor_id, self.language)] = (
+                    signature, chat_agent)
+
+        # The agent gets its own copy of the session's memory (it may outlive the
+        # request) and leaves AGENT_FANOUT_SHARE of the deadline for the fan-out
+        start = time.monotonic()
+        deadline = start + AGENT_DEADLINE
+        agent_budget = AGENT_DEADLINE * (1 - AGENT_FANOUT_SHARE)
+        cancelled = threading.Event()
+        agent = CancellableAgentExecutor.from_agent_and_tools(
+            agent=chat_agent,
             tools=tools,
-            memory=memory,
-            llm=ChatOpenAI(temperature=0, max_tokens=500, max_retries=2),
-            agent=AgentType.CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-            agent_kwargs={"suffix": suffix},
-            verbose=True
+            memory=memory.copy(deep=True, update={"output_key": "output"}),
+            verbose=True,
+            max_iterations=AGENT_MAX_STEPS,
+            max_execution_time=agent_budget,
+            early_stopping_method="force",
+            return_intermediate_steps=True,
+            cancelled=cancelled
         )
 
+        response = None
         try:
-            results = agent.run({"input": query})
+            response = agent_pool.submit(in_context(agent), {"input": query}).result(
+                timeout=max(start + agent_budget - time.monotonic(), 0))
+        except TimeoutError:
+            cancelled.set()
+            self.logger.msg = "Agent did NOT finish within %ss!" % round(
+                agent_budget, 1)
+            self.logger.warning()
         except Exception as err:
             self.logger.msg = "Could NOT get an answer from agent..."
             self.logger.error(extra_msg=str(err), orgErr=err)
             raise self.logger from err
 
+        if response is not None and not response["output"].startswith(AGENT_STOPPED):
+            results = response["output"]
+        else:
+            # Out of steps/time: take the best partial answer the agent gathered...
+            steps = response["intermediate_steps"] if response is not None else []
+            for _, observation in reversed(steps):
+                results = _known_answer(observation)
+                if results:
+                    break
+
+            # ... or ask the file tools it didn't get to, all at once
+            if not results:
+                used = set(action.tool for action, _ in steps)
+                results = self._ask_tools_parallel(
+                    [tool for tool in tools if tool.name not in used], query, deadline)
+
+        if not results:
+            self.logger.msg = "Agent could NOT find an answer within its budget!"
+            self.logger.error(extra_msg="Steps: %s, deadline: %ss" %
+                              (AGENT_MAX_STEPS, AGENT_DEADLINE))
+            raise self.logger
+
+        memory.chat_memory.add_user_message(query)
+        memory.chat_memory.add_ai_message(results)
         return results
 
+    def _ask_tools_parallel(self, tools: list[Tool], query: str, deadline: float) -> str:
+        """
+        Invokes (at most `AGENT_PARALLEL_TOOLS` of) `tools` concurrently with `query`
+        and returns the first known answer in tool order, or "" if none
+        answered before `deadline`.
+        """
+        tools = tools[:AGENT_PARALLEL_TOOLS]
+        remaining = deadline - time.monotonic()
+        if len(tools) == 0 or remaining <= 0:
+            return ""
+
+        futures = [agent_pool.submit(in_context(tool.func), query) for tool in tools]
+        done, _ = wait(futures, timeout=remaining)
+        for tool, future in zip(tools, futures):
+            if future not in done:
+                continue
+            try:
+                answer = _known_answer(future.result())
+            except Exception as err:
+                self.logger.msg = "Tool [%s] failed!" % tool.name
+                self.logger.warning(extra_msg=str(err))
+                continue
+            if answer:
+                self.logger.msg = "Got a parallel answer from tool [%s]." % (
+                    Fore.LIGHTCYAN_EX + tool.name + Fore.RESET)
+                self.logger.info()
+                return answer
+        return ""
+
     def answer_gpt(self, gpt_obj: QueryVendorSessionFile, memory: ConversationBufferWindowMemory) -> str:
         """
         Method using GPT to directly get answers based solely on a one-shot prompt with source documents.
         """
         try:
-            source_text, final_index = self.embed_search_wo_sources(gpt_obj)
+            chunks, final_index = self.embed_search_chunks(gpt_obj)
         except Exception as err:
             self.logger.msg = "Could NOT fetch source documents!"
             self.logger.error(extra_msg=str(err), orgErr=err)
@@ -497,7 +699,7 @@ provided or from our conversation, respond that you simply don't know.\
 If you insist on including information from the internet, you have to provide \
 an ACTUAL URL link for that source.""".format(
                 "Traditional Chinese (繁體中文)" if self.language == "CH" else "English",
-                source_text if source_text else "[This user does not have any uploaded data. Please answer as best you can on your own.]")
+                CONTEXT_PLACEHOLDER)
 
             try:
                 custom_template = self._load_template(final_index)
@@ -540,34 +742,55 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
                 last_instruction
             ])
 
-            self.logger.msg = "Whole system message: %s" % (
-                Fore.LIGHTMAGENTA_EX + "\n" + init_prompt + Fore.RESET)
-            self.logger.info()
-
-            gpt_kwargs = {"frequency_penalty": 0.5}
+            # Per-request parameters of the shared client
+            gpt_kwargs = {"max_tokens": 1000, "frequency_penalty": 0.5}
 
-            llm = ChatOpenAI(temperature=0, max_tokens=1000,
-                             max_retries=2, model_kwargs=gpt_kwargs)
-            all_messages = [SystemMessage(content=init_prompt)]
+            llm = get_chat_model()
+            # Lowest scoring chunks and oldest turns are dropped first to stay within budget
+            all_messages = PromptBuilder(model=llm.model_name).build(
+                init_prompt,
+                "Question: {}".format(gpt_obj.query),
+                chunks=chunks,
+                history=memory.chat_memory.messages,
+                empty_context="[This user does not have any uploaded data. Please answer as best you can on your own.]")
 
-            for message in memory.chat_memory.messages:
-                all_messages.append(message)
+            self.logger.log(logging.DEBUG, "Whole system message:\n%s",
+                            all_messages[0].content)
 
-            all_messages.append(HumanMessage(
-                content="Question: {}".format(gpt_obj.query)))
-            results = llm.generate([all_messages]).generations[0][0].text
+            try:
+                with stage("llm_generation", gpt_obj.vendor_id):
+                    results = cached_generate(
+                        llm, all_messages, gpt_obj.vendor_id, **gpt_kwargs)
+            except CircuitOpenError:
+                results = self._degraded_answer(chunks)
 
         return results
 
+    def _degraded_answer(self, chunks: list[tuple[str, float]]) -> str:
+        """
+        Answer returned while the LLM's circuit breaker is open: the retrieved sources only.
+        """
+        self.degraded = True
+        self.logger.msg = "LLM unavailable, returning %s source(s) only!" % len(
+            chunks)
+        self.logger.warning()
+        if self.language == "CH":
+            intro = "目前無法產生回答，以下是可能相關的資料："
+            empty = "（沒有找到相關資料）"
+        else:
+            intro = "An answer cannot be generated right now; here is the most relevant information found:"
+            empty = "(No relevant information found.)"
+        sources = "\n\n".join(text for text, _ in chunks)
+        return intro + "\n\n" + (sources or empty)
+
     def answer_gpt_with_prompt(self, gpt_obj: QueryVendorSessionFile, memory: ConversationBufferWindowMemory, prompt: str) -> str:
         """
         Method used to the same end as the 'answer_gpt' method BUT you must provide a full prompt
         as this method does not try to compose a full prompt for you.
         """
-        gpt_kwargs = {"frequency_penalty": 0.5}
+        gpt_kwargs = {"max_tokens": 1000, "frequency_penalty": 0.5}
 
-        llm = ChatOpenAI(temperature=0, max_tokens=1000,
-                         max_retries=2, model_kwargs=gpt_kwargs)
+        llm = get_chat_model()
         all_messages = [SystemMessage(content=prompt)]
 
         for message in memory.chat_memory.messages:
@@ -575,7 +798,9 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
 
         all_messages.append(HumanMessage(
             content="Question: {}".format(gpt_obj.query)))
-        results = llm.generate([all_messages]).generations[0][0].text
+        with stage("llm_generation", gpt_obj.vendor_id):
+            results = cached_generate(
+                llm, all_messages, gpt_obj.vendor_id, **gpt_kwargs)
 
         return results
 
@@ -585,6 +810,7 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
         answer_index = "_".join(["answers", vendor_id])
         if client.indices.exists(index=answer_index).body:
             client.indices.delete(index=answer_index)
+            invalidate_vendor(vendor_id)
             client.logger.msg = Fore.LIGHTGREEN_EX + "Successfully" + \
                 Fore.RESET + " deleted index [%s]!" % answer_index
             client.logger.info()
@@ -644,6 +870,7 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
                 self.logger.warning(
                     extra_msg="Could NOT delete the following index: %s" % str(index))
 
+        invalidate_vendor(vendor_id)
         self.logger.msg = Fore.LIGHTGREEN_EX + \
             "Successfully " + Fore.RESET + "deleted indices!"
         self.logger.info(extra_msg="Indices: %s" % str(indices))
@@ -662,69 +889,73 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
 
         if self.indices.exists(index=full_index).body:
             if full_index.startswith("info"):
-                self.indices.put_mapping(index=full_index, meta={
+                meta = self.indices.get_mapping(index=full_index).body[full_index][
+                    'mappings'].get('_meta', dict())
+                meta.update({
                     "template": "",
                     "role": "",
                     "sentiment": ""
                 })
+                self.indices.put_mapping(index=full_index, meta=meta)
+                invalidate_vendor(template_obj.vendor_id)
         else:
             self.logger.msg = "Could NOT find index: %s" % (
                 Fore.RED + full_index + Fore.RESET)
             self.logger.warning()
 
-    def generate_index_tools(self, vendor_id: str) -> list[Tool]:
+    def _toolset_signature(self, vendor_id: str) -> tuple:
         """
-        Function that fetches mappings for all indices under the provided `vendor_id`
-        and returns a list of tools for a LangChain agent to use.
+        Returns what the toolset of `vendor_id` is built from: every 'info' index
+        with a description (and that description) plus the vendor's retrieval settings.
+        Only the descriptions are fetched, so this is cheap to check on every request.
         """
-        tools = []
-        search = SerpAPIWrapper()
-        serpapi_tool = Tool(
-            "SerpAPI",
-            search.run,
-            "Useful tool when out of other better options to gather information about anything that cannot be found within the other tools."
-        )
         lookup_index = "_".join(["info", vendor_id]) + "*"
-        all_mappings: dict[str, str] = self.indices.get_mapping(
-            index=lookup_index).body
-
-        for i, index in enumerate(all_mappings):
-            if all_mappings.get(index, None) and \
-                    all_mappings.get(index, None).get('mappings', None) and \
-                    all_mappings.get(index, None).get('mappings', None).get('_meta', None) and \
-                    all_mappings.get(index, None).get('mappings', None).get('_meta', None).get('description', None):
-
-                vectorstore = ElasticVectorSearch(
-                    "http://" + self.settings.elastic_server +
-                    ":" + str(self.settings.elastic_port),
-                    index,
-                    embedding=OpenAIEmbeddings()
-                )
-                llm = ChatOpenAI(
-                    temperature=0,
-                    request_timeout=45,
-                    max_retries=2,
-                    max_tokens=250
-                )
-
-                chain = RetrievalQAWithSourcesChain.from_llm(
-                    llm=llm, retriever=vectorstore.as_retriever(), max_tokens_limit=300, reduce_k_below_max_tokens=True)
+        descriptions: dict[str, dict] = self.indices.get_mapping(
+            index=lookup_index, filter_path=["*.mappings._meta.description"],
+            ignore_unavailable=True, allow_no_indices=True).body
+
+        return (
+            tuple(sorted((index, mapping['mappings']['_meta']['description'])
+                         for index, mapping in descriptions.items())),
+            tuple(sorted(self._load_retrieval(vendor_id).items()))
+        )
 
-                # chain = RetrievalQA.from_llm(
-                #     llm, retriever=vectorstore.as_retriever(search_kwargs={"k": 2, "fetch_k": 4}))
+    def _get_toolset(self, vendor_id: str) -> tuple[tuple, list[Tool]]:
+        """
+        Returns the signature and the (cached) tools of `vendor_id`. The tools are
+        rebuilt only if the vendor's indices, descriptions or retrieval settings changed.
+        """
+        signature = self._toolset_signature(vendor_id)
+        with toolset_lock:
+            cached_toolset = toolset_cache.get(vendor_id, None)
+            if cached_toolset is not None and cached_toolset[0] == signature:
+                return cached_toolset
 
-                filename = index.split("_")[2]
-                tools.append(Tool(
-                    name=f"{filename} - Tool#{i}",
-                    func=chain,
-                    description=all_mappings[index]['mappings']['_meta']['description'],
-                    args_schema=QAInput
-                ))
+        retrieval = dict(signature[1])
+        tools = []
+        for i, (index, description) in enumerate(signature[0]):
+            filename = index.split("_")[2]
+            tools.append(Tool(
+                name=f"{filename} - Tool#{i}",
+                func=LazyRetrievalQA(index, retrieval),
+                description=description,
+                args_schema=QAInput
+            ))
+
+        self.logger.msg = "Built %s tool(s) for vendor [%s]." % (
+            len(tools), Fore.LIGHTYELLOW_EX + vendor_id + Fore.RESET)
+        self.logger.info()
 
-        # Add default Tools after specialized ones
-        # tools.append(serpapi_tool)
+        with toolset_lock:
+            toolset_cache[vendor_id] = (signature, tools)
+        return signature, tools
 
-        return tools
+    def generate_index_tools(self, vendor_id: str) -> list[Tool]:
+        """
+        Function that returns a list of tools (one per 'info' index with a description)
+        under the provided `vendor_id` for a LangChain agent to use.
+        """
+        return self._get_toolset(vendor_id)[1]
 
     @staticmethod
     def save_answers(vendor_id: str, answers: list[str]):
@@ -734,7 +965,7 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
                 Document(page_content=val) for val in answers]
         answer_index = "_".join(["answers", vendor_id])
 
-        embeddings = OpenAIEmbeddings()
+        embeddings = get_embeddings()
         client = LingtelliElastic2()
 
         if client.indices.exists(index=answer_index).body:
@@ -742,9 +973,9 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
             client.logger.warning()
             raise client.logger
 
-        es = ElasticVectorSearch(
-            'http://localhost:9200', answer_index, embeddings)
+        es = LingtelliVectorStore(answer_index, embeddings, client=client)
         es.add_documents(answer_docs)
+        invalidate_vendor(vendor_id)
 
     def search_gpt(self, gpt_obj: QueryVendorSessionFile) -> str:
         """
@@ -753,24 +984,35 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
         self.language = get_language(gpt_obj.query)
         self.logger.msg = f"Query language: {Fore.LIGHTBLUE_EX + self.language + Fore.RESET}"
         self.logger.info()
+        self.degraded = False
 
         now = datetime.now().astimezone()
         timestamp = date_to_str(now)
+        with stage("total", gpt_obj.vendor_id):
+            return self._search_gpt(gpt_obj, now, timestamp)
 
-        memory = self._load_memory(
-            gpt_obj.vendor_id, gpt_obj.session)
+    def _search_gpt(self, gpt_obj: QueryVendorSessionFile, now: datetime, timestamp: str) -> str:
+        """
+        Body of `search_gpt`, split off so that the whole request is timed.
+        """
+        with stage("memory_load", gpt_obj.vendor_id):
+            memory = self._load_memory(
+                gpt_obj.vendor_id, gpt_obj.session)
 
         # Check [<vendor_id>-qa] index for previously asked questions
         qa_index = "_".join(["hist", gpt_obj.vendor_id, "*"])
-        results = self._check_qa(qa_index, gpt_obj.query)
+        with stage("qa_check", gpt_obj.vendor_id):
+            results = self._check_qa(qa_index, gpt_obj.query)
 
         if not results:
-            results = self.embed_search_answers(gpt_obj, memory)
+            with stage("answers_search", gpt_obj.vendor_id):
+                results = self.embed_search_answers(gpt_obj, memory)
         if not results:
             if gpt_obj.strict:
                 try:
-                    results = self.answer_agent(
-                        gpt_obj.vendor_id, gpt_obj.query, memory)
+                    with stage("agent", gpt_obj.vendor_id):
+                        results = self.answer_agent(
+                            gpt_obj.vendor_id, gpt_obj.query, memory)
                     # Memory is handled by agent`
                 except Exception as err:
                     self.logger.msg = "Could NOT get an answer from LangChain agent!"
@@ -779,13 +1021,15 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
                     self.logger.warning()
                     results = self.answer_gpt(gpt_obj, memory)
                     # Only add to history manually if asking GPT directly
-                    memory.chat_memory.add_user_message(gpt_obj.query)
-                    memory.chat_memory.add_ai_message(results)
+                    if not self.degraded:
+                        memory.chat_memory.add_user_message(gpt_obj.query)
+                        memory.chat_memory.add_ai_message(results)
             else:
                 results = self.answer_gpt(gpt_obj, memory)
                 # Only add to history manually if asking GPT directly
-                memory.chat_memory.add_user_message(gpt_obj.query)
-                memory.chat_memory.add_ai_message(results)
+                if not self.degraded:
+                    memory.chat_memory.add_user_message(gpt_obj.query)
+                    memory.chat_memory.add_ai_message(results)
 
         if len(results) == 0:
             self.logger.msg = "Got NO answer!!!"
@@ -793,40 +1037,72 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
             raise self.logger
 
         finish_timestamp = datetime.now().astimezone()
-        finish_time = (finish_timestamp - now).seconds
+        finish_time = round((finish_timestamp - now).total_seconds())
 
         history_index = "_".join(
             ["hist", gpt_obj.vendor_id, gpt_obj.session])
-        self.index(
-            index=history_index,
-            document={
-                "user": gpt_obj.query,
-                "ai": results,
-                "timestamp": timestamp
-            }
-        )
+        # Sources-only answers must not be served again by `_check_qa`
+        if not self.degraded:
+            with stage("history_write", gpt_obj.vendor_id):
+                self.index(
+                    index=history_index,
+                    document={
+                        "user": gpt_obj.query,
+                        "ai": results,
+                        "timestamp": timestamp
+                    }
+                )
 
-        self.logger.msg = "Index: " + Fore.LIGHTYELLOW_EX + \
-            gpt_obj.vendor_id + Fore.RESET
-        self.logger.msg += "".join([
-            Fore.BLUE + f"\nHistory #{i+1} Human: " +
-            Fore.RESET + f"{message.content}" if i % 2 == 0 else
-            Fore.GREEN + f"\nHistory #{i+1} AI: " +
-            Fore.RESET + f"{message.content}"
-            for i, message in enumerate(memory.chat_memory.messages[:-2])
-        ])
-
-        self.logger.msg += "\n" + Fore.LIGHTBLUE_EX + \
-            "Question: " + Fore.RESET + gpt_obj.query
-        self.logger.msg += "\n" + Fore.LIGHTGREEN_EX + \
-            "Answer: " + Fore.RESET + results
-        self.logger.info()
+        self.logger.log(logging.INFO, "Index: %s, question: %s, answer: %s (%ss)",
+                        gpt_obj.vendor_id, gpt_obj.query, results, finish_time)
+        # The whole history is only formatted when debugging
+        if self.logger.enabled(logging.DEBUG):
+            self.logger.log(logging.DEBUG, "History of [%s]:%s", gpt_obj.session, "".join(
+                f"\nHistory #{i+1} {'Human' if i % 2 == 0 else 'AI'}: {message.content}"
+                for i, message in enumerate(memory.chat_memory.messages[:-2])))
         log_dict = {"vendor_id": gpt_obj.vendor_id,
                     "Q": gpt_obj.query, "A": results, "T": finish_time, "verified": None}
-        self.logger.save_message_log(data=log_dict)
+        with stage("log_write", gpt_obj.vendor_id):
+            self.logger.save_message_log(data=log_dict)
 
         return results
 
+    def set_retrieval(self, retrieval_obj: RetrievalModel) -> dict:
+        """
+        Sets how the 'info' indices of a `vendor_id` are searched.
+        The settings are kept in the `_meta` of the 'template_<vendor_id>' index.
+        Returns the settings that were saved.
+        """
+        if retrieval_obj.mode not in RETRIEVAL_MODES or retrieval_obj.fusion not in FUSION_METHODS or \
+                not 0 <= retrieval_obj.vector_weight <= 1:
+            self.logger.msg = "Invalid retrieval settings!"
+            self.logger.error(extra_msg="Acceptable modes: %s; fusion methods: %s; 'vector_weight' within [0, 1]." % (
+                ", ".join(RETRIEVAL_MODES), ", ".join(FUSION_METHODS)))
+            raise self.logger
+
+        retrieval = {
+            "mode": retrieval_obj.mode,
+            "fusion": retrieval_obj.fusion,
+            "vector_weight": retrieval_obj.vector_weight
+        }
+        template_index = "_".join(["template", retrieval_obj.vendor_id])
+
+        if self.indices.exists(index=template_index).body:
+            # 'put_mapping' replaces the whole '_meta', so keep the template
+            meta = self.indices.get_mapping(index=template_index).body[template_index][
+                'mappings'].get('_meta', dict())
+            meta['retrieval'] = retrieval
+            self.indices.put_mapping(index=template_index, meta=meta)
+        else:
+            self.indices.create(index=template_index, mappings={
+                                "_meta": {"retrieval": retrieval}})
+
+        retrieval_cache.pop(retrieval_obj.vendor_id, None)
+        self.logger.msg = "Successfully set retrieval for index: %s" % (
+            Fore.LIGHTCYAN_EX + template_index + Fore.RESET)
+        self.logger.info(extra_msg=str(retrieval))
+        return retrieval
+
     def set_template(self, template_obj: TemplateModel) -> str:
         """
         Sets template according to parameters.
@@ -852,15 +1128,15 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
             # It starts with 'info' and exists
             if full_index.startswith("info") and self.indices.exists(index=full_index).body:
                 mappings = self.indices.get_mapping(index=full_index).body
-                description = mappings.get(full_index).get('mappings').get(
-                    '_meta', dict()).get('description', None)
-                if description is not None:
-                    self.indices.put_mapping(index=full_index, meta={
-                        "description": description,
+                meta = mappings.get(full_index).get(
+                    'mappings').get('_meta', dict())
+                if meta.get('description', None) is not None:
+                    meta.update({
                         "template": template_obj.template,
                         "role": template_obj.role,
                         "sentiment": template_obj.sentiment
                     })
+                    self.indices.put_mapping(index=full_index, meta=meta)
                 else:
                     self.logger.msg = "Could NOT get the description for index " + \
                         "[%s]" % (Fore.LIGHTRED_EX + full_index + Fore.RESET)
@@ -869,11 +1145,14 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
 
             # It starts with 'template' and exists
             elif self.indices.exists(index=full_index).body:
-                self.indices.put_mapping(index=full_index, meta={
+                meta = self.indices.get_mapping(index=full_index).body[full_index][
+                    'mappings'].get('_meta', dict())
+                meta.update({
                     "template": template_obj.template,
                     "role": template_obj.role,
                     "sentiment": template_obj.sentiment
                 })
+                self.indices.put_mapping(index=full_index, meta=meta)
 
             # Definitely starts with 'template' but does NOT exist
             else:
@@ -886,6 +1165,7 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
                     }}
                 )
 
+            invalidate_vendor(template_obj.vendor_id)
             self.logger.msg = "Successfully set a template for index: %s" % (
                 Fore.LIGHTCYAN_EX + full_index + Fore.RESET)
             self.logger.info()
@@ -893,48 +1173,27 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
 
     def translate(self, text: str) -> str:
         """
-        Method translating a piece of text to English.
+        Method generating an English tool description from a (Chinese) file summary.
         """
-        llm = ChatOpenAI(temperature=0.3, max_tokens=600)
-        results = llm.generate([[SystemMessage(
-            content="The user will provide some content in Traditional Chinese and it is about a tool that can retrieve some kind of information and it consists of sentences that are extracted from a larger text through keyword ranking; thus it makes little sense trying to read it like normal text, but it is an extraction that tells you a little bit about the content of a file as a whole. Based on this extraction, please generate a summary of 2 to 3 sentences for this file in English from the viewpoint of what information you can expect to gather with the tool, e.g. start with something like 'This tool is useful when you need information about ...', and respond with the English summary only."), HumanMessage(content=f"Hi! Here is some content in Traditional Chinese:\n\n{text}")]])
-
-        return results.generations[0][0].text
+        return get_translation_service().translate("description", text)
 
     def translate_ch(self, text: str) -> str:
         """
         Method translating a piece of text to Chinese.
         """
-        llm = ChatOpenAI(temperature=0)
-        results = llm.generate([[SystemMessage(
-            content="The user will provide some content in English, and I need you to translate the content to Traditional Chinese as spoken in Taiwan, then respond with the translated content only - no additional comments needed and NO simplified chinese; only Traditional Chinese is allowed."), HumanMessage(content=f"Here is some content in English:\n\n{text}")]])
-
-        return results.generations[0][0].text
+        return get_translation_service().translate("ch", text)
 
     def translate_en(self, text: str) -> str:
         """
         Method translating a piece of text to English.
         """
-        llm = ChatOpenAI(temperature=0)
-        results = llm.generate([[SystemMessage(
-            content="The user will provide some content in Chinese, and I need you to translate the content to English, then respond with the translated content only - no additional comments needed."), HumanMessage(content=f"Here is some content in Chinese:\n\n{text}")]])
-
-        return results.generations[0][0].text
+        return get_translation_service().translate("en", text)
 
     def translate_en_bulk(self, texts: list[str]) -> list[str]:
         """
-        Method translating a piece of text to English.
+        Method translating several pieces of text to English.
         """
-        llm = ChatOpenAI(temperature=0)
-        prompts = []
-        for text in texts:
-            prompts.append([SystemMessage(
-                content="The user will provide some content in Chinese, and I need you to translate the content to English, then respond with the translated content only - no additional comments needed."), HumanMessage(content=f"Here is some content in Chinese:\n\n{text}")])
-
-        results = [result[0].text for result in llm.generate(
-            prompts).generations]
-
-        return results
+        return get_translation_service().translate_many("en", texts)
 
     def summarize_text(self, text: str) -> str:
         """
@@ -942,7 +1201,7 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
         to summarize the WHOLE content and then save into different indices depending
         on which cluster the documents 'belong to' in the end.
         """
-        llm = ChatOpenAI(model_name="gpt-4", temperature=0.2, max_tokens=1000)
+        llm = get_chat_model(model_name="gpt-4", temperature=0.2, max_tokens=1000)
         tokens = llm.get_num_tokens(text)
         if tokens > 50000:
             num_clusters = tokens % 10000
@@ -954,25 +1213,33 @@ E.g. if your answer would have been 'Yes.', it should now be '是的'.")
         results = ""
         answer_index = "_".join(["answers", gpt_obj.vendor_id])
         try:
-            self.indices.exists(inde=answer_index)
+            if not self.indices.exists(index=answer_index).body:
+                return ""
         except Exception as err:
             self.logger.msg = "Index probably doesn't exist: [%s]" % (
                 Fore.LIGHTRED_EX + answer_index + Fore.RESET)
             self.logger.error(extra_msg=str(err))
             return ""
         
-        es = ElasticVectorSearch(
-            "http://" + self.settings.elastic_server +
-            ":" + str(self.settings.elastic_port),
-            answer_index,
-            OpenAIEmbeddings()
-        )
+        es = LingtelliVectorStore(
+            answer_index, index_embeddings(self, answer_index), client=self)
 
         docs = [{"doc": doc[0].page_content, "score": doc[1]} for doc in es.similarity_search_with_score(
             gpt_obj.query)]
+        scores = [doc["score"] for doc in docs]
 
         high_score_docs = [f"#{num+1}: {doc['doc']}" for num, doc in enumerate(docs)]
 
+        # Only ask the LLM judge when the scores are NOT decisive
+        decision = decide(gpt_obj.vendor_id, scores)
+        self.logger.msg = "Answer selection: %s" % (
+            Fore.LIGHTCYAN_EX + decision + Fore.RESET)
+        self.logger.info(extra_msg="Scores: %s" % str(scores))
+        if decision == "accept":
+            return high_score_docs[0]
+        if decision == "reject":
+            return ""
+
         prompt = """\
 You will be presented with up to 4 answers and a question at the very bottom, and your duty is to help decide whether any of these answers are actually the answer to that question.
 
@@ -1023,19 +1290,27 @@ ANSWERS:
         if len(high_score_docs) > 0:
             answers = [doc for doc in high_score_docs]
             prompt = prompt.format(ANSWERS="\n\n".join(answers))
-            self.logger.msg = "Current answers: \n%s\n\n" % (
-                "\n".join(answers))
-            self.logger.info(extra_msg=str(Fore.LIGHTMAGENTA_EX + prompt + Fore.RESET))
+            # The candidates (the rest of the prompt is fixed) are only logged when debugging
+            if self.logger.enabled(logging.DEBUG):
+                self.logger.log(logging.DEBUG, "Answers judged for [%s]:\n%s",
+                                gpt_obj.vendor_id, "\n".join(answers))
         else:
             self.logger.msg = "No document with high enough score could be obtained!"
             self.logger.error()
             return ""
 
-        results = self.answer_gpt_with_prompt(gpt_obj, memory, prompt)
+        try:
+            results = self.answer_gpt_with_prompt(gpt_obj, memory, prompt)
+        except CircuitOpenError:
+            # No judge: answered (sources only) by 'answer_gpt' instead
+            self.logger.msg = "LLM unavailable, skipping the answer judge!"
+            self.logger.warning()
+            return ""
 
-        for doc in high_score_docs:
+        for num, doc in enumerate(high_score_docs):
             found_index = results.find(doc)
             if found_index != -1:
+                record_verdict(gpt_obj.vendor_id, scores, num)
                 self.logger.msg = "Found answer: '%s'" % (Fore.LIGHTCYAN_EX + doc + Fore.RESET)
                 self.logger.info(extra_msg="Full answer from GPT: '{}'".format(
                     Fore.LIGHTRED_EX + results + Fore.RESET
@@ -1053,8 +1328,15 @@ ANSWERS:
                     Fore.LIGHTCYAN_EX + results + Fore.RESET)
                 self.logger.info(extra_msg="Current ")
                 num = int(results[1]) - 1
+                if num >= len(high_score_docs):
+                    self.logger.msg = "LLM picked an answer that does NOT exist!"
+                    self.logger.error(extra_msg="LLM answer is '{}'".format(
+                        Fore.LIGHTRED_EX + results + Fore.RESET))
+                    return ""
+                record_verdict(gpt_obj.vendor_id, scores, num)
                 results = high_score_docs[num]
             else:
+                record_verdict(gpt_obj.vendor_id, scores, -1)
                 self.logger.msg = "Could NOT get a proper answer!"
                 self.logger.error()
                 return ""
@@ -1065,6 +1347,14 @@ ANSWERS:
         """
         Method that returns a concatinated lump of source documents as a `str`.
         """
+        chunks, final_index = self.embed_search_chunks(query_obj)
+        return "\n".join(text for text, _ in chunks), final_index
+
+    def embed_search_chunks(self, query_obj: QueryVendorSession) -> tuple[list[tuple[str, float]], str]:
+        """
+        Method that returns the source documents as `(text, score)` tuples
+        together with the index they were found in.
+        """
         self.language = get_language(query_obj.query)
         index = "_".join(["info", query_obj.vendor_id, "*"])
         all_mappings: dict[str, str] = self.indices.get_mapping(
@@ -1091,11 +1381,12 @@ ANSWERS:
             self.logger.error(
                 extra_msg="Indices that did NOT match: [%s]" % ", ".join(str(Fore.LIGHTYELLOW_EX + index + Fore.RESET) for index in non_matching_indices))
         else:
-            db = Chroma.from_texts([doc[1]
-                                for doc in documents], OpenAIEmbeddings())
+            with stage("routing", query_obj.vendor_id):
+                db = Chroma.from_texts([doc[1]
+                                        for doc in documents], get_embeddings())
 
-            final_index_desc = db.similarity_search(query_obj.query, k=1)[
-                0].page_content
+                final_index_desc = db.similarity_search(query_obj.query, k=1)[
+                    0].page_content
             for doc in documents:
                 if doc[1] == final_index_desc:
                     final_index = doc[0]
@@ -1105,17 +1396,15 @@ ANSWERS:
             self.logger.msg = "Could NOT get " + Fore.LIGHTYELLOW_EX + "`final_index`" + Fore.RESET + \
                 " to look through!"
             self.logger.error()
-            full_text = ""
+            chunks = []
         else:
-            vectorstore = ElasticVectorSearch(
-                "http://" + self.settings.elastic_server +
-                ":" + str(self.settings.elastic_port),
-                final_index,
-                OpenAIEmbeddings()
-            )
-            full_text = "\n".join([doc.page_content for doc in vectorstore.similarity_search(query_obj.query, k=4)])
+            with stage("retrieval", query_obj.vendor_id):
+                vectorstore = self._vectorstore(
+                    final_index, query_obj.vendor_id)
+                chunks = [(doc.page_content, score) for doc, score in vectorstore.similarity_search_with_score(
+                    query_obj.query, k=4)]
 
-        return full_text, final_index
+        return chunks, final_index
 
     def embed_search_with_sources(self, query_obj: VendorFileQuery) -> tuple[list[str], float]:
         """
@@ -1128,16 +1417,12 @@ ANSWERS:
             self.language = get_language(query_obj.query)
             now = datetime.now().astimezone()
             index = "_".join(["info", query_obj.vendor_id, filename, filetype])
-            vectorstore = ElasticVectorSearch(
-                "http://" + self.settings.elastic_server +
-                ":" + str(self.settings.elastic_port),
-                index,
-                OpenAIEmbeddings()
-            )
-            results = [doc.page_content for doc in vectorstore.similarity_search(
-                query_obj.query, k=3)]
+            with stage("retrieval", query_obj.vendor_id):
+                vectorstore = self._vectorstore(index, query_obj.vendor_id)
+                results = [doc.page_content for doc in vectorstore.similarity_search(
+                    query_obj.query, k=3)]
             finish_time = round(
-                (datetime.now().astimezone() - now).microseconds / 1000000, 2)
+                (datetime.now().astimezone() - now).total_seconds(), 2)
             self.logger.msg = "Embedded search complete!"
             self.logger.info(extra_msg="Finished in {}s".format(finish_time))
             return results, finish_time
@@ -0,0 +1,202 @@
+"""
+Module holding the cache for LLM completions.\n
+Completions of temperature-0 calls only depend on the model, its parameters
+and the messages sent, so identical calls (the same FAQ question against the
+same context, the same summary to translate, ...) are answered from:\n
+1. an in-memory LRU tier (per process, with TTL), then\n
+2. a persistent SQLite tier (shared by all workers, with TTL).\n
+Keys also contain a per-vendor version which is bumped by `invalidate()`
+whenever a vendor's data (files, answers, templates) changes.\n
+Hits per tier and misses are served on `/metrics` (see `stats.metrics`).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cachetools import TTLCache
+from langchain.chat_models import ChatOpenAI
+from langchain.schema import BaseMessage
+
+from errors.errors import ElasticError
+from settings.settings import CACHE_DIR
+from stats.metrics import LLM_CACHE_LOOKUPS
+from . import LLM_CACHE_ENABLED, LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_VERSION_TTL
+
+LLM_CACHE_FILE = os.path.join(CACHE_DIR, "llm_cache.sqlite3")
+
+# Completions that don't belong to any vendor (e.g. translations) use this "vendor"
+GLOBAL_VENDOR = ""
+
+
+class LLMCache(object):
+    """
+    Two-tier (memory + SQLite) cache of LLM completions.\n
+    Use `get_llm_cache()` to get the process-wide instance.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_FILE, maxsize: int = LLM_CACHE_SIZE, ttl: int = LLM_CACHE_TTL):
+        self.logger = ElasticError(__file__, self.__class__.__name__)
+        self.path = path
+        self.ttl = ttl
+        self.memory: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.versions: TTLCache = TTLCache(
+            maxsize=1024, ttl=LLM_CACHE_VERSION_TTL)
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY, vendor_id TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL)""")
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS completions_vendor ON completions (vendor_id)")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS vendor_versions (
+                vendor_id TEXT PRIMARY KEY, version INTEGER NOT NULL)""")
+
+    def _version(self, vendor_id: str) -> int:
+        """
+        Current data version of `vendor_id` (re-read from SQLite every
+        `LLM_CACHE_VERSION_TTL` seconds so that invalidations reach all workers).
+        """
+        with self.lock:
+            if vendor_id in self.versions:
+                return self.versions[vendor_id]
+            row = self.db.execute(
+                "SELECT version FROM vendor_versions WHERE vendor_id = ?", (vendor_id,)).fetchone()
+            self.versions[vendor_id] = row[0] if row else 0
+            return self.versions[vendor_id]
+
+    def key(self, model: str, params: dict, messages: list[BaseMessage], vendor_id: str = GLOBAL_VENDOR) -> str:
+        """
+        SHA-256 over the model, its parameters, every message (type + content)
+        and the vendor's data version.
+        """
+        payload = json.dumps({
+            "model": model,
+            "params": params,
+            "messages": [[message.type, message.content] for message in messages],
+            "vendor_id": vendor_id,
+            "version": self._version(vendor_id)
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            response = self.memory.get(key, None)
+            if response is not None:
+                LLM_CACHE_LOOKUPS.labels(result="memory_hit").inc()
+                return response
+
+            row = self.db.execute("SELECT response FROM completions WHERE key = ? AND created > ?",
+                                  (key, time.time() - self.ttl)).fetchone()
+            if row is None:
+                LLM_CACHE_LOOKUPS.labels(result="miss").inc()
+                return None
+            LLM_CACHE_LOOKUPS.labels(result="disk_hit").inc()
+            self.memory[key] = row[0]
+            return row[0]
+
+    def set(self, key: str, response: str, vendor_id: str = GLOBAL_VENDOR) -> None:
+        with self.lock:
+            self.memory[key] = response
+            try:
+                with self.db:
+                    self.db.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)",
+                                    (key, vendor_id, response, time.time()))
+            except sqlite3.Error as err:
+                self.logger.msg = "Could NOT save completion into SQLite cache!"
+                self.logger.warning(extra_msg=str(err))
+
+    def invalidate(self, vendor_id: str) -> int:
+        """
+        Drops every cached completion of `vendor_id` (call whenever its data changes).
+        Returns the number of completions removed from the SQLite tier.
+        """
+        with self.lock, self.db:
+            self.db.execute("""INSERT INTO vendor_versions VALUES (?, 1)
+                ON CONFLICT(vendor_id) DO UPDATE SET version = version + 1""", (vendor_id,))
+            removed = self.db.execute(
+                "DELETE FROM completions WHERE vendor_id = ?", (vendor_id,)).rowcount
+            self.versions.pop(vendor_id, None)
+
+        self.logger.msg = "Invalidated %s cached completion(s) of vendor [%s]." % (
+            removed, vendor_id)
+        self.logger.info()
+        return removed
+
+    def purge(self) -> int:
+        """
+        Removes expired completions from the SQLite tier.
+        """
+        with self.lock, self.db:
+            return self.db.execute("DELETE FROM completions WHERE created <= ?",
+                                   (time.time() - self.ttl,)).rowcount
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """
+    Returns the process-wide `LLMCache` (created on first use).
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def invalidate_vendor(vendor_id: str) -> None:
+    """
+    Shortcut for `get_llm_cache().invalidate(vendor_id)` that never raises,
+    as failing to invalidate must not fail the data change itself.
+    """
+    if not LLM_CACHE_ENABLED:
+        return
+    try:
+        get_llm_cache().invalidate(vendor_id)
+    except Exception as err:
+        logger = ElasticError(__file__, "es.llm_cache:invalidate_vendor")
+        logger.msg = "Could NOT invalidate cached completions of vendor [%s]!" % vendor_id
+        logger.warning(extra_msg=str(err))
+
+
+def completion_key(llm: ChatOpenAI, messages: list[BaseMessage], vendor_id: str = GLOBAL_VENDOR, overrides: dict = None) -> str:
+    """
+    Returns the cache key of sending `messages` to `llm` (with per-call `overrides`).
+    """
+    return get_llm_cache().key(llm.model_name, {
+        "temperature": llm.temperature,
+        "max_tokens": llm.max_tokens,
+        "n": llm.n,
+        "model_kwargs": llm.model_kwargs,
+        **(overrides or {})
+    }, messages, vendor_id)
+
+
+def cached_generate(llm: ChatOpenAI, messages: list[BaseMessage], vendor_id: str = GLOBAL_VENDOR, sampled: bool = False, **overrides) -> str:
+    """
+    Returns `llm.generate([messages], **overrides)`'s text, from the cache if possible.\n
+    `overrides` are per-call request parameters (e.g. `max_tokens=1000`), so that
+    shared clients (see `es.llm_clients`) never have to be copied.\n
+    Only temperature-0 calls are cached, unless `sampled=True` is passed for calls
+    where any one sample is an acceptable answer (e.g. translating a summary).
+    """
+    temperature = overrides.get("temperature", llm.temperature)
+    if not LLM_CACHE_ENABLED or (temperature != 0 and not sampled):
+        return llm.generate([messages], **overrides).generations[0][0].text
+
+    cache = get_llm_cache()
+    key = completion_key(llm, messages, vendor_id, overrides)
+    results = cache.get(key)
+    if results is None:
+        results = llm.generate(
+            [messages], **overrides).generations[0][0].text
+        cache.set(key, results, vendor_id)
+    return results
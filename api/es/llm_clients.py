@@ -0,0 +1,41 @@
+"""
+Module holding the registry of shared LLM clients.\n
+LangChain's chat models are stateless between calls, so instead of constructing
+(and validating) a new `ChatOpenAI` for every request, one client is built per
+configuration (model, temperature, timeout, ...) and reused by every request.
+Per-request parameters (`max_tokens`, `frequency_penalty`, ...) are passed to
+`generate()` as overrides (see `es.llm_cache.cached_generate`) instead.
+"""
+import json
+import threading
+
+from errors.errors import ElasticError
+from . import PROMPT_MODEL, LLM_MAX_RETRIES, LLM_REQUEST_TIMEOUT
+from .llm_gateway import GatewayChatOpenAI
+
+CHAT_DEFAULTS = {
+    "model_name": PROMPT_MODEL,
+    "temperature": 0,
+    "max_retries": LLM_MAX_RETRIES,
+    "request_timeout": LLM_REQUEST_TIMEOUT
+}
+
+_chat_models: dict[str, GatewayChatOpenAI] = {}
+_chat_models_lock = threading.Lock()
+
+
+def get_chat_model(**config) -> GatewayChatOpenAI:
+    """
+    Returns the shared chat model of `config` (on top of `CHAT_DEFAULTS`),
+    building it on first use, e.g. `get_chat_model(model_name="gpt-4", temperature=0.2)`.
+    """
+    config = {**CHAT_DEFAULTS, **config}
+    key = json.dumps(config, sort_keys=True)
+    with _chat_models_lock:
+        if key not in _chat_models:
+            _chat_models[key] = GatewayChatOpenAI(**config)
+            logger = ElasticError(__file__, "es.llm_clients:get_chat_model")
+            logger.msg = "Built shared chat model #%s." % len(_chat_models)
+            logger.info(extra_msg=key)
+        return _chat_models[key]
+
@@ -0,0 +1,347 @@
+"""
+Module holding the gateway every outbound OpenAI call (chat completions and
+embeddings) goes through. Per model it keeps:\n
+1. a concurrency limit (`LLM_MAX_CONCURRENCY`, overridable per model with
+   `LLM_MODEL_CONCURRENCY`); callers queue for at most `LLM_QUEUE_TIMEOUT` seconds,
+   and the time spent queueing is recorded,\n
+2. request hedging of short calls (see `hedgeable()`): once enough of their
+   latencies are known, a short call still running after their p95 latency gets
+   a second attempt (if a slot is free) and the first one to succeed wins,\n
+3. a circuit breaker: when at least `LLM_BREAKER_ERROR_RATE` of the last
+   `LLM_BREAKER_WINDOW` calls failed, calls fail fast with `CircuitOpenError`
+   for `LLM_BREAKER_COOLDOWN` seconds, after which a single trial call decides
+   whether to close it again. Calls that never got a slot are NOT failures of
+   the model and stay out of its window.\n
+Its statistics are exported on `/metrics` (see `stats.metrics`).\n
+`GatewayChatOpenAI` and `GatewayOpenAIEmbeddings` are drop-in replacements of
+LangChain's `ChatOpenAI` and `OpenAIEmbeddings` that route through the gateway.\n
+As every request runs on one of the gateway's long-lived threads, each thread's
+keep-alive HTTP session (pooled connections, see `make_session()`) is reused
+across requests instead of being set up again.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+from typing import Any, Callable
+
+import openai
+import requests
+from langchain.chat_models import ChatOpenAI
+from langchain.embeddings import OpenAIEmbeddings
+
+from errors.errors import ElasticError
+from stats.metrics import LLM_CALLS, LLM_HEDGES, LLM_CALL_SECONDS, LLM_QUEUE_SECONDS, LLM_IN_FLIGHT, LLM_QUEUED, LLM_BREAKER_STATE
+from stats.tracing import add_event, span
+from . import LLM_MAX_CONCURRENCY, LLM_MODEL_CONCURRENCY, LLM_QUEUE_TIMEOUT, LLM_HEDGING, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MAX_TOKENS, LLM_LATENCY_WINDOW, LLM_BREAKER_WINDOW, LLM_BREAKER_ERROR_RATE, LLM_BREAKER_COOLDOWN, LLM_MAX_RETRIES
+from . import LLM_REQUEST_TIMEOUT, LLM_POOL_CONNECTIONS, LLM_POOL_MAXSIZE
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half-open"
+# Values of the breaker state gauge
+BREAKER_LEVELS = {BREAKER_CLOSED: 0, BREAKER_HALF_OPEN: 1, BREAKER_OPEN: 2}
+
+# Threads running outbound calls (hedges included); calls only get one once
+# they hold a slot of their model, so a slow model can't take them all
+GATEWAY_WORKERS = int(128)
+
+
+class CircuitOpenError(ElasticError):
+    """
+    Error raised by the LLM gateway when a model's circuit breaker is open.
+    """
+
+    def __init__(self, file: str, cls: str, msg: str = "", *args):
+        super().__init__(file, cls, msg, *args)
+
+
+def make_session() -> requests.Session:
+    """
+    HTTP session for OpenAI requests with a keep-alive connection pool.
+    """
+    session = requests.Session()
+    if openai.proxy:
+        session.proxies = openai.proxy if isinstance(openai.proxy, dict) else {
+            "http": openai.proxy, "https": openai.proxy}
+    session.mount("https://", requests.adapters.HTTPAdapter(
+        pool_connections=LLM_POOL_CONNECTIONS, pool_maxsize=LLM_POOL_MAXSIZE,
+        max_retries=openai.api_requestor.MAX_CONNECTION_RETRIES))
+    return session
+
+
+def _install_session() -> None:
+    """
+    Gives the current (gateway) thread its session up front; `openai` keeps one
+    session per thread (`openai.api_requestor._thread_context`).
+    """
+    openai.api_requestor._thread_context.session = make_session()
+
+
+def percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def hedgeable(max_tokens: int | None) -> bool:
+    """
+    Whether a completion of at most `max_tokens` is short enough to be hedged;
+    the latency of longer ones depends on the length of the answer more than
+    on the provider.
+    """
+    return max_tokens is not None and max_tokens <= LLM_HEDGE_MAX_TOKENS
+
+
+class ModelGate(object):
+    """
+    Concurrency limit, latency statistics and circuit breaker of ONE model.
+    """
+
+    def __init__(self, model: str, limit: int):
+        self.logger = ElasticError(__file__, self.__class__.__name__)
+        self.model = model
+        self.limit = limit
+        self.slots = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        # Latencies of the calls that may be hedged (see `hedgeable()`)
+        self.latencies: deque = deque(maxlen=LLM_LATENCY_WINDOW)
+        self.outcomes: deque = deque(maxlen=LLM_BREAKER_WINDOW)
+        self.opened_at = 0.0
+        self.trial = False
+        self._set_state(BREAKER_CLOSED)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        LLM_BREAKER_STATE.labels(model=self.model).set(BREAKER_LEVELS[state])
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go out now (`False` while the breaker is open, and
+        for everything but the trial call while it is half-open).
+        """
+        with self.lock:
+            if self.state == BREAKER_OPEN:
+                if time.monotonic() - self.opened_at < LLM_BREAKER_COOLDOWN:
+                    LLM_CALLS.labels(model=self.model, result="rejected").inc()
+                    return False
+                self._set_state(BREAKER_HALF_OPEN)
+                self.trial = False
+            if self.state == BREAKER_HALF_OPEN:
+                if self.trial:
+                    LLM_CALLS.labels(model=self.model, result="rejected").inc()
+                    return False
+                self.trial = True
+            return True
+
+    def _open(self) -> None:
+        self._set_state(BREAKER_OPEN)
+        self.opened_at = time.monotonic()
+        self.trial = False
+        self.logger.msg = "Circuit breaker of [%s] is OPEN for %ss!" % (
+            self.model, LLM_BREAKER_COOLDOWN)
+        self.logger.warning(extra_msg="Last outcomes: %s" % list(self.outcomes))
+
+    def record(self, success: bool, latency: float, hedge: bool = False) -> None:
+        """
+        Records the outcome of a call that went out to the model (`hedge`: the
+        call may be hedged, so its latency counts towards `hedge_delay()`).
+        """
+        LLM_CALLS.labels(model=self.model,
+                         result="success" if success else "error").inc()
+        if success:
+            LLM_CALL_SECONDS.labels(model=self.model).observe(latency)
+        with self.lock:
+            self.outcomes.append(success)
+            if success and hedge:
+                self.latencies.append(latency)
+
+            if self.state == BREAKER_HALF_OPEN:
+                if success:
+                    self._set_state(BREAKER_CLOSED)
+                    self.outcomes.clear()
+                else:
+                    self._open()
+            elif self.state == BREAKER_CLOSED and not success and \
+                    len(self.outcomes) >= LLM_BREAKER_WINDOW // 2 and \
+                    self.outcomes.count(False) / len(self.outcomes) >= LLM_BREAKER_ERROR_RATE:
+                self._open()
+
+    def release_trial(self) -> None:
+        """
+        Lets another call be the trial when the trial call never went out.
+        """
+        with self.lock:
+            if self.state == BREAKER_HALF_OPEN:
+                self.trial = False
+
+    def hedge_delay(self) -> float | None:
+        """
+        p95 latency (of the calls that may be hedged) after which such a call
+        is hedged (`None` = don't hedge).
+        """
+        with self.lock:
+            if not LLM_HEDGING or self.state != BREAKER_CLOSED or \
+                    len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            return percentile(list(self.latencies), 0.95)
+
+    def acquire(self) -> None:
+        """
+        Queues for a slot of this model, for at most `LLM_QUEUE_TIMEOUT` seconds.
+        Called by the caller's own thread, so that a slow model only ever holds
+        up its own callers and never the gateway's threads.
+        """
+        queued = LLM_QUEUED.labels(model=self.model)
+        queued.inc()
+        start = time.monotonic()
+        acquired = self.slots.acquire(timeout=LLM_QUEUE_TIMEOUT)
+        queued.dec()
+        LLM_QUEUE_SECONDS.labels(model=self.model).observe(
+            time.monotonic() - start)
+        if not acquired:
+            # The model wasn't even called: not a failure of the model
+            LLM_CALLS.labels(model=self.model, result="queue_timeout").inc()
+            self.release_trial()
+            self.logger.msg = "No free slot for [%s] within %ss!" % (
+                self.model, LLM_QUEUE_TIMEOUT)
+            self.logger.error(extra_msg="Limit: %s" % self.limit)
+            raise self.logger
+
+    def run(self, func: Callable, args: tuple, kwargs: dict, hedge: bool = False) -> Any:
+        """
+        Runs `func` within the slot of this model acquired beforehand (see
+        `acquire()`) and releases it.
+        """
+        in_flight = LLM_IN_FLIGHT.labels(model=self.model)
+        in_flight.inc()
+        start = time.monotonic()
+        try:
+            results = func(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - start, hedge)
+            raise
+        else:
+            self.record(True, time.monotonic() - start, hedge)
+            return results
+        finally:
+            in_flight.dec()
+            self.slots.release()
+
+
+class LLMGateway(object):
+    """
+    Routes outbound LLM calls through the `ModelGate` of their model.\n
+    Use `get_gateway()` to get the process-wide instance.
+    """
+
+    def __init__(self, workers: int = GATEWAY_WORKERS):
+        self.logger = ElasticError(__file__, self.__class__.__name__)
+        self.gates: dict[str, ModelGate] = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="llm-gateway", initializer=_install_session)
+
+    def gate(self, model: str) -> ModelGate:
+        with self.lock:
+            if model not in self.gates:
+                self.gates[model] = ModelGate(
+                    model, LLM_MODEL_CONCURRENCY.get(model, LLM_MAX_CONCURRENCY))
+            return self.gates[model]
+
+    def call(self, model: str, func: Callable, *args, hedge: bool = True, **kwargs) -> Any:
+        """
+        Returns `func(*args, **kwargs)`, called within `model`'s limits; `hedge`
+        only for calls of about the same (short) duration.\n
+        Raises `CircuitOpenError` right away if `model`'s breaker is open. The
+        slot is queued for here, so only calls holding a slot are handed to the pool.
+        """
+        gate = self.gate(model)
+        if not gate.allow():
+            error = CircuitOpenError(__file__, self.__class__.__name__)
+            error.msg = "Circuit breaker of [%s] is open; NOT calling it!" % model
+            error.warning()
+            raise error
+
+        gate.acquire()
+        try:
+            primary = self.pool.submit(gate.run, func, args, kwargs, hedge)
+        except Exception:
+            gate.slots.release()
+            gate.release_trial()
+            raise
+        delay = gate.hedge_delay() if hedge else None
+        if delay is None:
+            return primary.result()
+        try:
+            return primary.result(timeout=delay)
+        except TimeoutError:
+            pass
+
+        # Only hedge with spare capacity: hedges must never queue behind real calls
+        if not gate.slots.acquire(blocking=False):
+            return primary.result()
+        LLM_HEDGES.labels(model=model, result="sent").inc()
+        add_event("hedge", after=round(delay, 3))
+        try:
+            backup = self.pool.submit(gate.run, func, args, kwargs, hedge)
+        except Exception:
+            gate.slots.release()
+            return primary.result()
+
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        LLM_HEDGES.labels(model=model, result="won").inc()
+                        add_event("hedge_won")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+_gateway: LLMGateway | None = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """
+    Returns the process-wide `LLMGateway` (created on first use).
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+class GatewayChatOpenAI(ChatOpenAI):
+    """
+    `ChatOpenAI` whose completions go through the LLM gateway.
+    """
+    max_retries: int = LLM_MAX_RETRIES
+    request_timeout: float = LLM_REQUEST_TIMEOUT
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        max_tokens = kwargs.get("max_tokens", self.max_tokens)
+        with span("llm.generate", model=self.model_name, messages=len(messages)):
+            return get_gateway().call(self.model_name, super()._generate, messages, stop, run_manager, hedge=hedgeable(max_tokens), **kwargs)
+
+
+class GatewayOpenAIEmbeddings(OpenAIEmbeddings):
+    """
+    `OpenAIEmbeddings` whose requests go through the LLM gateway.
+    """
+    max_retries: int = LLM_MAX_RETRIES
+    request_timeout: float = LLM_REQUEST_TIMEOUT
+
+    def embed_documents(self, texts: list[str], chunk_size: int | None = 0) -> list[list[float]]:
+        # Batches vary too much in size for their latencies to be comparable
+        with span("embedding.documents", model=self.model, texts=len(texts)):
+            return get_gateway().call(self.model, super().embed_documents, texts, chunk_size, hedge=False)
+
+    def embed_query(self, text: str) -> list[float]:
+        with span("embedding.query", model=self.model):
+            return get_gateway().call(self.model, super().embed_query, text)
@@ -0,0 +1,150 @@
+"""
+Module holding the token-budget aware prompt builder used by `answer_gpt`.\n
+Instead of pasting every retrieved chunk and every memory message into the
+prompt, a fixed token budget is split between the system instructions, the
+question, the conversation history and the retrieved context:\n
+1. The system instructions and the question are always kept.\n
+2. The history gets up to `PROMPT_HISTORY_SHARE` of what is left (newest turns first).\n
+3. The context gets the rest (highest scoring chunks first; the last chunk
+   that doesn't fit is trimmed if enough tokens are left, else dropped).
+"""
+from functools import lru_cache
+
+import tiktoken
+from colorama import Fore
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+
+from errors.errors import ElasticError
+from . import PROMPT_MODEL, PROMPT_TOKEN_BUDGET, PROMPT_HISTORY_SHARE, PROMPT_MIN_TRIM_TOKENS
+
+# Placeholder within the system message that is replaced by the selected context
+CONTEXT_PLACEHOLDER = "<<CONTEXT>>"
+
+# Overhead of the chat format (see OpenAI's cookbook on counting tokens)
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = PROMPT_MODEL) -> tiktoken.Encoding:
+    """
+    Returns the (cached) `tiktoken` encoding of `model`, loading it only once per process.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = PROMPT_MODEL) -> int:
+    return len(get_encoding(model).encode(text))
+
+
+def trim_tokens(text: str, max_tokens: int, model: str = PROMPT_MODEL) -> str:
+    """
+    Returns the start of `text` that fits within `max_tokens` tokens.
+    """
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+class PromptBuilder(object):
+    """
+    Assembles the messages of a chat prompt within `budget` tokens.\n
+    After `build()`, `self.breakdown` holds the number of tokens (and kept/dropped
+    chunks and turns) of each part, which is also logged.
+    """
+
+    def __init__(self, model: str = PROMPT_MODEL, budget: int = PROMPT_TOKEN_BUDGET, history_share: float = PROMPT_HISTORY_SHARE):
+        self.logger = ElasticError(__file__, self.__class__.__name__)
+        self.model = model
+        self.budget = budget
+        self.history_share = history_share
+        self.breakdown: dict[str, int] = {}
+
+    def _count(self, text: str) -> int:
+        return count_tokens(text, self.model) + TOKENS_PER_MESSAGE
+
+    def _select_history(self, history: list[BaseMessage], budget: int) -> tuple[list[BaseMessage], int]:
+        """
+        Keeps the newest messages that fit within `budget`, always in whole
+        user + AI turns (pairs), and returns them in chronological order.
+        """
+        kept = []
+        used = 0
+        for end in range(len(history), 0, -2):
+            turn = history[max(end - 2, 0):end]
+            tokens = sum(self._count(message.content) for message in turn)
+            if used + tokens > budget:
+                break
+            kept = turn + kept
+            used += tokens
+        return kept, used
+
+    def _select_context(self, chunks: list[tuple[str, float]], budget: int) -> tuple[list[str], int]:
+        """
+        Keeps the highest scoring chunks that fit within `budget`.
+        The first chunk that doesn't fit is trimmed if at least `PROMPT_MIN_TRIM_TOKENS`
+        tokens are left for it; all lower scoring chunks are dropped.
+        """
+        kept = []
+        used = 0
+        for text, _ in sorted(chunks, key=lambda chunk: chunk[1], reverse=True):
+            # +1 for the newline joining the chunks
+            tokens = count_tokens(text, self.model) + 1
+            if used + tokens <= budget:
+                kept.append(text)
+                used += tokens
+                continue
+            if budget - used >= PROMPT_MIN_TRIM_TOKENS:
+                kept.append(trim_tokens(text, budget - used - 1, self.model))
+                used = budget
+            break
+        return kept, used
+
+    def build(self, system: str, question: str, chunks: list[tuple[str, float]] = None,
+              history: list[BaseMessage] = None, empty_context: str = "") -> list[BaseMessage]:
+        """
+        Returns `[system, *history, question]` messages within the token budget.\n
+        `system` must contain `CONTEXT_PLACEHOLDER` where the selected chunks
+        (`(text, score)` tuples) are inserted; `empty_context` is inserted if
+        no chunk could be kept.
+        """
+        chunks = chunks or []
+        history = history or []
+
+        system_tokens = self._count(system.replace(CONTEXT_PLACEHOLDER, ""))
+        question_tokens = self._count(question)
+        remaining = max(self.budget - system_tokens -
+                        question_tokens - TOKENS_PER_REPLY, 0)
+
+        kept_history, history_tokens = self._select_history(
+            history, int(remaining * self.history_share))
+        # Whatever the history didn't use goes to the context
+        kept_chunks, context_tokens = self._select_context(
+            chunks, remaining - history_tokens)
+
+        context = "\n".join(kept_chunks) if kept_chunks else empty_context
+        messages = [SystemMessage(content=system.replace(CONTEXT_PLACEHOLDER, context))] + \
+            kept_history + [HumanMessage(content=question)]
+
+        self.breakdown = {
+            "system": system_tokens,
+            "context": context_tokens,
+            "history": history_tokens,
+            "question": question_tokens,
+            "total": system_tokens + context_tokens + history_tokens + question_tokens + TOKENS_PER_REPLY,
+            "budget": self.budget,
+            "chunks_kept": len(kept_chunks),
+            "chunks_dropped": len(chunks) - len(kept_chunks),
+            "messages_kept": len(kept_history),
+            "messages_dropped": len(history) - len(kept_history)
+        }
+        self.logger.msg = "Prompt tokens: %s / %s" % (
+            Fore.LIGHTCYAN_EX + str(self.breakdown["total"]) + Fore.RESET, self.budget)
+        self.logger.info(extra_msg=", ".join(
+            "%s: %s" % (key, value) for key, value in self.breakdown.items()))
+        return messages
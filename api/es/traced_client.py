@@ -0,0 +1,30 @@
+"""
+Module holding the Elasticsearch client base of the API project: every request
+it sends (including the ones of its namespaced clients, e.g. `client.indices`,
+and of `helpers.bulk`) is recorded as a span of the current trace
+(see `stats.tracing`), with an `attempt` event holding the node, status and
+duration of the response, or the error(s) of the transport's attempts when it
+fails for good. Nothing is recorded (or logged) for requests that aren't sampled.
+"""
+from elasticsearch import Elasticsearch
+
+from stats.tracing import span
+
+
+class TracedElasticsearch(Elasticsearch):
+    def perform_request(self, method: str, path: str, *args, **kwargs):
+        with span("es " + method, path=path) as current:
+            if current is None:
+                return super().perform_request(method, path, *args, **kwargs)
+            try:
+                response = super().perform_request(method, path, *args, **kwargs)
+            except Exception as err:
+                # 'errors' holds the failures of the attempts the transport retried
+                for error in getattr(err, "errors", ()):
+                    current.event("attempt", error=str(error))
+                current.event("attempt", error=str(err))
+                raise
+            current.event("attempt", node=str(response.meta.node.base_url),
+                          status=response.meta.status, duration=round(response.meta.duration, 6))
+            current.set(status=response.meta.status)
+            return response
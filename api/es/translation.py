@@ -0,0 +1,143 @@
+"""
+Module holding the translation service.\n
+Instead of every caller opening its own `ChatOpenAI` for a single-prompt call,
+translation requests go through one service which:\n
+1. merges requests for a source text that is already being translated (of the
+   same kind) into the pending call, so every text is only sent once,\n
+2. translates distinct texts concurrently, each with its own call (LangChain's
+   `generate(prompts)` would send them one after the other), and resolves the
+   futures waiting for a text as soon as ITS call returns,\n
+3. caches the results like `cached_generate()` does: temperature-0 kinds always,
+   kinds with a higher temperature only if marked `"sampled"` in `TRANSLATIONS`
+   (any one sample is an acceptable answer).
+"""
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+
+from errors.errors import ElasticError
+from . import TRANSLATION_WORKERS, TRANSLATION_TIMEOUT
+from .llm_cache import cached_generate
+from .llm_clients import get_chat_model
+
+# Kind of translation -> prompt and LLM parameters
+TRANSLATIONS = {
+    # Summary of a file (Chinese) -> English description of its agent tool
+    "description": {
+        "system": "The user will provide some content in Traditional Chinese and it is about a tool that can retrieve some kind of information and it consists of sentences that are extracted from a larger text through keyword ranking; thus it makes little sense trying to read it like normal text, but it is an extraction that tells you a little bit about the content of a file as a whole. Based on this extraction, please generate a summary of 2 to 3 sentences for this file in English from the viewpoint of what information you can expect to gather with the tool, e.g. start with something like 'This tool is useful when you need information about ...', and respond with the English summary only.",
+        "human": "Hi! Here is some content in Traditional Chinese:\n\n{text}",
+        "temperature": 0.3,
+        "max_tokens": 600,
+        "sampled": True
+    },
+    "en": {
+        "system": "The user will provide some content in Chinese, and I need you to translate the content to English, then respond with the translated content only - no additional comments needed.",
+        "human": "Here is some content in Chinese:\n\n{text}",
+        "temperature": 0,
+        "max_tokens": None,
+        "sampled": False
+    },
+    "ch": {
+        "system": "The user will provide some content in English, and I need you to translate the content to Traditional Chinese as spoken in Taiwan, then respond with the translated content only - no additional comments needed and NO simplified chinese; only Traditional Chinese is allowed.",
+        "human": "Here is some content in English:\n\n{text}",
+        "temperature": 0,
+        "max_tokens": None,
+        "sampled": False
+    }
+}
+
+
+def translation_messages(kind: str, text: str) -> list[BaseMessage]:
+    spec = TRANSLATIONS[kind]
+    return [SystemMessage(content=spec["system"]),
+            HumanMessage(content=spec["human"].format(text=text))]
+
+
+def source_hash(kind: str, text: str) -> str:
+    return hashlib.sha256((kind + "\n" + text).encode("utf-8")).hexdigest()
+
+
+class TranslationService(object):
+    """
+    Translates concurrently, sending every distinct source text only once.\n
+    Use `get_translation_service()` to get the process-wide instance.
+    """
+
+    def __init__(self, workers: int = TRANSLATION_WORKERS):
+        self.logger = ElasticError(__file__, self.__class__.__name__)
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="translation")
+        # Source hash -> futures waiting for its (pending) translation
+        self.pending: dict[str, list[Future]] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, kind: str, text: str) -> Future:
+        """
+        Queues `text` for translation of `kind` (see `TRANSLATIONS`) and returns
+        a `Future` of the translated text.
+        """
+        if kind not in TRANSLATIONS:
+            self.logger.msg = "Unknown kind of translation: [%s]!" % kind
+            self.logger.error(extra_msg="Available: %s" %
+                              list(TRANSLATIONS.keys()))
+            raise self.logger
+        future = Future()
+        digest = source_hash(kind, text)
+        with self.lock:
+            if digest in self.pending:
+                self.pending[digest].append(future)
+                return future
+            self.pending[digest] = [future]
+        self.pool.submit(self._translate, kind, text, digest)
+        return future
+
+    def translate(self, kind: str, text: str, timeout: float = TRANSLATION_TIMEOUT) -> str:
+        return self.submit(kind, text).result(timeout=timeout)
+
+    def translate_many(self, kind: str, texts: list[str], timeout: float = TRANSLATION_TIMEOUT) -> list[str]:
+        """
+        Translates all `texts` (in order) concurrently.
+        """
+        futures = [self.submit(kind, text) for text in texts]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def _translate(self, kind: str, text: str, digest: str) -> None:
+        """
+        Translates `text` and resolves the futures waiting for it.
+        """
+        spec = TRANSLATIONS[kind]
+        overrides = {"max_tokens": spec["max_tokens"]
+                     } if spec["max_tokens"] else {}
+        try:
+            results = cached_generate(get_chat_model(temperature=spec["temperature"]), translation_messages(
+                kind, text), sampled=spec["sampled"], **overrides)
+        except Exception as err:
+            self.logger.msg = "Could NOT translate a text [%s]!" % kind
+            self.logger.error(extra_msg=str(err), orgErr=err)
+            with self.lock:
+                futures = self.pending.pop(digest)
+            for future in futures:
+                future.set_exception(err)
+            return
+
+        with self.lock:
+            futures = self.pending.pop(digest)
+        for future in futures:
+            future.set_result(results)
+
+
+_service: TranslationService | None = None
+_service_lock = threading.Lock()
+
+
+def get_translation_service() -> TranslationService:
+    """
+    Returns the process-wide `TranslationService` (started on first use).
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TranslationService()
+        return _service
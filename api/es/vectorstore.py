@@ -0,0 +1,622 @@
+"""
+Module holding the vector store used for the `info_` and `answers_` indices.
+
+Compared to LangChain's `ElasticVectorSearch` (which stores a plain `dense_vector`
+and scores EVERY document with a `script_score` query), indices are created with
+an indexed `dense_vector` (HNSW graph, cosine similarity) and queried with the
+`knn` search option, so latency no longer grows linearly with the corpus.
+
+NOTE: Indexed `dense_vector` fields with 1536 dimensions (OpenAI embeddings)
+require Elasticsearch >= 8.8. On older clusters, index creation falls back to the
+plain mapping and searches fall back to `script_score`.
+
+Run `python -m es.vectorstore reindex <index pattern>` to migrate existing indices.
+
+Vectors can also be stored quantized to int8 (`VECTOR_STORAGE=byte`), which makes
+the HNSW vectors 4x smaller. The full-precision vector is then kept as a compact
+base64 `binary` side field (never indexed) and used to rescore the top candidates.
+
+Besides pure vector search, the store can run a BM25 `match` query next to the
+vector query in ONE `_msearch` round trip and fuse both rankings ('hybrid'),
+with either reciprocal rank fusion or a weighted sum of normalized scores.
+"""
+import base64
+import json
+import sys
+import threading
+import uuid
+from typing import Any, Iterable
+
+import numpy as np
+from cachetools import TTLCache
+from colorama import Fore
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import BadRequestError, NotFoundError
+from elasticsearch.helpers import bulk
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langchain.vectorstores import ElasticVectorSearch
+
+from errors.errors import ElasticError
+from settings.settings import get_settings
+from stats.metrics import RETRIEVAL_HITS, RETRIEVAL_PAYLOAD_BYTES, RETRIEVAL_RESPONSES
+from . import VECTOR_FIELD, VECTOR_TEXT_FIELD, VECTOR_METADATA_FIELD, KNN_HNSW_M, KNN_EF_CONSTRUCTION, KNN_CANDIDATES_FACTOR, KNN_MIN_CANDIDATES, KNN_MAX_CANDIDATES
+from . import OLD_ANALYZER, OLD_SEARCH_ANALYZER, RETRIEVAL_MODES, FUSION_METHODS, RRF_RANK_CONSTANT, HYBRID_CANDIDATES_FACTOR
+from . import VECTOR_STORAGE, VECTOR_STORAGE_TYPES, VECTOR_FULL_FIELD, RESCORE_FACTOR
+from .embeddings import embedding_meta, forget_index
+from .traced_client import TracedElasticsearch
+
+# Only these fields are fetched for hits; the vector (~1536 floats as JSON) never leaves Elasticsearch
+SOURCE_FIELDS = [VECTOR_TEXT_FIELD, VECTOR_METADATA_FIELD]
+
+
+# Mapping of the vector field, per index name.
+_vector_mappings: TTLCache = TTLCache(maxsize=1024, ttl=300)
+_vector_mappings_lock = threading.Lock()
+
+_client: Elasticsearch | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> Elasticsearch:
+    """
+    Returns a process-wide Elasticsearch client for the configured server.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            settings = get_settings()
+            _client = TracedElasticsearch([{"scheme": "http", "host": settings.elastic_server, "port": settings.elastic_port}],
+                                          max_retries=3, retry_on_timeout=True, request_timeout=30)
+        return _client
+
+
+def plain_mapping(dims: int) -> dict:
+    """
+    LangChain's mapping: a `dense_vector` that can only be brute-forced with `script_score`.
+    """
+    return {"properties": {VECTOR_FIELD: {"type": "dense_vector", "dims": dims}}}
+
+
+def knn_mapping(dims: int, storage: str = "float") -> dict:
+    """
+    Mapping for a vector index searchable through the `knn` option.
+    With `storage="byte"`, the indexed vector is int8 and the full-precision
+    vector is kept in the (not indexed) `binary` side field for rescoring.
+    """
+    mapping = {
+        "properties": {
+            # 'ik' segments Chinese into words (instead of characters) for BM25
+            VECTOR_TEXT_FIELD: {"type": "text", "analyzer": OLD_ANALYZER, "search_analyzer": OLD_SEARCH_ANALYZER},
+            VECTOR_METADATA_FIELD: {"type": "object"},
+            VECTOR_FIELD: {
+                "type": "dense_vector",
+                "dims": dims,
+                "index": True,
+                "similarity": "cosine",
+                "index_options": {
+                    "type": "hnsw",
+                    "m": KNN_HNSW_M,
+                    "ef_construction": KNN_EF_CONSTRUCTION
+                }
+            }
+        }
+    }
+    if storage == "byte":
+        mapping["properties"][VECTOR_FIELD]["element_type"] = "byte"
+        mapping["properties"][VECTOR_FULL_FIELD] = {"type": "binary"}
+    return mapping
+
+
+def quantize(vector: list[float]) -> list[int]:
+    """
+    Scales `vector` so that its largest component becomes +/-127 and rounds it to int8.
+    Cosine similarity ignores the scale, so no scale factor has to be kept.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    scale = np.abs(vector).max()
+    if scale == 0:
+        return [0] * len(vector)
+    return np.clip(np.rint(vector * (127 / scale)), -128, 127).astype(np.int8).tolist()
+
+
+def encode_vector(vector: list[float]) -> str:
+    """
+    Encodes `vector` as base64 little-endian float32 (~8 KB instead of ~30 KB of JSON floats).
+    """
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_vector(encoded: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded), dtype="<f4")
+
+
+def num_candidates(k: int) -> int:
+    """
+    Number of candidates per shard for a `knn` search returning `k` hits.
+    """
+    return min(max(k * KNN_CANDIDATES_FACTOR, KNN_MIN_CANDIDATES), KNN_MAX_CANDIDATES)
+
+
+def metadata_filter(filter: dict = None) -> list[dict]:
+    """
+    Filter clauses of LangChain's `filter` argument (`{key: value}`), matched like
+    `ElasticVectorSearch` does against `metadata.<key>.keyword` (every pair must match).
+    """
+    return [{"match": {"%s.%s.keyword" % (VECTOR_METADATA_FIELD, key): str(value)}}
+            for key, value in (filter or {}).items()]
+
+
+def _response_size(response) -> int:
+    """
+    Size of a response body in bytes (`Content-Length`, or the re-serialized body if missing).
+    """
+    length = response.meta.headers.get("content-length", None)
+    if length is not None:
+        return int(length)
+    return len(json.dumps(response.body, ensure_ascii=False).encode("utf-8"))
+
+
+def rrf_fuse(rankings: list[list[dict]], k: int, rank_constant: int = RRF_RANK_CONSTANT) -> list[tuple[dict, float]]:
+    """
+    Reciprocal rank fusion: every hit scores `sum(1 / (rank_constant + rank))`
+    over the rankings it appears in. Returns the top `k` hits with their fused score.
+    """
+    hits: dict[str, dict] = {}
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            hits.setdefault(hit["_id"], hit)
+            scores[hit["_id"]] = scores.get(
+                hit["_id"], 0.0) + 1.0 / (rank_constant + rank)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(hits[_id], scores[_id]) for _id in best]
+
+
+def weighted_fuse(bm25_hits: list[dict], vector_hits: list[dict], k: int, vector_weight: float) -> list[tuple[dict, float]]:
+    """
+    Weighted sum of both scores: BM25 scores are divided by the best BM25 score
+    (vector scores already are within [0, 1]), so that
+    `score = vector_weight * vector + (1 - vector_weight) * bm25`.
+    """
+    hits: dict[str, dict] = {}
+    scores: dict[str, float] = {}
+    max_bm25 = max((hit["_score"] for hit in bm25_hits), default=0.0) or 1.0
+    for ranking, weight, norm in [(bm25_hits, 1.0 - vector_weight, max_bm25), (vector_hits, vector_weight, 1.0)]:
+        for hit in ranking:
+            hits.setdefault(hit["_id"], hit)
+            scores[hit["_id"]] = scores.get(
+                hit["_id"], 0.0) + weight * hit["_score"] / norm
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(hits[_id], scores[_id]) for _id in best]
+
+
+class LingtelliVectorStore(ElasticVectorSearch):
+    """
+    Drop-in replacement for `ElasticVectorSearch` (same `text`, `metadata` and
+    `vector` fields), backed by native kNN search.\n
+    Vector scores are the cosine similarity mapped to [0, 1]: `(1 + cos) / 2`.\n
+    `retrieval` decides how `similarity_search*` searches, e.g.
+    `{"mode": "hybrid", "fusion": "rrf", "vector_weight": 0.5}` (default: pure vector search).\n
+    `storage` ('float' or 'byte') only matters when the store creates its index;
+    afterwards the index' own mapping decides. Set `rescore=False` to skip rescoring.
+    """
+
+    def __init__(self, index_name: str, embedding: Embeddings, client: Elasticsearch = None, retrieval: dict = None,
+                 storage: str = VECTOR_STORAGE, rescore: bool = True):
+        self.logger = ElasticError(__file__, self.__class__.__name__)
+        self.index_name = index_name
+        self.embedding = embedding
+        self.client = client if client is not None else get_client()
+        self.retrieval = retrieval if retrieval is not None else {
+            "mode": "vector"}
+        self.storage = storage
+        self.rescore = rescore
+
+        if self.storage not in VECTOR_STORAGE_TYPES:
+            self.logger.msg = "Unknown vector storage: %s" % self.storage
+            self.logger.error(extra_msg="Acceptable: %s" %
+                              ", ".join(VECTOR_STORAGE_TYPES))
+            raise self.logger
+
+        if self.retrieval.get("mode") not in RETRIEVAL_MODES or \
+                self.retrieval.get("fusion", "rrf") not in FUSION_METHODS:
+            self.logger.msg = "Unknown retrieval settings: %s" % str(
+                self.retrieval)
+            self.logger.error(extra_msg="Modes: %s, fusion methods: %s" % (
+                ", ".join(RETRIEVAL_MODES), ", ".join(FUSION_METHODS)))
+            raise self.logger
+
+    def create_index(self, client: Elasticsearch, index_name: str, mapping: dict) -> None:
+        """
+        Called by `add_texts()` the first time documents are added to a new index.
+        `mapping` is LangChain's plain mapping, from which we only take the dimensions.
+        Falls back from 'byte' to 'float' kNN and then to the plain mapping if the
+        cluster does not support them.
+        """
+        dims = mapping["properties"][VECTOR_FIELD]["dims"]
+        candidates = [("kNN (%s)" % self.storage, knn_mapping(dims, self.storage))]
+        if self.storage != "float":
+            candidates.append(("kNN (float)", knn_mapping(dims)))
+        candidates.append(("plain 'dense_vector'", mapping))
+        # Record how the vectors are made, so the index is always searched the same way
+        for _, candidate in candidates:
+            candidate["_meta"] = {**candidate.get("_meta", {}),
+                                  **embedding_meta(self.embedding, dims)}
+
+        for i, (name, candidate) in enumerate(candidates):
+            try:
+                client.indices.create(index=index_name, mappings=candidate)
+            except BadRequestError as err:
+                if i == len(candidates) - 1:
+                    raise
+                self.logger.msg = "Could NOT create %s index [%s]! Falling back to %s..." % (
+                    name, Fore.LIGHTYELLOW_EX + index_name + Fore.RESET, candidates[i + 1][0])
+                self.logger.warning(extra_msg=str(err))
+            else:
+                self.logger.msg = "Created %s index: [%s]" % (
+                    name, Fore.LIGHTCYAN_EX + index_name + Fore.RESET)
+                self.logger.info(extra_msg="Dimensions: %s" % dims)
+                break
+
+        with _vector_mappings_lock:
+            _vector_mappings.pop(index_name, None)
+        forget_index(index_name)
+
+    def add_texts(self, texts: Iterable[str], metadatas: list[dict] = None, refresh_indices: bool = True, **kwargs: Any) -> list[str]:
+        """
+        Embeds and bulk-indexes `texts` (creating the index first if needed).
+        For 'byte' indices the vector is quantized and the full-precision
+        vector goes into the side field.
+        """
+        texts = list(texts)
+        if len(texts) == 0:
+            return []
+        embeddings = self.embedding.embed_documents(texts)
+
+        if not self.client.indices.exists(index=self.index_name).body:
+            self.create_index(self.client, self.index_name,
+                              plain_mapping(len(embeddings[0])))
+        uses_bytes = self.uses_bytes()
+
+        ids = []
+        requests = []
+        for i, (text, embedding) in enumerate(zip(texts, embeddings)):
+            _id = str(uuid.uuid4())
+            request = {
+                "_op_type": "index",
+                "_index": self.index_name,
+                "_id": _id,
+                VECTOR_TEXT_FIELD: text,
+                VECTOR_METADATA_FIELD: metadatas[i] if metadatas else {}
+            }
+            if uses_bytes:
+                request[VECTOR_FIELD] = quantize(embedding)
+                request[VECTOR_FULL_FIELD] = encode_vector(embedding)
+            else:
+                request[VECTOR_FIELD] = embedding
+            ids.append(_id)
+            requests.append(request)
+        bulk(self.client, requests)
+
+        if refresh_indices:
+            self.client.indices.refresh(index=self.index_name)
+        return ids
+
+    def _vector_mapping(self) -> dict:
+        """
+        Returns the mapping of the index' vector field (empty if the index doesn't exist).
+        """
+        with _vector_mappings_lock:
+            if self.index_name in _vector_mappings:
+                return _vector_mappings[self.index_name]
+
+        try:
+            mappings = self.client.indices.get_mapping(
+                index=self.index_name).body
+        except NotFoundError:
+            return {}
+
+        vector_mapping = {}
+        for index_mapping in mappings.values():
+            vector_mapping = index_mapping["mappings"].get(
+                "properties", {}).get(VECTOR_FIELD, {})
+            if not vector_mapping.get("index", False):
+                break
+
+        with _vector_mappings_lock:
+            _vector_mappings[self.index_name] = vector_mapping
+        return vector_mapping
+
+    def uses_knn(self) -> bool:
+        """
+        Whether the index' vector field is indexed (and thus searchable with `knn`).
+        """
+        return self._vector_mapping().get("index", False)
+
+    def uses_bytes(self) -> bool:
+        """
+        Whether the index' vectors are stored quantized ('byte' element type).
+        """
+        return self._vector_mapping().get("element_type", "float") == "byte"
+
+    def _rescoring(self) -> bool:
+        return self.rescore and self.uses_bytes()
+
+    def _vector_body(self, embedding: list[float], k: int, filter: dict = None) -> dict:
+        """
+        Search body for the `k` nearest neighbours of `embedding`
+        (`k * RESCORE_FACTOR` candidates if the results will be rescored),
+        restricted by the metadata `filter` (see `metadata_filter()`).
+        """
+        filter = metadata_filter(filter)
+        if self.uses_knn():
+            source = SOURCE_FIELDS
+            if self._rescoring():
+                k *= RESCORE_FACTOR
+                source = SOURCE_FIELDS + [VECTOR_FULL_FIELD]
+            knn = {
+                "field": VECTOR_FIELD,
+                "query_vector": quantize(embedding) if self.uses_bytes() else embedding,
+                "k": k,
+                "num_candidates": num_candidates(k)
+            }
+            if filter:
+                knn["filter"] = filter
+            return {"knn": knn, "size": k, "_source": source}
+
+        # Brute force (old indices): same score scale as 'knn' with cosine.
+        return {"size": k, "_source": SOURCE_FIELDS, "query": {
+            "script_score": {
+                "query": {"bool": {"filter": filter}} if filter else {"match_all": {}},
+                "script": {
+                    "source": "(cosineSimilarity(params.query_vector, '%s') + 1.0) / 2.0" % VECTOR_FIELD,
+                    "params": {"query_vector": embedding}
+                }
+            }
+        }}
+
+    def _bm25_body(self, query: str, k: int, filter: dict = None) -> dict:
+        """
+        Search body for a BM25 `match` query on the text field, restricted by
+        the metadata `filter` (see `metadata_filter()`).
+        """
+        filter = metadata_filter(filter)
+        match = {"match": {VECTOR_TEXT_FIELD: {"query": query}}}
+        return {"size": k, "_source": SOURCE_FIELDS,
+                "query": {"bool": {"must": match, "filter": filter}} if filter else match}
+
+    def _record_payload(self, response, num_hits: int) -> None:
+        """
+        Adds the size of `response` to the payload metrics (served on `/metrics`).
+        """
+        size = _response_size(response)
+        RETRIEVAL_RESPONSES.inc()
+        RETRIEVAL_HITS.inc(num_hits)
+        RETRIEVAL_PAYLOAD_BYTES.inc(size)
+        self.logger.msg = "Retrieved %s hit(s) from [%s] in %.1f KB." % (
+            num_hits, self.index_name, size / 1024)
+        self.logger.info()
+
+    def _search(self, body: dict) -> list[dict]:
+        """
+        Sends one search `body` (as built by `_vector_body()` or `_bm25_body()`)
+        and returns the raw hits.
+        """
+        params = dict(body)
+        params["source"] = params.pop("_source")
+        response = self.client.search(index=self.index_name, **params)
+        hits = response["hits"]["hits"]
+        self._record_payload(response, len(hits))
+        return hits
+
+    def _search_vector(self, embedding: list[float], k: int, filter: dict = None) -> list[dict]:
+        """
+        Returns the raw hits for the `k` nearest neighbours of `embedding`.
+        """
+        hits = self._search(self._vector_body(embedding, k, filter))
+        return self._rescore(hits, embedding, k) if self._rescoring() else hits
+
+    def _rescore(self, hits: list[dict], embedding: list[float], k: int) -> list[dict]:
+        """
+        Re-ranks the candidates of a 'byte' index by the exact cosine similarity of
+        their full-precision side vectors and returns the best `k` (same score scale).
+        """
+        if len(hits) == 0 or any(VECTOR_FULL_FIELD not in hit["_source"] for hit in hits):
+            return hits[:k]
+        query = np.asarray(embedding, dtype=np.float32)
+        vectors = np.stack([decode_vector(hit["_source"].pop(
+            VECTOR_FULL_FIELD)) for hit in hits])
+        similarities = vectors @ query / \
+            (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+        for hit, similarity in zip(hits, similarities):
+            hit["_score"] = float((1.0 + similarity) / 2.0)
+        return sorted(hits, key=lambda hit: hit["_score"], reverse=True)[:k]
+
+    def _search_hybrid(self, query: str, k: int, filter: dict = None) -> list[tuple[dict, float]]:
+        """
+        Runs the BM25 and the vector query within ONE `_msearch` request and
+        fuses both rankings according to `self.retrieval`.\n
+        If one of the two searches fails, the other one's ranking is used as is.
+        """
+        size = k * HYBRID_CANDIDATES_FACTOR
+        embedding = self.embedding.embed_query(query)
+        response = self.client.msearch(index=self.index_name, searches=[
+            {}, self._bm25_body(query, size, filter),
+            {}, self._vector_body(embedding, size, filter)
+        ])
+
+        rankings = []
+        for name, result in zip(["bm25", "vector"], response["responses"]):
+            if "error" in result:
+                self.logger.msg = "The %s part of the hybrid search on [%s] failed!" % (
+                    name, self.index_name)
+                self.logger.warning(extra_msg=str(result["error"]))
+                rankings.append([])
+            else:
+                rankings.append(result["hits"]["hits"])
+        if self._rescoring():
+            rankings[1] = self._rescore(rankings[1], embedding, size)
+        self._record_payload(response, sum(len(ranking)
+                             for ranking in rankings))
+
+        if all("error" in result for result in response["responses"]):
+            self.logger.msg = "Hybrid search on [%s] failed!" % self.index_name
+            self.logger.error()
+            raise self.logger
+
+        if self.retrieval.get("fusion", "rrf") == "weighted":
+            return weighted_fuse(rankings[0], rankings[1], k, self.retrieval.get("vector_weight", 0.5))
+        return rrf_fuse(rankings, k)
+
+    @staticmethod
+    def _to_documents(hits: list[tuple[dict, float]]) -> list[tuple[Document, float]]:
+        return [(Document(page_content=hit["_source"][VECTOR_TEXT_FIELD],
+                          metadata=hit["_source"].get(VECTOR_METADATA_FIELD, {})),
+                 score) for hit, score in hits]
+
+    def similarity_search_by_vector_with_score(self, embedding: list[float], k: int = 4, filter: dict = None) -> list[tuple[Document, float]]:
+        hits = self._search_vector(embedding, k, filter)
+        return self._to_documents([(hit, hit["_score"]) for hit in hits])
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, filter: dict = None, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: dict = None, **kwargs: Any) -> list[tuple[Document, float]]:
+        """
+        Searches according to `self.retrieval["mode"]`. Note that the scale of the scores
+        depends on the mode (and fusion method) used.
+        """
+        mode = self.retrieval.get("mode")
+        if mode == "hybrid":
+            return self._to_documents(self._search_hybrid(query, k, filter))
+        if mode == "bm25":
+            hits = self._search(self._bm25_body(query, k, filter))
+            return self._to_documents([(hit, hit["_score"]) for hit in hits])
+        embedding = self.embedding.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict = None, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: list[dict] = None,
+                   index_name: str = None, client: Elasticsearch = None, refresh_indices: bool = True,
+                   **kwargs: Any) -> "LingtelliVectorStore":
+        if index_name is None:
+            logger = ElasticError(__file__, cls.__name__)
+            logger.msg = "'index_name' MUST be provided!"
+            logger.error()
+            raise logger
+        store = cls(index_name, embedding, client=client)
+        store.add_texts(texts, metadatas=metadatas,
+                        refresh_indices=refresh_indices)
+        return store
+
+
+def _copy(client: Elasticsearch, source: str, dest: str) -> int:
+    """
+    Copies all documents of `source` into `dest` and returns the count of `dest`.
+    """
+    client.options(request_timeout=3600).reindex(
+        source={"index": source}, dest={"index": dest}, wait_for_completion=True, refresh=True)
+    return client.count(index=dest)["count"]
+
+
+def reindex_to_knn(client: Elasticsearch, index: str) -> bool:
+    """
+    Migrates an existing (brute-force) vector index to a kNN index, keeping its name:\n
+    1. Blocks writes to `<index>`, so that nothing written during the migration gets lost.\n
+    2. Copies all documents into `<index>-knn-tmp` (kNN mapping) and checks the count.\n
+    3. Re-creates `<index>` with the kNN mapping (and its old `_meta`).\n
+    4. Copies the documents back, checks the count again and only then removes the
+       temporary index. On any failure of this step the temporary index is KEPT
+       (and the migration refuses to run again until it is restored from it).\n
+    Returns `False` if the index didn't need a migration.
+    """
+    logger = ElasticError(__file__, "es.vectorstore:reindex_to_knn")
+    temp_index = index + "-knn-tmp"
+    if client.indices.exists(index=temp_index).body:
+        logger.msg = "[%s] exists: a previous migration of [%s] did NOT finish!" % (
+            temp_index, index)
+        logger.error(extra_msg="Check [%s] against [%s] (and restore it from there) before retrying." % (
+            index, temp_index))
+        raise logger
+
+    mapping = client.indices.get_mapping(index=index).body[index]["mappings"]
+    vector = mapping.get("properties", {}).get(VECTOR_FIELD, None)
+
+    if vector is None or vector.get("index", False):
+        logger.msg = "Skipping [%s] (no vector field or already a kNN index)." % index
+        logger.info()
+        return False
+
+    new_mapping = knn_mapping(vector["dims"])
+    if mapping.get("_meta", None):
+        new_mapping["_meta"] = mapping["_meta"]
+
+    client.indices.add_block(index=index, block="write")
+    try:
+        count = client.count(index=index)["count"]
+        logger.msg = "Reindexing [%s] (%s documents) into kNN mapping..." % (
+            Fore.LIGHTCYAN_EX + index + Fore.RESET, count)
+        logger.info()
+
+        client.indices.create(index=temp_index, mappings=new_mapping)
+        copied = _copy(client, index, temp_index)
+        if copied != count:
+            logger.msg = "Document count mismatch after copying [%s]! Original index left untouched." % index
+            logger.error(extra_msg="Expected %s, copied %s" % (count, copied))
+            raise logger
+    except Exception:
+        client.indices.delete(index=temp_index, ignore_unavailable=True)
+        client.indices.put_settings(
+            index=index, settings={"index.blocks.write": None})
+        raise
+
+    # From here on, the documents only live on in the temporary index until copied back
+    try:
+        client.indices.delete(index=index)
+        client.indices.create(index=index, mappings=new_mapping)
+        copied = _copy(client, temp_index, index)
+    except Exception as err:
+        logger.msg = "Could NOT copy [%s] back into [%s]! Keeping [%s]." % (
+            temp_index, index, temp_index)
+        logger.error(extra_msg=str(err), orgErr=err)
+        raise logger from err
+    if copied != count:
+        logger.msg = "Document count mismatch after copying back into [%s]! Keeping [%s]." % (
+            index, temp_index)
+        logger.error(extra_msg="Expected %s, copied %s" % (count, copied))
+        raise logger
+    client.indices.delete(index=temp_index)
+
+    with _vector_mappings_lock:
+        _vector_mappings.pop(index, None)
+
+    logger.msg = Fore.LIGHTGREEN_EX + "Successfully" + Fore.RESET + \
+        " reindexed [%s]!" % index
+    logger.info()
+    return True
+
+
+def reindex_all(patterns: Iterable[str]) -> None:
+    """
+    Runs `reindex_to_knn()` for every index matching any of `patterns`.
+    """
+    client = get_client()
+    for pattern in patterns:
+        indices = client.indices.get_mapping(
+            index=pattern, ignore_unavailable=True, allow_no_indices=True).body
+        for index in sorted(indices):
+            if index.endswith("-knn-tmp"):
+                continue
+            reindex_to_knn(client, index)
+
+
+if __name__ == "__main__":
+    # python -m es.vectorstore reindex "info_*" "answers_*"
+    if len(sys.argv) < 2 or sys.argv[1] != "reindex":
+        print("Usage: python -m es.vectorstore reindex [<index pattern> ...]")
+        sys.exit(1)
+    reindex_all(sys.argv[2:] or ["info_*", "answers_*"])
@@ -5,14 +5,16 @@ import logging
 from colorama import Fore
 from fastapi import FastAPI, status, BackgroundTasks, UploadFile, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 from fastapi.testclient import TestClient
 
 from params import DESCRIPTIONS
-from params.definitions import AddressModel, BasicResponse, SourceDocument, QueryVendorSession, VendorFileSession, VendorFileQuery, TemplateModel, AnswersList
+from params.definitions import AddressModel, BasicResponse, SourceDocument, QueryVendorSession, VendorFileSession, VendorFileQuery, TemplateModel, AnswersList, RetrievalModel
 from es.lc_service import FileLoader, LingtelliElastic2
 from helpers.reqres import ElkServiceResponse
 from errors.errors import BaseError
+from stats.metrics import current_endpoint, mark_process_dead, render_metrics, reset_metrics_dir
+from stats.tracing import start_trace
 
 
 app = FastAPI()
@@ -30,6 +32,28 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 logger = BaseError(__file__, "main")
 
 
+@app.middleware("http")
+async def label_endpoint(request: Request, call_next):
+    # Lets the stage timings (stats.metrics) know which endpoint they belong to
+    current_endpoint.set(request.url.path)
+    # Correlation id of the request, and its trace if sampled (stats.tracing)
+    with start_trace(request.method + " " + request.url.path, request.headers.get("X-Request-ID", None)) as trace:
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = trace.trace_id
+    return response
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    mark_process_dead()
+
+
+@app.get("/metrics")
+async def metrics():
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
@@ -143,6 +167,23 @@ async def set_llm_address(obj: AddressModel):
     return ElkServiceResponse(content={"msg": "Document(s) found!", "data": logger.msg}, status_code=status.HTTP_200_OK)
 
 
+@app.post("/set-retrieval", response_model=BasicResponse, description=DESCRIPTIONS["/set-retrieval"])
+async def set_retrieval(retrieval_obj: RetrievalModel):
+    global logger
+    logger.cls = "main.py:set_retrieval"
+
+    try:
+        es = LingtelliElastic2()
+        retrieval = es.set_retrieval(retrieval_obj)
+    except Exception as err:
+        logger.msg = "Something went wrong when trying to set retrieval!"
+        logger.error(extra_msg=str(err), orgErr=err)
+        return ElkServiceResponse(content={"msg": "Unexpected ERROR occurred!", "error": "{}: {}".format(
+            logger.msg, err.msg if isinstance(err, BaseError) else str(err))}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    else:
+        return ElkServiceResponse(content={"msg": "Retrieval successfully set! (vendor_id: {})!".format(retrieval_obj.vendor_id), "data": retrieval}, status_code=status.HTTP_202_ACCEPTED)
+
+
 @app.post("/set-template", response_model=BasicResponse, description=DESCRIPTIONS["/set-template"])
 async def set_template(template_obj: TemplateModel):
     global logger
@@ -207,4 +248,5 @@ async def upload_answers(index: str, answer_obj: AnswersList):
 if __name__ == "__main__":
     API_HOST = os.environ.get("API_SERVER", "0.0.0.0")
     API_PORT = int(os.environ.get("API_PORT", "420"))
+    reset_metrics_dir()
     uvicorn.run("main:app", host=API_HOST, port=API_PORT, workers=2)
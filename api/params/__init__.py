@@ -7,6 +7,8 @@ DESCRIPTIONS = {
     # Search
     "/search-file": "Endpoint for searching through contents found within the /data/csv folder (dedicated to return only source documents based on query).",
     "/search-gpt": "Endpoint used for searching for documents in Elasticsearch, then providing results as context and retrieving answer from GPT-3 DaVinci AI model.",
+    # Retrieval
+    "/set-retrieval": "Endpoint for setting how a `vendor_id`'s 'info' indices are searched: 'vector', 'bm25' or 'hybrid' (fused with 'rrf' or 'weighted').",
     # Template
     "/set-template": "Endpoint for setting template for any `vendor_id` or file specific index.",
     # Local LLM
@@ -41,6 +41,12 @@ class TemplateModel(VendorFile):
     role: str = ""
 
 
+class RetrievalModel(Vendor):
+    mode: str = "vector"
+    fusion: str = "rrf"
+    vector_weight: float = 0.5
+
+
 class VendorFileQuery(VendorFile):
     query: str = ""
 
@@ -18,6 +18,32 @@ CSV_FINISHED_DIR = os.path.join(CSV_DIR, 'finished')
 TIIP_PDF_DIR = os.path.join(DATA_DIR, "tiip", "pdf")
 TIIP_CSV_DIR = os.path.join(DATA_DIR, "tiip", "csv")
 TIIP_DOC_DIR = os.path.join(DATA_DIR, "tiip", "docs")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+PDF_CACHE_DIR = os.path.join(CACHE_DIR, "pdf")
+# Parquet partitions of the message log (stats.store)
+STATS_DIR = os.path.join(DATA_DIR, "stats")
+# QA / GPT counters and the rotated 'stats.csv' archives (stats.counters)
+STATS_LOG_DIR = os.path.join(LOG_DIR, "stats")
+
+# Prometheus metrics (stats.metrics), shared by the uvicorn workers through this directory
+METRICS_DIR = os.environ.get(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(CACHE_DIR, "prometheus"))
+
+# Request traces (stats.tracing): './log/traces/<date>.jsonl', share of the requests traced (0 - 1)
+TRACE_DIR = os.path.join(LOG_DIR, "traces")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0.1))
+
+# Application logs (errors.logs): 'json' (one JSON object per line) or 'console' (colored text)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+
+# Message log (errors.message_log): './log/<date>.jsonl'
+# fsync policy: 'always' (every batch), 'interval' (at most every MESSAGE_LOG_FSYNC_INTERVAL s) or 'never'
+MESSAGE_LOG_FSYNC_POLICIES = ["always", "interval", "never"]
+MESSAGE_LOG_FSYNC = os.environ.get("MESSAGE_LOG_FSYNC", "interval")
+MESSAGE_LOG_FSYNC_INTERVAL = float(os.environ.get("MESSAGE_LOG_FSYNC_INTERVAL", 5))
+MESSAGE_LOG_FLUSH_INTERVAL = float(os.environ.get("MESSAGE_LOG_FLUSH_INTERVAL", 1))
+MESSAGE_LOG_BATCH_SIZE = int(500)
 
 # OpenAI stuff
 GPT3_SERVER = get_local_ip(os.environ.get("GPT3_SERVER", "0.0.0.0"))
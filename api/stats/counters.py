@@ -0,0 +1,203 @@
+"""
+Module holding the QA / GPT counters of the request stats.\n
+Every stats row written by `ElasticError.save_stats()` also increments two
+small JSON files in `STATS_LOG_DIR`:\n
+- `totals.json`: `{vendor_id: [QA, GPT]}` over all time.\n
+- `<date>.json`: `{vendor_id: [QA, GPT]}` of that date.\n
+So the QA / GPT ratio is read from `totals.json` (one entry per vendor) instead
+of loading every row of `stats.csv`. The uvicorn workers are separate
+processes, so every update happens under an exclusive `flock()`.\n
+`stats.csv` itself is rotated daily into `STATS_LOG_DIR/stats-<date>.csv.gz`.\n
+The first time the counters are used (no `version` file, or one of an older
+`COUNTERS_VERSION`), they are rebuilt from `stats.csv` and its archives, so the
+rows written before the counters existed are counted as well.
+"""
+import csv
+import fcntl
+import gzip
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
+
+from settings.settings import LOG_DIR, STATS_LOG_DIR
+from stats import COLUMN_NAMES
+
+STATS_FILE = os.path.join(LOG_DIR, "stats.csv")
+TOTALS_FILE = "totals.json"
+VERSION_FILE = "version"
+# Bump to have the counters rebuilt once (e.g. after changing what they count)
+COUNTERS_VERSION = "1"
+
+
+def _is_true(value) -> bool:
+    return value is True or str(value).strip().lower() == "true"
+
+
+class StatsCounters(object):
+    """
+    Per-vendor QA / GPT counters, in total and per day.
+    """
+
+    def __init__(self, stats_file: str = STATS_FILE, counters_dir: str = STATS_LOG_DIR):
+        self.stats_file = stats_file
+        self.counters_dir = counters_dir
+        self.counted = False
+        os.makedirs(self.counters_dir, exist_ok=True)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(os.path.join(self.counters_dir, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, name: str) -> dict[str, list[int]]:
+        try:
+            with open(os.path.join(self.counters_dir, name), encoding="utf8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _dump(self, name: str, counters: dict[str, list[int]]) -> None:
+        path = os.path.join(self.counters_dir, name)
+        with open(path + ".tmp", "w", encoding="utf8") as file:
+            json.dump(counters, file, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _increment(counters: dict[str, list[int]], vendor_id: str, qa: bool, gpt: bool) -> None:
+        counts = counters.setdefault(vendor_id, [0, 0])
+        counts[0] += int(qa)
+        counts[1] += int(gpt)
+
+    def _ensure_counted(self) -> None:
+        """
+        Rebuilds the counters once if they are of an older (or no) version.
+        """
+        if self.counted:
+            return
+        version_file = os.path.join(self.counters_dir, VERSION_FILE)
+        with self._locked():
+            try:
+                with open(version_file, encoding="utf8") as file:
+                    version = file.read().strip()
+            except FileNotFoundError:
+                version = None
+            if version != COUNTERS_VERSION:
+                self._rebuild()
+        self.counted = True
+
+    def _rotate(self, today: str) -> None:
+        """
+        Compresses `stats.csv` into the archive of its last day once a new day starts.
+        """
+        try:
+            day = datetime.fromtimestamp(os.path.getmtime(
+                self.stats_file)).strftime("%Y-%m-%d")
+        except FileNotFoundError:
+            day = None
+        if day is not None and day < today:
+            archive = os.path.join(
+                self.counters_dir, "stats-%s.csv.gz" % day)
+            with open(self.stats_file, "rb") as source, gzip.open(archive, "ab") as target:
+                shutil.copyfileobj(source, target)
+            os.remove(self.stats_file)
+        if not os.path.exists(self.stats_file):
+            with open(self.stats_file, "w") as stats_file:
+                stats_file.write(",".join(COLUMN_NAMES) + "\n")
+
+    def add(self, row: str, vendor_id: str, qa: bool, gpt: bool) -> None:
+        """
+        Appends `row` to `stats.csv` and counts it (rotating the CSV first on a new day).
+        """
+        self._ensure_counted()
+        today = datetime.now().strftime("%Y-%m-%d")
+        with self._locked():
+            self._rotate(today)
+            with open(self.stats_file, "a") as stats_file:
+                stats_file.write(row + "\n")
+
+            for name in [TOTALS_FILE, today + ".json"]:
+                counters = self._load(name)
+                self._increment(counters, vendor_id, qa, gpt)
+                self._dump(name, counters)
+
+    def totals(self) -> dict[str, list[int]]:
+        self._ensure_counted()
+        return self._load(TOTALS_FILE)
+
+    def daily(self, start: str = "", end: str = "9999-99-99") -> dict[str, list[int]]:
+        """
+        Counters summed over the days between `start` and `end` (`'YYYY-MM-DD'`, inclusive).
+        """
+        self._ensure_counted()
+        counters: dict[str, list[int]] = {}
+        for name in sorted(os.listdir(self.counters_dir)):
+            day = name[:-len(".json")]
+            if name.endswith(".json") and name != TOTALS_FILE and start <= day <= end:
+                for vendor_id, (qa, gpt) in self._load(name).items():
+                    counts = counters.setdefault(vendor_id, [0, 0])
+                    counts[0] += qa
+                    counts[1] += gpt
+        return counters
+
+    def _iter_rows(self) -> Iterator[dict[str, str]]:
+        archives = sorted(name for name in os.listdir(self.counters_dir)
+                          if name.startswith("stats-") and name.endswith(".csv.gz"))
+        for name in archives:
+            with gzip.open(os.path.join(self.counters_dir, name), "rt") as archive:
+                yield from csv.DictReader(archive, fieldnames=COLUMN_NAMES)
+        if os.path.exists(self.stats_file):
+            with open(self.stats_file) as stats_file:
+                yield from csv.DictReader(stats_file, fieldnames=COLUMN_NAMES)
+
+    def rebuild(self) -> int:
+        """
+        Recounts everything from `stats.csv` and its archives (one pass, row by
+        row), e.g. for stats written before the counters existed. Returns the
+        number of rows counted.
+        """
+        with self._locked():
+            rows = self._rebuild()
+        self.counted = True
+        return rows
+
+    def _rebuild(self) -> int:
+        # Callers hold the lock
+        totals: dict[str, list[int]] = {}
+        days: dict[str, dict[str, list[int]]] = {}
+        rows = 0
+        for row in self._iter_rows():
+            # Skips the header lines and incomplete rows
+            if row["timestamp"] == COLUMN_NAMES[0] or not row["vendor_id"] or row["GPT"] is None:
+                continue
+            qa, gpt = _is_true(row["QA"]), _is_true(row["GPT"])
+            self._increment(totals, row["vendor_id"], qa, gpt)
+            self._increment(days.setdefault(
+                row["timestamp"][:10], {}), row["vendor_id"], qa, gpt)
+            rows += 1
+
+        self._dump(TOTALS_FILE, totals)
+        for day, counters in days.items():
+            self._dump(day + ".json", counters)
+        with open(os.path.join(self.counters_dir, VERSION_FILE), "w", encoding="utf8") as file:
+            file.write(COUNTERS_VERSION)
+        return rows
+
+
+_counters: StatsCounters | None = None
+
+
+def get_stats_counters() -> StatsCounters:
+    """
+    Returns the process-wide `StatsCounters`.
+    """
+    global _counters
+    if _counters is None:
+        _counters = StatsCounters()
+    return _counters
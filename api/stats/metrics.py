@@ -0,0 +1,158 @@
+"""
+Module holding the Prometheus metrics of the API project, served on `/metrics`.\n
+Every stage of answering a question (memory load, QA check, answers search,
+routing, context retrieval, LLM generation, history write, log write and the
+whole request) is timed with `stage()` into ONE histogram, labeled by stage,
+vendor and endpoint. The other metrics are defined here as well and updated
+by the modules they measure.\n
+The uvicorn workers are separate processes, so the metrics are kept in
+`prometheus_client`'s multiprocess mode: each worker writes its samples into
+`METRICS_DIR` (`PROMETHEUS_MULTIPROC_DIR`) and `/metrics` aggregates all of them.
+Call `reset_metrics_dir()` once before starting the workers.
+"""
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from settings.settings import METRICS_DIR
+from stats.tracing import span
+
+# Must be set before 'prometheus_client' is imported
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess  # noqa: E402
+
+STAGES = ["memory_load", "qa_check", "answers_search", "agent", "routing",
+          "retrieval", "llm_generation", "history_write", "log_write", "total"]
+
+# From a cached ES lookup (~5ms) up to a slow agent run (~1min)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, float("inf"))
+
+STAGE_SECONDS = Histogram(
+    "lingtelli_stage_seconds",
+    "Time spent in each stage of answering a request.",
+    ["stage", "vendor_id", "endpoint"],
+    buckets=STAGE_BUCKETS
+)
+
+# Token cache of the analyzer client (es.analyzer)
+ANALYZER_LOOKUPS = Counter(
+    "lingtelli_analyzer_cache_lookups",
+    "Token cache lookups of the analyzer client, by result (hit / miss).",
+    ["result"]
+)
+ANALYZER_REQUESTS = Counter(
+    "lingtelli_analyzer_requests",
+    "Requests sent to Elasticsearch's /_analyze endpoint."
+)
+
+# LLM completion cache (es.llm_cache)
+LLM_CACHE_LOOKUPS = Counter(
+    "lingtelli_llm_cache_lookups",
+    "Completion cache lookups, by result (memory_hit / disk_hit / miss).",
+    ["result"]
+)
+
+# Size of retrieval responses (es.vectorstore)
+RETRIEVAL_RESPONSES = Counter(
+    "lingtelli_retrieval_responses",
+    "Search responses received by the vector store."
+)
+RETRIEVAL_HITS = Counter(
+    "lingtelli_retrieval_hits",
+    "Hits within the search responses of the vector store."
+)
+RETRIEVAL_PAYLOAD_BYTES = Counter(
+    "lingtelli_retrieval_payload_bytes",
+    "Bytes of the search responses of the vector store."
+)
+
+# Outbound LLM gateway (es.llm_gateway), per model
+LLM_CALLS = Counter(
+    "lingtelli_llm_calls",
+    "Outbound LLM calls, by result (success / error / rejected by the breaker / queue_timeout).",
+    ["model", "result"]
+)
+LLM_HEDGES = Counter(
+    "lingtelli_llm_hedges",
+    "Hedged LLM calls, by result (sent / won by the hedge).",
+    ["model", "result"]
+)
+LLM_CALL_SECONDS = Histogram(
+    "lingtelli_llm_call_seconds",
+    "Duration of successful outbound LLM calls.",
+    ["model"],
+    buckets=STAGE_BUCKETS
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "lingtelli_llm_queue_seconds",
+    "Time LLM calls waited for a free slot of their model.",
+    ["model"],
+    buckets=STAGE_BUCKETS
+)
+LLM_IN_FLIGHT = Gauge(
+    "lingtelli_llm_in_flight",
+    "LLM calls currently running.",
+    ["model"],
+    multiprocess_mode="livesum"
+)
+LLM_QUEUED = Gauge(
+    "lingtelli_llm_queued",
+    "LLM calls currently waiting for a free slot.",
+    ["model"],
+    multiprocess_mode="livesum"
+)
+LLM_BREAKER_STATE = Gauge(
+    "lingtelli_llm_breaker_state",
+    "Circuit breaker state (0 = closed, 1 = half-open, 2 = open); the worst of all workers.",
+    ["model"],
+    multiprocess_mode="livemax"
+)
+
+# Endpoint of the current request (set by the middleware in 'main.py')
+current_endpoint: ContextVar[str] = ContextVar("endpoint", default="")
+
+
+@contextmanager
+def stage(name: str, vendor_id: str = "") -> Iterator[None]:
+    """
+    Times the `with` block as stage `name` of the current request
+    (also when the block raises), and records it as a span of the request's trace.
+    """
+    start = time.perf_counter()
+    try:
+        with span(name, vendor_id=vendor_id):
+            yield
+    finally:
+        STAGE_SECONDS.labels(stage=name, vendor_id=vendor_id, endpoint=current_endpoint.get()).observe(
+            time.perf_counter() - start)
+
+
+def reset_metrics_dir() -> None:
+    """
+    Empties the multiprocess directory; samples of a previous run would
+    otherwise be aggregated into the new one.
+    """
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def mark_process_dead() -> None:
+    """
+    Call when a worker exits, so its live gauges are dropped.
+    """
+    multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Returns the aggregated metrics of all workers and their content type.
+    """
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,96 +1,71 @@
-import json
-import os
-from datetime import datetime, timedelta
+import argparse
 
 import pandas as pd
 from colorama import Fore
 
 from errors.errors import LogError
 from settings.settings import get_settings
+from stats.store import StatsStore, today_str
 
 settings = get_settings()
 
+TAIL_SIZE = 100
+DISPLAY_COLUMNS = {
+    "vendor_id": "Vendor ID",
+    "Q": "Questions",
+    "A": "Answers",
+    "T": "Time(s)",
+    "verified": "Verified Q/A"
+}
+
 
 class LogPrinter(object):
     """
     This class is meant to print all kinds of log-files
-    in the best and/or most readable way possible.
+    in the best and/or most readable way possible.\n
+    Completed days are rolled up into the stats store once (see `stats.store`),
+    so only the days asked for are read: the latest `TAIL_SIZE` messages by
+    default, or every message between `start` and `end` (`'YYYY-MM-DD'`).
     """
 
-    def __init__(self):
+    def __init__(self, start: str = None, end: str = None, vendor_id: str = None):
         self.logger = LogError(__file__, self.__class__.__name__)
-        self.files = self._get_files()
+        self.store = StatsStore()
+        self.store.roll_up()
+        self.start = start or settings.first_day.strftime("%Y-%m-%d")
+        self.end = end or today_str()
+        self.ranged = start is not None or end is not None
+        self.vendor_id = vendor_id
         self.data = self._arrange_data()
 
-    def _get_files(self):
-        first_day = settings.first_day
-        today = settings.today
-        day = first_day.date()
-        all_days = []
-
-        # Print out the DATES we try to analyze data from
-        self.logger.msg = "Going through log files for all dates between " + Fore.LIGHTCYAN_EX + \
-            first_day.strftime("%Y-%m-%d") + Fore.RESET + " to " + \
-            Fore.LIGHTMAGENTA_EX + \
-            today.strftime("%Y-%m-%d") + Fore.RESET + "!"
-        self.logger.info()
-
-        while day <= today:
-            all_days.append(day.strftime("%Y-%m-%d"))
-            day += timedelta(days=1)
-
-        validated_files: list = []
-        for file_date in all_days:
-            file = os.path.join(settings.log_dir, file_date+'.json')
-            if os.path.exists(file):
-                validated_files.append(file)
-
-        if len(validated_files) == 0:
-            self.logger.msg = f"Unable to find logger file: {Fore.LIGHTRED_EX + file + Fore.RESET}!"
-            self.logger.error()
-            raise self.logger
-
-        return validated_files
-
     def _arrange_data(self):
-        org_data = []
-
-        for file in self.files:
-            with open(file) as json_log_file:
-                data = json.loads(json_log_file.read())
-                if isinstance(data, list):
-                    org_data.extend(data)
-                elif isinstance(data, dict):
-                    org_data.append(data)
-                else:
-                    self.logger.msg = "Could NOT append data for analysis!"
-                    self.logger.warning(
-                        extra_msg=f"Not of type 'list' or 'dict'! Got type: '{str(type(data))}'")
-
-        if org_data is None:
-            self.logger.msg = "Could " + Fore.LIGHTRED_EX + "NOT" + Fore.RESET + \
-                " load contents from " + Fore.LIGHTMAGENTA_EX + self.file + Fore.RESET + "!"
+        if self.ranged:
+            # Print out the DATES we try to analyze data from
+            self.logger.msg = "Going through the stats for all dates between " + Fore.LIGHTCYAN_EX + \
+                self.start + Fore.RESET + " to " + \
+                Fore.LIGHTMAGENTA_EX + self.end + Fore.RESET + "!"
+            self.logger.info()
+            df = self.store.messages(self.start, self.end, self.vendor_id)
+        else:
+            df = self.store.tail(TAIL_SIZE, self.vendor_id)
+
+        if len(df) == 0:
+            self.logger.msg = "Unable to find any message between " + Fore.LIGHTRED_EX + \
+                self.start + Fore.RESET + " and " + \
+                Fore.LIGHTRED_EX + self.end + Fore.RESET + "!"
             self.logger.error()
             raise self.logger
 
-        vendors, questions, answers, times, verified = [], [], [], [], []
-        for entry in org_data:
-            vendors.append(entry['vendor_id'])
-            questions.append(entry['Q'])
-            answers.append(entry['A'])
-            times.append(entry['T'])
-            verified.append(entry.get('verified', None))
-
-        data_obj = {
-            "Vendor ID": vendors,
-            "Questions": questions,
-            "Answers": answers,
-            "Time(s)": times,
-            "Verified Q/A": verified
-        }
-
-        df = pd.DataFrame(data=data_obj)
-        return df
+        return df[list(DISPLAY_COLUMNS)].rename(columns=DISPLAY_COLUMNS)
+
+    def show_summary(self):
+        """
+        Prints the per-day, per-vendor counts and answering time percentiles
+        (precomputed by the stats store).
+        """
+        summary = self.store.daily(self.start, self.end, self.vendor_id)
+        if len(summary) > 0:
+            print(summary.to_string(index=False))
 
     def show_stats(self):
         if isinstance(self.data, pd.DataFrame):
@@ -126,5 +101,14 @@ class LogPrinter(object):
 
 
 if __name__ == "__main__":
-    printer = LogPrinter()
+    parser = argparse.ArgumentParser(
+        description="Print the stats of the message log.")
+    parser.add_argument("--start", help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--vendor", help="Only this vendor ID")
+    args = parser.parse_args()
+
+    printer = LogPrinter(args.start, args.end, args.vendor)
     printer.show_stats()
+    if printer.ranged:
+        printer.show_summary()
@@ -1,33 +1,49 @@
 """
 This module will be designated to do the calculations about the processing statistics
 and forward to its sibling 'present.py' that will, as the name implies, present
-the statistics in the console.
+the statistics in the console.\n
+The QA / GPT counts come from the counters kept up to date by `ElasticError.save_stats()`
+(see `stats.counters`), so nothing is recounted from 'stats.csv' here.
 """
+import argparse
 
 import pandas as pd
-from settings.settings import LOG_DIR
+
+from stats.counters import StatsCounters, get_stats_counters
 
 
 class StatsCalc(object):
-    def __init__(self):
-        self.df = pd.read_csv(LOG_DIR + "/stats.csv")
+    def __init__(self, start: str = None, end: str = None, counters: StatsCounters = None):
+        self.counters = counters or get_stats_counters()
+        if start or end:
+            counts = self.counters.daily(start or "", end or "9999-99-99")
+        else:
+            counts = self.counters.totals()
+
+        self.df = pd.DataFrame.from_dict(
+            counts, orient="index", columns=["QA", "GPT"])
+        self.df.index.name = "vendor_id"
 
     def __str__(self):
         return "\n" + self.df.to_string() + "\n"
 
     def calc_ratio(self) -> pd.DataFrame:
-        # TODO:
-        # Figure out how to most efficiently bring
-        # out the ratio of QA / GPT
-        # Below will only print out <object...>
-        self.df["QA"] = self.df["QA"].astype(int)
-        self.df["GPT"] = self.df["GPT"].astype(int)
-        grouped = self.df.groupby("vendor_id").agg({"QA": sum, "GPT": sum})
+        grouped = self.df.copy()
         grouped["ratio(%)"] = round(grouped["QA"]*100 /
                                     (grouped["QA"] + grouped["GPT"]), 2)
         return grouped
 
 
 if __name__ == "__main__":
-    stats = StatsCalc()
+    parser = argparse.ArgumentParser(
+        description="Print the QA / GPT ratio per vendor.")
+    parser.add_argument("--start", help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Recount from 'stats.csv' and its archives first")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        get_stats_counters().rebuild()
+    stats = StatsCalc(args.start, args.end)
     print(str(stats.calc_ratio()))
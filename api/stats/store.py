@@ -0,0 +1,169 @@
+"""
+Module holding the incremental stats store of the message log.\n
+Every COMPLETED day of the message log (`./log/<date>.jsonl`, or `.json` for
+older days) is rolled up ONCE into Parquet partitions under `STATS_DIR`:\n
+- `messages/<date>.parquet`: the records of the day (vendor, question, answer,
+  answering time and verification).\n
+- `daily/<date>.parquet`: per-vendor count and answering time mean, min, max
+  and percentiles of the day.\n
+Partitions are named after their date, so a query by date range only opens the
+partitions within the range. Today's log is still being written, so it is
+read live (and rolled up from tomorrow on).
+"""
+import os
+import re
+from datetime import datetime
+from typing import Iterable
+
+import pandas as pd
+
+from errors.errors import LogError
+from errors.message_log import iter_messages
+from settings.settings import LOG_DIR, STATS_DIR
+
+LOG_FILE_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})\.jsonl?$")
+MESSAGE_COLUMNS = ["vendor_id", "Q", "A", "T", "verified"]
+PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+
+
+def today_str() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def messages_frame(records: Iterable[dict], day: str) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(
+        [{column: record.get(column, None) for column in MESSAGE_COLUMNS}
+         for record in records], columns=MESSAGE_COLUMNS)
+    # Nullable: records without an answering time are kept (and counted) as <NA>
+    df["T"] = pd.to_numeric(df["T"], errors="coerce").round().astype("Int64")
+    df["verified"] = df["verified"].astype("boolean")
+    df.insert(0, "date", day)
+    return df
+
+
+def summarize(messages: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per date and vendor: number of messages and answering time statistics
+    (of the messages with an answering time).
+    """
+    grouped = messages.groupby(["date", "vendor_id"])["T"]
+    summary = grouped.agg(["mean", "min", "max"])
+    summary.insert(0, "count", grouped.size())
+    for percentile in PERCENTILES:
+        summary["p%d" % round(percentile * 100)] = grouped.quantile(percentile)
+    return summary.reset_index()
+
+
+class StatsStore(object):
+    """
+    Rolls the daily message logs into Parquet partitions and queries them by date range.
+    Dates are `'YYYY-MM-DD'` strings (so they compare like dates).
+    """
+
+    def __init__(self, log_dir: str = LOG_DIR, stats_dir: str = STATS_DIR):
+        self.logger = LogError(__file__, self.__class__.__name__)
+        self.log_dir = log_dir
+        self.messages_dir = os.path.join(stats_dir, "messages")
+        self.daily_dir = os.path.join(stats_dir, "daily")
+        os.makedirs(self.messages_dir, exist_ok=True)
+        os.makedirs(self.daily_dir, exist_ok=True)
+
+    def log_days(self) -> dict[str, list[str]]:
+        """
+        Date -> message log file(s) of that date (only lists the log directory).
+        """
+        days: dict[str, list[str]] = {}
+        for entry in os.scandir(self.log_dir):
+            match = LOG_FILE_PATTERN.match(entry.name)
+            if match and entry.is_file():
+                days.setdefault(match.group(1), []).append(entry.path)
+        return days
+
+    @staticmethod
+    def _partition_days(folder: str, start: str = "", end: str = "9999-99-99") -> list[str]:
+        return sorted(name[:-len(".parquet")] for name in os.listdir(folder)
+                      if name.endswith(".parquet") and start <= name[:-len(".parquet")] <= end)
+
+    @staticmethod
+    def _write(df: pd.DataFrame, path: str) -> None:
+        # Written next to its final name first, so readers never see half a partition
+        df.to_parquet(path + ".tmp", index=False, compression="zstd")
+        os.replace(path + ".tmp", path)
+
+    def _read_live(self, day: str, files: list[str]) -> pd.DataFrame:
+        return messages_frame((record for file in sorted(files)
+                               for record in iter_messages(file)), day)
+
+    def roll_up(self) -> list[str]:
+        """
+        Rolls every completed day that has no partitions yet, and returns those days.
+        """
+        today = today_str()
+        done = set(self._partition_days(self.daily_dir))
+        days = sorted(day for day in self.log_days().items()
+                      if day[0] < today and day[0] not in done)
+        for day, files in days:
+            messages = self._read_live(day, files)
+            self._write(messages, os.path.join(
+                self.messages_dir, day + ".parquet"))
+            # The daily summary goes last: it marks the day as rolled up
+            self._write(summarize(messages), os.path.join(
+                self.daily_dir, day + ".parquet"))
+
+        if len(days) > 0:
+            self.logger.msg = "Rolled up %s day(s) of message logs." % len(
+                days)
+            self.logger.info(extra_msg="From %s to %s" %
+                             (days[0][0], days[-1][0]))
+        return [day for day, _ in days]
+
+    def _read(self, folder: str, days: list[str]) -> list[pd.DataFrame]:
+        return [pd.read_parquet(os.path.join(folder, day + ".parquet")) for day in days]
+
+    def _live(self, start: str, end: str) -> pd.DataFrame | None:
+        """
+        Today's messages, if today is within the range and has a log yet.
+        """
+        today = today_str()
+        files = self.log_days().get(today, None)
+        if not files or not start <= today <= end:
+            return None
+        return self._read_live(today, files)
+
+    @staticmethod
+    def _concat(frames: list[pd.DataFrame], vendor_id: str = None) -> pd.DataFrame:
+        frames = [frame for frame in frames if frame is not None]
+        if len(frames) == 0:
+            return pd.DataFrame(columns=["date"] + MESSAGE_COLUMNS)
+        df = pd.concat(frames, ignore_index=True)
+        return df[df["vendor_id"] == vendor_id].reset_index(drop=True) if vendor_id else df
+
+    def messages(self, start: str = "", end: str = "9999-99-99", vendor_id: str = None) -> pd.DataFrame:
+        """
+        Messages between `start` and `end` (inclusive), optionally of one vendor only.
+        """
+        return self._concat(self._read(self.messages_dir, self._partition_days(self.messages_dir, start, end)) +
+                            [self._live(start, end)], vendor_id)
+
+    def daily(self, start: str = "", end: str = "9999-99-99", vendor_id: str = None) -> pd.DataFrame:
+        """
+        Per-day, per-vendor counts and answering time percentiles between `start` and `end`.
+        """
+        live = self._live(start, end)
+        return self._concat(self._read(self.daily_dir, self._partition_days(self.daily_dir, start, end)) +
+                            [summarize(live) if live is not None else None], vendor_id)
+
+    def tail(self, num: int, vendor_id: str = None) -> pd.DataFrame:
+        """
+        The latest `num` messages, reading partitions from the newest one back
+        only until there are enough.
+        """
+        frames = [self._concat([self._live("", "9999-99-99")], vendor_id)]
+        rows = len(frames[0])
+        for day in reversed(self._partition_days(self.messages_dir)):
+            if rows >= num:
+                break
+            frames.insert(0, self._concat(
+                self._read(self.messages_dir, [day]), vendor_id))
+            rows += len(frames[0])
+        return self._concat(frames).tail(num).reset_index(drop=True)
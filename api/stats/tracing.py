@@ -0,0 +1,162 @@
+"""
+Module holding the request tracing of the API project.\n
+Every request gets a correlation id (the `X-Request-ID` header, generated when
+missing and returned on the response). A share of the requests
+(`TRACE_SAMPLE_RATE`) is traced: every `span()` opened while handling it
+(stages, Elasticsearch requests, LLM and embedding calls) is recorded with its
+parent span, start and duration.\n
+When the request ends its spans are appended, one JSON line each, to
+`TRACE_DIR/<date>.jsonl` by a background writer (see `errors.message_log`), so
+no external collector is needed. The `parent_id` links rebuild the call tree,
+e.g. for a flamegraph.\n
+Spans are kept in a `ContextVar`: work handed to a thread pool only belongs to
+the request if it is submitted through `in_context()`.
+"""
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Iterator
+
+from errors.message_log import MessageLogWriter
+from settings.settings import TRACE_DIR, TRACE_SAMPLE_RATE
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    sampled: bool
+    spans: list[dict] = field(default_factory=list)
+    exported: bool = False
+
+
+@dataclass
+class Span:
+    trace: Trace
+    name: str
+    parent_id: str | None
+    attrs: dict[str, Any]
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    start: float = field(default_factory=time.time)
+    events: list[dict] = field(default_factory=list)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def event(self, name: str, **attrs) -> None:
+        """
+        Records something that happened within the span, e.g. a retried attempt.
+        """
+        self.events.append(
+            {"name": name, "offset": round(time.time() - self.start, 6), **attrs})
+
+
+current_trace: ContextVar[Trace | None] = ContextVar("trace", default=None)
+current_span: ContextVar[Span | None] = ContextVar("span", default=None)
+
+_exporter: MessageLogWriter | None = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> MessageLogWriter:
+    """
+    Returns the process-wide writer of `TRACE_DIR` (started on first use).
+    """
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = MessageLogWriter(log_dir=TRACE_DIR)
+        return _exporter
+
+
+@contextmanager
+def start_trace(name: str, trace_id: str = None, sample_rate: float = TRACE_SAMPLE_RATE, **attrs) -> Iterator[Trace]:
+    """
+    Starts the trace of a request (with its root span `name`) and exports it
+    when the `with` block ends.
+    """
+    trace = Trace(trace_id or uuid.uuid4().hex,
+                  random.random() < sample_rate)
+    token = current_trace.set(trace)
+    try:
+        with span(name, **attrs):
+            yield trace
+    finally:
+        current_trace.reset(token)
+        if trace.sampled:
+            trace.exported = True
+            exporter = get_exporter()
+            for record in trace.spans:
+                exporter.write(record)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span | None]:
+    """
+    Records the `with` block as a span of the current trace (also when it
+    raises). Yields `None`, and costs next to nothing, when the request is not
+    sampled.
+    """
+    trace = current_trace.get()
+    if trace is None or not trace.sampled:
+        yield None
+        return
+
+    parent = current_span.get()
+    current = Span(trace, name, parent.span_id if parent else None, attrs)
+    token = current_span.set(current)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as err:
+        error = "%s: %s" % (type(err).__name__, err)
+        raise
+    finally:
+        current_span.reset(token)
+        record = {
+            "trace_id": trace.trace_id,
+            "span_id": current.span_id,
+            "parent_id": current.parent_id,
+            "name": name,
+            "start": round(current.start, 6),
+            "duration": round(time.perf_counter() - started, 6),
+            "thread": threading.current_thread().name,
+            "attrs": current.attrs,
+            "events": current.events,
+            "error": error
+        }
+        # Spans of work outliving its request (e.g. a timed out agent) are exported alone
+        if trace.exported:
+            get_exporter().write(record)
+        else:
+            trace.spans.append(record)
+
+
+def add_event(name: str, **attrs) -> None:
+    """
+    Adds an event to the current span, if any.
+    """
+    current = current_span.get()
+    if current is not None:
+        current.event(name, **attrs)
+
+
+def trace_id() -> str:
+    """
+    Correlation id of the current request ("" outside of requests).
+    """
+    trace = current_trace.get()
+    return trace.trace_id if trace else ""
+
+
+def in_context(func: Callable) -> Callable:
+    """
+    Binds `func` to the current context (trace, span, endpoint, ...), to be run
+    in another thread, e.g. `pool.submit(in_context(func), *args)`.
+    """
+    return partial(copy_context().run, func)
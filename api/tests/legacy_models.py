@@ -0,0 +1,15 @@
+"""
+`es.elastic` (the legacy API client) still imports request models that
+`params.definitions` no longer defines. Importing this module first adds plain
+stand-ins for them, so that `es.elastic` can be imported by the tests.
+"""
+from types import SimpleNamespace
+
+from params import definitions
+
+LEGACY_MODELS = ["ElasticDoc", "SearchDocTimeRange", "SearchDocument",
+                 "DocID_Must", "SearchPhraseDoc", "SearchGPT"]
+
+for name in LEGACY_MODELS:
+    if not hasattr(definitions, name):
+        setattr(definitions, name, type(name, (SimpleNamespace,), {}))
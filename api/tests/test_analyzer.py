@@ -0,0 +1,55 @@
+from api.es import analyzer
+from api.es.analyzer import AnalyzerClient
+
+
+def make_client(monkeypatch) -> AnalyzerClient:
+    """
+    `AnalyzerClient` whose `_post` splits on spaces like Elasticsearch would
+    (offsets of a text array continue with a gap of 1 between texts);
+    `client.batches` holds every posted batch.
+    """
+    client = AnalyzerClient()
+    client.batches = []
+
+    def post(name, texts):
+        client.batches.append(texts)
+        tokens = []
+        offset = 0
+        for text in texts:
+            position = 0
+            for word in text.split(" "):
+                if word:
+                    tokens.append({"token": word.lower(),
+                                   "start_offset": offset + analyzer._java_length(text[:position])})
+                position += len(word) + 1
+            offset += analyzer._java_length(text) + 1
+        return tokens
+
+    monkeypatch.setattr(client, "_post", post)
+    return client
+
+
+def test_tokens_are_assigned_to_their_texts(monkeypatch):
+    client = make_client(monkeypatch)
+    texts = ["Hello world", "", "😀 emoji text", "last one"]
+
+    assert client.analyze_batch(texts) == [{"hello", "world"}, set(),
+                                           {"😀", "emoji", "text"}, {"last", "one"}]
+    assert len(client.batches) == 1
+
+
+def test_cached_and_repeated_texts_are_not_sent(monkeypatch):
+    client = make_client(monkeypatch)
+    client.analyze_batch(["one two"])
+
+    assert client.analyze_batch(["one two", "three", "three"]) == [
+        {"one", "two"}, {"three"}, {"three"}]
+    assert client.batches == [["one two"], ["three"]]
+
+
+def test_texts_are_sent_in_batches(monkeypatch):
+    monkeypatch.setattr(analyzer, "ANALYZER_BATCH_TEXTS", 2)
+    client = make_client(monkeypatch)
+
+    assert client.analyze_batch(["a", "b", "c"]) == [{"a"}, {"b"}, {"c"}]
+    assert client.batches == [["a", "b"], ["c"]]
@@ -0,0 +1,99 @@
+import pytest
+
+from api.es import answer_selector, ANSWER_ACCEPT_SCORE, ANSWER_REJECT_SCORE, ANSWER_MARGIN, ANSWER_CALIBRATION_MIN_SAMPLES
+from api.es.answer_selector import calibrate, decide
+
+VENDOR = "test-vendor"
+DEFAULTS = {"accept": ANSWER_ACCEPT_SCORE,
+            "reject": ANSWER_REJECT_SCORE, "margin": ANSWER_MARGIN}
+
+
+@pytest.fixture
+def thresholds(monkeypatch):
+    monkeypatch.setattr(answer_selector, "ANSWER_AUDIT_RATE", 0.0)
+    monkeypatch.setattr(answer_selector, "_thresholds", {
+        VENDOR: {"accept": 0.9, "reject": 0.5, "margin": 0.05}})
+
+
+def verdicts(tops: list[float], choice: int, margin: float = 0.05) -> list[dict]:
+    return [{"scores": [top, top - margin], "choice": choice} for top in tops]
+
+
+def test_no_hits_are_rejected(thresholds):
+    assert decide(VENDOR, []) == "reject"
+
+
+@pytest.mark.parametrize("scores, decision", [
+    ([0.95, 0.8], "accept"),
+    ([0.95], "accept"),
+    ([0.92, 0.85], "accept"),
+    ([0.95, 0.93], "judge"),
+    ([0.89, 0.5], "judge"),
+    ([0.5, 0.1], "judge"),
+    ([0.49, 0.1], "reject"),
+])
+def test_decisions(thresholds, scores, decision):
+    assert decide(VENDOR, scores) == decision
+
+
+def test_audits_send_decisive_cases_to_the_judge(thresholds, monkeypatch):
+    monkeypatch.setattr(answer_selector, "ANSWER_AUDIT_RATE", 1.0)
+
+    assert decide(VENDOR, [0.95, 0.8]) == "judge"
+    assert decide(VENDOR, [0.1]) == "judge"
+
+
+def test_calibration_needs_enough_samples():
+    tops = [0.99 - 0.001 * i for i in range(ANSWER_CALIBRATION_MIN_SAMPLES - 1)]
+
+    assert calibrate(verdicts(tops, 0)) == DEFAULTS
+
+
+def test_accept_moves_down_while_the_judge_agrees():
+    tops = [0.99 - 0.001 * i for i in range(40)]
+
+    assert calibrate(verdicts(tops, 0))["accept"] == pytest.approx(min(tops))
+
+
+def test_accept_ignores_verdicts_without_margin():
+    tops = [0.99 - 0.001 * i for i in range(40)]
+
+    assert calibrate(verdicts(tops, 0, margin=0.0))[
+        "accept"] == ANSWER_ACCEPT_SCORE
+
+
+def test_wrong_best_answer_keeps_the_default():
+    tops = [0.99 - 0.001 * i for i in range(40)]
+    samples = verdicts([0.999], -1) + verdicts(tops, 0)
+
+    assert calibrate(samples)["accept"] == ANSWER_ACCEPT_SCORE
+
+
+def test_reject_moves_up_and_stays_below_accept():
+    low = [0.5 + 0.001 * i for i in range(40)]
+    assert calibrate(verdicts(low, -1))["reject"] == pytest.approx(max(low))
+
+    high = [0.9 + 0.002 * i for i in range(40)]
+    thresholds = calibrate(verdicts(high, -1))
+    assert thresholds["reject"] == thresholds["accept"] == ANSWER_ACCEPT_SCORE
+
+
+def test_verdicts_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_selector, "ANSWER_LOG_DIR", str(tmp_path))
+    for choice in [0, -1, 1]:
+        answer_selector.record_verdict(VENDOR, [0.9, 0.8], choice)
+
+    loaded = answer_selector.load_verdicts(VENDOR, window=2)
+    assert [verdict["choice"] for verdict in loaded] == [-1, 1]
+    assert loaded[0]["scores"] == [0.9, 0.8]
+    assert answer_selector.load_verdicts("unknown-vendor") == []
+
+
+def test_failed_calibration_uses_defaults(monkeypatch):
+    def broken(vendor_id):
+        raise ValueError("broken log")
+
+    monkeypatch.setattr(answer_selector, "_thresholds", {})
+    monkeypatch.setattr(answer_selector, "load_verdicts", broken)
+
+    assert answer_selector.get_thresholds(VENDOR) == DEFAULTS
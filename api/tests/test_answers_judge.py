@@ -0,0 +1,67 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from langchain.chat_models import ChatOpenAI
+from langchain.memory import ConversationBufferWindowMemory
+from langchain.schema import Document
+
+# Required by 'Settings' (read when 'lc_service' is imported); never used here
+for key in ["OPENAI_API_KEY", "OPENAI_API_KEY2", "SERPAPI_API_KEY"]:
+    os.environ.setdefault(key, "test")
+
+from api.es import lc_service  # noqa: E402
+from api.es.lc_service import LingtelliElastic2  # noqa: E402
+# 'lc_service' imports these through the top-level 'es' package
+from es import llm_cache  # noqa: E402
+from es.llm_gateway import get_gateway  # noqa: E402
+
+VENDOR = "test-vendor"
+
+
+class FakeAnswers(object):
+    """
+    `answers_` index with two answers that are too close to call without the judge.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def similarity_search_with_score(self, query):
+        return [(Document(page_content="Open from 9 to 5."), 0.9),
+                (Document(page_content="Closed on Sundays."), 0.89)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(lc_service, "LingtelliVectorStore", FakeAnswers)
+    monkeypatch.setattr(lc_service, "index_embeddings", lambda *args: None)
+    monkeypatch.setattr(lc_service, "decide", lambda *args: "judge")
+    # Breakers opened here must not outlive the test
+    monkeypatch.setattr(get_gateway(), "gates", {})
+
+    client = LingtelliElastic2.__new__(LingtelliElastic2)
+    client.logger = lc_service.ElasticError(__file__, "test_answers_judge")
+    client.language = "EN"
+    client.degraded = False
+    client.indices = SimpleNamespace(
+        exists=lambda index: SimpleNamespace(body=True))
+    return client
+
+
+def test_open_breaker_skips_the_judge(client, monkeypatch):
+    gate = get_gateway().gate(lc_service.get_chat_model().model_name)
+    gate._open()
+
+    def judge(*args, **kwargs):
+        raise AssertionError("the judge must NOT be called")
+    # The real completion is what the open breaker must stop
+    monkeypatch.setattr(ChatOpenAI, "_generate", judge)
+
+    gpt_obj = SimpleNamespace(vendor_id=VENDOR, query="When are you open?")
+    memory = ConversationBufferWindowMemory(
+        k=3, return_messages=True, memory_key="chat_history")
+
+    assert client.embed_search_answers(gpt_obj, memory) == ""
+    assert memory.chat_memory.messages == []
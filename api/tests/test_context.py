@@ -0,0 +1,57 @@
+import pytest
+
+from api.tests import legacy_models  # noqa: F401 (before 'es.elastic')
+from api.es import elastic, MAX_CONTEXT_LENGTH, MIN_DOC_SCORE
+from api.es.elastic import LingtelliElastic
+
+
+def hit(score: float, context: str) -> dict:
+    return {"score": score, "source": {"context": context}}
+
+
+@pytest.fixture
+def client():
+    client = LingtelliElastic.__new__(LingtelliElastic)
+    client.logger = elastic.ElasticError(__file__, "test_context")
+    client.gpt3_strict = False
+    return client
+
+
+def test_scores_are_normalized_by_length(client):
+    context, scores = client._select_context(
+        [hit(6, "a" * 10), hit(8, "b" * 30)])
+
+    # Average length 20: 6 * 20 / 10 and 8 * 20 / 30
+    assert scores.tolist() == [12.0, 5.33]
+    assert context == "a" * 10 + "b" * 30
+
+
+def test_low_scores_are_dropped(client):
+    context, scores = client._select_context(
+        [hit(MIN_DOC_SCORE, "kept"), hit(MIN_DOC_SCORE - 1, "gone")])
+
+    assert context == "kept"
+    assert scores.tolist() == [MIN_DOC_SCORE]
+
+
+def test_best_documents_are_selected_up_to_the_maximum_length(client):
+    half = MAX_CONTEXT_LENGTH // 2
+    context, scores = client._select_context(
+        [hit(6, "a" * half), hit(9, "b" * half), hit(7, "c" * half), hit(7, "d" * half)])
+
+    # Ties keep the ES order
+    assert context == "b" * half + "c" * half
+    assert scores.tolist() == [9, 7]
+
+
+def test_quotes_are_removed_from_the_context(client):
+    context, _ = client._select_context([hit(6, 'say "hi"')])
+    assert context == "say hi"
+
+
+def test_high_scores_make_gpt3_strict(client):
+    client._select_context([hit(6, "a")])
+    assert not client.gpt3_strict
+
+    client._select_context([hit(11, "a")])
+    assert client.gpt3_strict
@@ -0,0 +1,185 @@
+import threading
+import time
+
+import pytest
+
+from api.es import llm_gateway, LLM_BREAKER_WINDOW, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MAX_TOKENS
+from api.es.llm_gateway import BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, CircuitOpenError, LLMGateway, ModelGate, hedgeable
+
+MODEL = "test-model"
+
+
+@pytest.fixture
+def gateway():
+    gateway = LLMGateway(workers=8)
+    yield gateway
+    gateway.pool.shutdown(wait=False)
+
+
+def open_breaker(gate: ModelGate) -> None:
+    for _ in range(LLM_BREAKER_WINDOW // 2):
+        gate.record(False, 1.0)
+
+
+def test_breaker_opens_on_errors_and_rejects_calls(gateway):
+    gate = gateway.gate(MODEL)
+    gate.record(True, 1.0)
+    open_breaker(gate)
+    assert gate.state == BREAKER_OPEN
+
+    with pytest.raises(CircuitOpenError):
+        gateway.call(MODEL, lambda: "never called")
+
+
+def test_successes_keep_the_breaker_closed():
+    gate = ModelGate(MODEL, 2)
+    for _ in range(LLM_BREAKER_WINDOW):
+        gate.record(True, 1.0)
+    gate.record(False, 1.0)
+
+    assert gate.state == BREAKER_CLOSED
+    assert gate.allow()
+
+
+def test_half_open_allows_one_trial_that_closes_the_breaker():
+    gate = ModelGate(MODEL, 2)
+    open_breaker(gate)
+    gate.opened_at -= llm_gateway.LLM_BREAKER_COOLDOWN
+
+    assert gate.allow()
+    assert gate.state == BREAKER_HALF_OPEN
+    assert not gate.allow()
+
+    gate.record(True, 1.0)
+    assert gate.state == BREAKER_CLOSED
+    assert gate.allow()
+
+
+def test_failed_trial_opens_the_breaker_again():
+    gate = ModelGate(MODEL, 2)
+    open_breaker(gate)
+    gate.opened_at -= llm_gateway.LLM_BREAKER_COOLDOWN
+
+    assert gate.allow()
+    gate.record(False, 1.0)
+    assert gate.state == BREAKER_OPEN
+    assert not gate.allow()
+
+
+def test_queue_timeouts_are_not_model_failures(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_QUEUE_TIMEOUT", 0.01)
+    gate = ModelGate(MODEL, 1)
+    gate.slots.acquire()
+
+    for _ in range(LLM_BREAKER_WINDOW):
+        with pytest.raises(llm_gateway.ElasticError):
+            gate.acquire()
+
+    assert gate.state == BREAKER_CLOSED
+    assert len(gate.outcomes) == 0
+
+
+def test_queue_timeout_of_the_trial_lets_another_call_try(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_QUEUE_TIMEOUT", 0.01)
+    gate = ModelGate(MODEL, 1)
+    open_breaker(gate)
+    gate.opened_at -= llm_gateway.LLM_BREAKER_COOLDOWN
+    assert gate.allow()
+
+    gate.slots.acquire()
+    with pytest.raises(llm_gateway.ElasticError):
+        gate.acquire()
+    gate.slots.release()
+
+    assert gate.allow()
+    gate.acquire()
+    assert gate.run(lambda: "trial", (), {}) == "trial"
+    assert gate.state == BREAKER_CLOSED
+
+
+def test_only_short_calls_are_hedgeable():
+    assert hedgeable(LLM_HEDGE_MAX_TOKENS)
+    assert not hedgeable(LLM_HEDGE_MAX_TOKENS + 1)
+    assert not hedgeable(None)
+
+
+def test_hedge_delay_only_uses_hedgeable_latencies():
+    gate = ModelGate(MODEL, 2)
+    for _ in range(LLM_HEDGE_MIN_SAMPLES):
+        gate.acquire()
+        gate.run(lambda: "long", (), {}, hedge=False)
+    assert gate.hedge_delay() is None
+
+    for _ in range(LLM_HEDGE_MIN_SAMPLES):
+        gate.record(True, 0.5, hedge=True)
+    assert gate.hedge_delay() == 0.5
+
+
+def slow_first_call():
+    """
+    Function whose first call hangs (until released) and later calls return at once.
+    """
+    calls = []
+    release = threading.Event()
+
+    def func(text):
+        calls.append(text)
+        if len(calls) == 1:
+            release.wait(timeout=5)
+            return "primary " + text
+        return "hedge " + text
+    return func, calls, release
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins(gateway):
+    gate = gateway.gate(MODEL)
+    for _ in range(LLM_HEDGE_MIN_SAMPLES):
+        gate.record(True, 0.01, hedge=True)
+    func, calls, release = slow_first_call()
+
+    assert gateway.call(MODEL, func, "text") == "hedge text"
+    assert len(calls) == 2
+    release.set()
+
+
+def test_calls_are_not_hedged_when_told_not_to(gateway):
+    gate = gateway.gate(MODEL)
+    for _ in range(LLM_HEDGE_MIN_SAMPLES):
+        gate.record(True, 0.01, hedge=True)
+    func, calls, release = slow_first_call()
+    threading.Timer(0.1, release.set).start()
+
+    assert gateway.call(MODEL, func, "text", hedge=False) == "primary text"
+    assert len(calls) == 1
+
+
+def test_calls_are_not_hedged_without_enough_samples(gateway):
+    func, calls, release = slow_first_call()
+    threading.Timer(0.1, release.set).start()
+
+    assert gateway.call(MODEL, func, "text") == "primary text"
+    assert len(calls) == 1
+
+
+def test_saturated_model_does_not_hold_up_other_models():
+    gateway = LLMGateway(workers=3)
+    slow = gateway.gates["slow-model"] = ModelGate("slow-model", 2)
+    release = threading.Event()
+    # Two calls take both slots, the others queue for one in their own threads
+    callers = [threading.Thread(target=gateway.call, args=("slow-model", release.wait, 5), kwargs={"hedge": False})
+               for _ in range(4)]
+    for caller in callers:
+        caller.start()
+    while slow.slots._value > 0:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    threading.Timer(2, release.set).start()
+    try:
+        assert gateway.call(MODEL, lambda: "other", hedge=False) == "other"
+        assert not release.is_set()
+    finally:
+        release.set()
+        for caller in callers:
+            caller.join()
+        gateway.pool.shutdown(wait=False)
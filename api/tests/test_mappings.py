@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from api.tests import legacy_models  # noqa: F401 (before 'es.elastic')
+from api.es import elastic
+from api.es.elastic import LingtelliElastic
+
+MAPPINGS = {
+    "test-vendor": {"mappings": {"_meta": {"main_field": "content"}}},
+    "test-vendor-qa": {"mappings": {"properties": {"a": {"type": "text"}}}},
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    `LingtelliElastic` without a connection, with empty mapping caches;
+    `client.requests` holds the `index` argument of every `get_mapping` call.
+    """
+    monkeypatch.setattr(elastic, "_known_indices", None)
+    monkeypatch.setattr(elastic, "_known_indices_expire", 0.0)
+    monkeypatch.setattr(elastic, "_missing_indices", {})
+
+    client = LingtelliElastic.__new__(LingtelliElastic)
+    client.logger = elastic.ElasticError(__file__, "test_mappings")
+    client.requests = []
+
+    def get_mapping(index, **kwargs):
+        client.requests.append(index)
+        names = MAPPINGS if index == elastic.LEGACY_INDEX_PATTERNS else index
+        return SimpleNamespace(body={name: MAPPINGS[name] for name in names if name in MAPPINGS})
+
+    monkeypatch.setattr(client, "indices", SimpleNamespace(
+        get_mapping=get_mapping), raising=False)
+    return client
+
+
+def test_mappings_are_cached(client):
+    client._get_mappings()
+    client._get_mappings()
+
+    assert len(client.requests) == 1
+    assert client.known_indices == {"test-vendor": {"context": "content"},
+                                    "test-vendor-qa": {"context": "a"}}
+
+
+def test_unknown_indices_are_fetched_with_one_request(client):
+    client._resolve_mappings(["test-vendor", "test-vendor-qa", "test-vendor"])
+
+    assert client.requests == [["test-vendor", "test-vendor-qa"]]
+    assert set(client.known_indices) == {"test-vendor", "test-vendor-qa"}
+
+
+def test_missing_indices_are_not_fetched_again(client):
+    client._resolve_mappings(["test-vendor", "no-such-index"])
+    client._resolve_mappings(["test-vendor", "no-such-index"])
+
+    assert client.requests == [["test-vendor", "no-such-index"]]
+    assert "no-such-index" not in client.known_indices
+
+
+def test_full_refresh_forgets_missing_indices(client):
+    client._resolve_mappings(["no-such-index"])
+    client._get_mappings()
+    client._resolve_mappings(["no-such-index"])
+
+    assert client.requests[-1] == ["no-such-index"]
+    assert len(client.requests) == 3
@@ -0,0 +1,149 @@
+from types import SimpleNamespace
+
+import pytest
+
+from api.tests import legacy_models  # noqa: F401 (before 'es.elastic')
+from api.es import elastic, MIN_QA_DOC_SCORE
+from api.es.elastic import LingtelliElastic
+
+QA_INDEX = "test-vendor-qa"
+CONTENT_INDEX = "test-vendor"
+
+
+def hit(score: float, source: dict, id: str = "1") -> dict:
+    return {"_index": CONTENT_INDEX, "_id": id, "_score": score, "_source": source}
+
+
+def response(hits: list, total: int = 1) -> dict:
+    return {"_shards": {"total": total}, "hits": {"hits": hits}}
+
+
+def make_client(monkeypatch, responses: list) -> LingtelliElastic:
+    """
+    `LingtelliElastic` without a connection: `msearch` returns `responses`
+    and the mappings of both test indices are cached.
+    """
+    client = LingtelliElastic.__new__(LingtelliElastic)
+    client.logger = elastic.ElasticError(__file__, "test_msearch")
+    client.search_size = 20
+    client.docs_found = True
+    client.searches = []
+    client.created = []
+
+    def msearch(searches):
+        client.searches.append(searches)
+        return {"responses": responses}
+
+    monkeypatch.setattr(elastic, "_known_indices", {
+        QA_INDEX: {"context": "a"}, CONTENT_INDEX: {"context": "content"}})
+    monkeypatch.setattr(elastic, "_missing_indices", {})
+    monkeypatch.setattr(client, "msearch", msearch, raising=False)
+    monkeypatch.setattr(client, "_get_query", lambda doc: {
+                        "match": {"q": {"query": "question"}}})
+    monkeypatch.setattr(client, "_create_qa_index",
+                        lambda doc: client.created.append(doc.vendor_id))
+    return client
+
+
+def make_docs():
+    qa_doc = SimpleNamespace(vendor_id=QA_INDEX, match=SimpleNamespace(
+        name="q", search_term="question"))
+    doc = SimpleNamespace(vendor_id=CONTENT_INDEX)
+    return doc, qa_doc
+
+
+def test_msearch_is_one_request_with_three_searches(monkeypatch):
+    client = make_client(monkeypatch, [response([]), response([]), response(
+        [hit(5, {"content": "one"}), hit(4, {"content": "two"}, "2")])])
+    client.search_qa_content(*make_docs())
+
+    assert len(client.searches) == 1
+    searches = client.searches[0]
+    assert [header["index"] for header in searches[::2]] == [
+        QA_INDEX, QA_INDEX, CONTENT_INDEX]
+    assert all(header["ignore_unavailable"] for header in searches[::2])
+    assert searches[3]["query"]["match"]["q"]["minimum_should_match"] == "100%"
+    assert searches[5]["size"] == 20
+
+
+def test_confident_phrase_answer_wins(monkeypatch):
+    client = make_client(monkeypatch, [
+        response([hit(MIN_QA_DOC_SCORE, {"a": "phrase answer"})]),
+        response([hit(MIN_QA_DOC_SCORE + 1, {"a": "match answer"})]),
+        response([hit(5, {"content": "context"})])])
+
+    assert client.search_qa_content(
+        *make_docs()) == ("phrase answer", None)
+
+
+def test_confident_match_answer_after_unconfident_phrase(monkeypatch):
+    client = make_client(monkeypatch, [
+        response([hit(MIN_QA_DOC_SCORE - 0.1, {"a": "phrase answer"})]),
+        response([hit(MIN_QA_DOC_SCORE, {"a": "match answer"})]),
+        response([hit(5, {"content": "context"})])])
+
+    assert client.search_qa_content(*make_docs()) == ("match answer", None)
+
+
+def test_qa_errors_are_skipped(monkeypatch):
+    client = make_client(monkeypatch, [
+        {"error": {"type": "search_phase_execution_exception"}},
+        response([hit(MIN_QA_DOC_SCORE, {"a": "match answer"})]),
+        response([])])
+
+    assert client.search_qa_content(*make_docs()) == ("match answer", None)
+
+
+def test_content_hits_without_confident_answer(monkeypatch):
+    client = make_client(monkeypatch, [
+        response([]),
+        response([hit(MIN_QA_DOC_SCORE - 0.1, {"a": "match answer"})]),
+        response([hit(5, {"content": "one"}), hit(4, {"content": "two"}, "2")])])
+
+    answer, hits = client.search_qa_content(*make_docs())
+    assert answer is None
+    assert [hit["source"]["context"] for hit in hits] == ["one", "two"]
+    assert client.created == []
+
+
+def test_missing_qa_index_is_created(monkeypatch):
+    client = make_client(monkeypatch, [
+        response([], total=0), response([], total=0), response([hit(5, {"content": "one"}), hit(4, {"content": "two"}, "2")])])
+
+    answer, _ = client.search_qa_content(*make_docs())
+    assert answer is None
+    assert client.created == [QA_INDEX]
+
+
+def test_content_error_raises(monkeypatch):
+    client = make_client(monkeypatch, [
+        response([]), response([]), {"error": {"type": "index_not_found_exception"}}])
+
+    with pytest.raises(elastic.ElasticError):
+        client.search_qa_content(*make_docs())
+
+
+def test_missing_content_index_raises(monkeypatch):
+    client = make_client(monkeypatch, [
+        response([]), response([]), response([], total=0)])
+
+    with pytest.raises(elastic.ElasticError):
+        client.search_qa_content(*make_docs())
+
+
+def test_mappings_are_resolved_in_one_request(monkeypatch):
+    client = make_client(monkeypatch, [response([]), response([]), response(
+        [hit(5, {"content": "one"}), hit(4, {"content": "two"}, "2")])])
+    monkeypatch.setattr(elastic, "_known_indices", {})
+    fetched = []
+
+    def get_mappings(index=None):
+        fetched.append(index)
+        elastic._known_indices = {QA_INDEX: {"context": "a"},
+                                  CONTENT_INDEX: {"context": "content"}}
+
+    monkeypatch.setattr(client, "_get_mappings", get_mappings)
+    client.search_qa_content(*make_docs())
+    client.search_qa_content(*make_docs())
+
+    assert fetched == [[QA_INDEX, CONTENT_INDEX]]
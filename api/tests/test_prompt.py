@@ -0,0 +1,118 @@
+import pytest
+from langchain.schema import AIMessage, HumanMessage
+
+from api.es import prompt, PROMPT_MIN_TRIM_TOKENS
+from api.es.prompt import CONTEXT_PLACEHOLDER, TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, PromptBuilder
+
+BUDGET = 300
+SYSTEM = "S" + CONTEXT_PLACEHOLDER
+QUESTION = "q" * 10
+# Budget left for history + context: budget - system - question - reply overhead
+REMAINING = BUDGET - (1 + TOKENS_PER_MESSAGE) - \
+    (10 + TOKENS_PER_MESSAGE) - TOKENS_PER_REPLY
+
+
+class CharEncoding(object):
+    """
+    One token per character, so that budgets can be computed by hand.
+    """
+
+    def encode(self, text: str) -> list[str]:
+        return list(text)
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    monkeypatch.setattr(prompt, "get_encoding",
+                        lambda model=None: CharEncoding())
+
+
+def make_history(turns: int, length: int = 20) -> list:
+    history = []
+    for turn in range(turns):
+        history.append(HumanMessage(content=str(turn) * length))
+        history.append(AIMessage(content=str(turn) * length))
+    return history
+
+
+def test_everything_fits():
+    builder = PromptBuilder(budget=BUDGET)
+    messages = builder.build(SYSTEM, QUESTION, [("a" * 10, 0.5)], make_history(1))
+
+    assert messages[0].content == "S" + "a" * 10
+    assert [message.content for message in messages[1:]] == [
+        "0" * 20, "0" * 20, QUESTION]
+    assert builder.breakdown["chunks_dropped"] == 0
+    assert builder.breakdown["messages_dropped"] == 0
+
+
+def test_chunks_are_kept_by_score():
+    builder = PromptBuilder(budget=BUDGET)
+    messages = builder.build(
+        SYSTEM, QUESTION, [("low", 0.1), ("high", 0.9), ("mid", 0.5)])
+
+    assert messages[0].content == "S" + "high\nmid\nlow"
+
+
+def test_last_chunk_is_trimmed_to_the_budget():
+    builder = PromptBuilder(budget=BUDGET)
+    messages = builder.build(
+        SYSTEM, QUESTION, [("a" * 100, 0.9), ("b" * 200, 0.5)])
+
+    # 'a' uses 101 tokens (newline included), the rest goes to the trimmed 'b'
+    assert messages[0].content == "S" + "a" * 100 + \
+        "\n" + "b" * (REMAINING - 101 - 1)
+    assert builder.breakdown["chunks_kept"] == 2
+    assert builder.breakdown["total"] == BUDGET
+
+
+def test_chunk_is_dropped_when_too_little_is_left():
+    builder = PromptBuilder(budget=BUDGET)
+    length = REMAINING - PROMPT_MIN_TRIM_TOKENS
+    messages = builder.build(
+        SYSTEM, QUESTION, [("a" * length, 0.9), ("b" * 100, 0.5)])
+
+    assert messages[0].content == "S" + "a" * length
+    assert builder.breakdown["chunks_kept"] == 1
+    assert builder.breakdown["chunks_dropped"] == 1
+    assert builder.breakdown["total"] <= BUDGET
+
+
+def test_history_keeps_newest_whole_turns_within_its_share():
+    builder = PromptBuilder(budget=BUDGET, history_share=0.3)
+    messages = builder.build(SYSTEM, QUESTION, [], make_history(3))
+
+    # One turn is 2 * (20 + 4) = 48 tokens; the share (30% of REMAINING) fits one
+    assert int(REMAINING * 0.3) < 96
+    assert [message.content for message in messages[1:-1]] == ["2" * 20] * 2
+    assert builder.breakdown["history"] == 48
+    assert builder.breakdown["messages_dropped"] == 4
+
+
+def test_unused_history_budget_goes_to_the_context():
+    builder = PromptBuilder(budget=BUDGET, history_share=0.3)
+    length = REMAINING - 48 - 1
+    builder.build(SYSTEM, QUESTION, [("a" * length, 0.9)], make_history(1))
+
+    assert builder.breakdown["chunks_kept"] == 1
+    assert builder.breakdown["context"] == length + 1
+    assert builder.breakdown["total"] == BUDGET
+
+
+def test_empty_context():
+    builder = PromptBuilder(budget=BUDGET)
+    messages = builder.build(SYSTEM, QUESTION, [], empty_context="none")
+
+    assert messages[0].content == "Snone"
+    assert builder.breakdown["context"] == 0
+
+
+def test_never_exceeds_the_budget():
+    builder = PromptBuilder(budget=BUDGET)
+    chunks = [(str(i) * (37 * i + 5), 1 / (i + 1)) for i in range(10)]
+    builder.build(SYSTEM, QUESTION, chunks, make_history(5))
+
+    assert builder.breakdown["total"] <= BUDGET
@@ -0,0 +1,47 @@
+import os
+
+from api.stats import COLUMN_NAMES
+from api.stats.counters import COUNTERS_VERSION, VERSION_FILE, StatsCounters
+
+OLD_ROWS = ["2023-05-31 10:00:00,a,True,False",
+            "2023-05-31 11:00:00,a,False,True",
+            "2023-06-01 09:00:00,b,False,True"]
+
+
+def make_counters(tmp_path, rows: list[str] = OLD_ROWS) -> StatsCounters:
+    stats_file = tmp_path / "stats.csv"
+    stats_file.write_text("\n".join([",".join(COLUMN_NAMES)] + rows) + "\n")
+    return StatsCounters(str(stats_file), str(tmp_path / "stats"))
+
+
+def test_rows_from_before_the_counters_are_counted_on_first_add(tmp_path):
+    counters = make_counters(tmp_path)
+    counters.add("2023-06-01 10:00:00,a,True,False", "a", True, False)
+
+    assert counters.totals() == {"a": [2, 1], "b": [0, 1]}
+    assert counters.daily("2023-05-31", "2023-06-01") == {
+        "a": [1, 1], "b": [0, 1]}
+
+
+def test_counters_are_only_rebuilt_once(tmp_path):
+    make_counters(tmp_path).totals()
+    # A new process: the version file marks the counters as complete
+    counters = StatsCounters(str(tmp_path / "stats.csv"),
+                             str(tmp_path / "stats"))
+    counters.add("2023-06-01 10:00:00,b,True,False", "b", True, False)
+    counters.add("2023-06-01 10:00:01,b,True,False", "b", True, False)
+
+    assert counters.totals() == {"a": [1, 1], "b": [2, 1]}
+    with open(os.path.join(tmp_path, "stats", VERSION_FILE)) as file:
+        assert file.read() == COUNTERS_VERSION
+
+
+def test_older_version_is_rebuilt(tmp_path):
+    counters = make_counters(tmp_path)
+    counters.totals()
+    (tmp_path / "stats" / "totals.json").write_text('{"a": [100, 100]}')
+    (tmp_path / "stats" / VERSION_FILE).write_text("0")
+
+    counters = StatsCounters(str(tmp_path / "stats.csv"),
+                             str(tmp_path / "stats"))
+    assert counters.totals() == {"a": [1, 1], "b": [0, 1]}
@@ -0,0 +1,47 @@
+import json
+
+import pandas as pd
+
+from api.stats.store import StatsStore, messages_frame, summarize
+
+DAY = "2023-06-01"
+RECORDS = [
+    {"vendor_id": "a", "Q": "q1", "A": "a1", "T": 2, "verified": True},
+    {"vendor_id": "a", "Q": "q2", "A": "a2", "T": 4},
+    # Records logged before the answering time was recorded
+    {"vendor_id": "a", "Q": "q3", "A": "a3"},
+    {"vendor_id": "b", "Q": "q4", "A": "a4", "T": None, "verified": False},
+]
+
+
+def test_records_without_time_are_kept():
+    df = messages_frame(RECORDS, DAY)
+
+    assert len(df) == 4
+    assert str(df["T"].dtype) == "Int64"
+    assert df["T"].isna().tolist() == [False, False, True, True]
+    assert (df["date"] == DAY).all()
+
+
+def test_summary_counts_every_message():
+    summary = summarize(messages_frame(RECORDS, DAY)).set_index("vendor_id")
+
+    assert summary.loc["a", "count"] == 3
+    assert summary.loc["a", "mean"] == 3
+    assert summary.loc["a", "min"] == 2
+    assert summary.loc["a", "max"] == 4
+    assert summary.loc["b", "count"] == 1
+    assert pd.isna(summary.loc["b", "mean"])
+
+
+def test_roll_up_with_records_without_time(tmp_path):
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    with open(log_dir / (DAY + ".jsonl"), "w", encoding="utf8") as log_file:
+        for record in RECORDS:
+            log_file.write(json.dumps(record) + "\n")
+    store = StatsStore(str(log_dir), str(tmp_path / "stats"))
+
+    assert store.roll_up() == [DAY]
+    assert len(store.messages(DAY, DAY)) == 4
+    assert store.daily(DAY, DAY, vendor_id="a")["count"].tolist() == [3]
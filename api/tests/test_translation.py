@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+from api.es import translation
+from api.es.translation import TranslationService
+
+
+class FakeModel(object):
+    """
+    Translations of `FakeModel`s are `cached_generate` calls that wait for `release`.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Semaphore(0)
+        self.release = {}
+        self.lock = threading.Lock()
+
+    def cached_generate(self, llm, messages, sampled=False, **overrides):
+        text = messages[-1].content.split("\n\n", 1)[1]
+        with self.lock:
+            self.calls.append((llm, text, sampled, overrides))
+            release = self.release.setdefault(text, threading.Event())
+        self.started.release()
+        assert release.wait(timeout=5)
+        if text == "broken":
+            raise ValueError("provider error")
+        return text.upper()
+
+    def finish(self, text: str) -> None:
+        with self.lock:
+            self.release.setdefault(text, threading.Event()).set()
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(translation, "cached_generate", model.cached_generate)
+    monkeypatch.setattr(translation, "get_chat_model",
+                        lambda temperature=0: "temperature=%s" % temperature)
+    return model
+
+
+def test_identical_texts_are_translated_once(model):
+    service = TranslationService(workers=4)
+    futures = [service.submit("en", "same") for _ in range(3)]
+    model.started.acquire(timeout=5)
+    model.finish("same")
+
+    assert [future.result(timeout=5) for future in futures] == ["SAME"] * 3
+    assert len(model.calls) == 1
+    assert service.pending == {}
+
+
+def test_same_text_of_another_kind_is_translated_separately(model):
+    service = TranslationService(workers=4)
+    model.finish("text")
+
+    assert service.translate("en", "text") == "TEXT"
+    assert service.translate("ch", "text") == "TEXT"
+    assert len(model.calls) == 2
+
+
+def test_futures_resolve_as_their_own_call_finishes(model):
+    service = TranslationService(workers=4)
+    slow = service.submit("en", "slow")
+    fast = service.submit("en", "fast")
+    for _ in range(2):
+        assert model.started.acquire(timeout=5)
+
+    model.finish("fast")
+    assert fast.result(timeout=5) == "FAST"
+    assert not slow.done()
+
+    model.finish("slow")
+    assert slow.result(timeout=5) == "SLOW"
+
+
+def test_translate_many_keeps_the_order(model):
+    service = TranslationService(workers=4)
+    texts = ["one", "two", "one", "three"]
+    for text in texts:
+        model.finish(text)
+
+    assert service.translate_many("en", texts) == ["ONE", "TWO", "ONE", "THREE"]
+
+
+def test_errors_reach_every_waiting_caller(model):
+    service = TranslationService(workers=4)
+    futures = [service.submit("en", "broken") for _ in range(2)]
+    model.started.acquire(timeout=5)
+    model.finish("broken")
+
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+    assert service.pending == {}
+
+
+def test_only_descriptions_are_cached_despite_their_temperature(model):
+    service = TranslationService(workers=4)
+    model.finish("summary")
+    model.finish("text")
+    service.translate("description", "summary")
+    service.translate("en", "text")
+
+    (llm, _, sampled, overrides), (en_llm, _, en_sampled, en_overrides) = model.calls
+    assert (llm, sampled, overrides) == (
+        "temperature=0.3", True, {"max_tokens": 600})
+    assert (en_llm, en_sampled, en_overrides) == ("temperature=0", False, {})
+
+
+def test_unknown_kind_is_rejected(model):
+    with pytest.raises(translation.ElasticError):
+        TranslationService().submit("fr", "text")
@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+
+from api.es import vectorstore, VECTOR_FIELD
+from api.es.vectorstore import LingtelliVectorStore, metadata_filter, plain_mapping, reindex_to_knn
+
+INDEX = "info_test-vendor_file_pdf"
+TEMP_INDEX = INDEX + "-knn-tmp"
+
+
+class FakeIndices(object):
+    def __init__(self, client: "FakeClient"):
+        self.client = client
+
+    def exists(self, index):
+        return SimpleNamespace(body=index in self.client.data)
+
+    def get_mapping(self, index):
+        return SimpleNamespace(body={index: {"mappings": self.client.data[index]["mappings"]}})
+
+    def create(self, index, mappings):
+        assert index not in self.client.data
+        self.client.data[index] = {
+            "mappings": mappings, "docs": [], "blocked": False}
+
+    def delete(self, index, ignore_unavailable=False):
+        if index not in self.client.data and ignore_unavailable:
+            return
+        del self.client.data[index]
+
+    def add_block(self, index, block):
+        self.client.data[index]["blocked"] = True
+
+    def put_settings(self, index, settings):
+        self.client.data[index]["blocked"] = bool(
+            settings["index.blocks.write"])
+
+
+class FakeClient(object):
+    """
+    Elasticsearch client holding its indices in memory; `lose` documents go
+    missing when copying into `lose_in`.
+    """
+
+    def __init__(self, docs: int = 10, lose: int = 0, lose_in: str = TEMP_INDEX):
+        self.data = {INDEX: {"mappings": plain_mapping(4), "docs": list(
+            range(docs)), "blocked": False}}
+        self.lose = lose
+        self.lose_in = lose_in
+        self.indices = FakeIndices(self)
+
+    def options(self, **kwargs):
+        return self
+
+    def count(self, index):
+        return {"count": len(self.data[index]["docs"])}
+
+    def reindex(self, source, dest, **kwargs):
+        docs = self.data[source["index"]]["docs"]
+        if dest["index"] == self.lose_in:
+            docs = docs[self.lose:]
+        self.data[dest["index"]]["docs"].extend(docs)
+
+
+def test_index_is_migrated(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setitem(vectorstore._vector_mappings, INDEX, {})
+
+    assert reindex_to_knn(client, INDEX)
+    assert list(client.data) == [INDEX]
+    assert client.data[INDEX]["docs"] == list(range(10))
+    assert client.data[INDEX]["mappings"]["properties"][VECTOR_FIELD]["index"]
+    assert INDEX not in vectorstore._vector_mappings
+
+
+def test_writes_are_blocked_while_copying():
+    client = FakeClient()
+    reindex = client.reindex
+    blocked = []
+
+    def checking_reindex(source, dest, **kwargs):
+        blocked.append(client.data[source["index"]]["blocked"])
+        reindex(source, dest, **kwargs)
+    client.reindex = checking_reindex
+
+    reindex_to_knn(client, INDEX)
+    assert blocked[0]
+
+
+def test_knn_index_is_skipped():
+    client = FakeClient()
+    assert reindex_to_knn(client, INDEX)
+
+    assert not reindex_to_knn(client, INDEX)
+    assert list(client.data) == [INDEX]
+
+
+def test_bad_copy_leaves_the_original_untouched():
+    client = FakeClient(lose=1)
+
+    with pytest.raises(vectorstore.ElasticError):
+        reindex_to_knn(client, INDEX)
+    assert list(client.data) == [INDEX]
+    assert client.data[INDEX]["docs"] == list(range(10))
+    assert not client.data[INDEX]["blocked"]
+    assert not client.data[INDEX]["mappings"]["properties"][VECTOR_FIELD].get(
+        "index", False)
+
+
+def test_bad_copy_back_keeps_the_temporary_index():
+    client = FakeClient(lose=1, lose_in=INDEX)
+
+    with pytest.raises(vectorstore.ElasticError):
+        reindex_to_knn(client, INDEX)
+    assert client.data[TEMP_INDEX]["docs"] == list(range(10))
+
+    # ... and refuses to run again until it is dealt with
+    with pytest.raises(vectorstore.ElasticError):
+        reindex_to_knn(client, INDEX)
+    assert client.data[TEMP_INDEX]["docs"] == list(range(10))
+
+
+def test_failed_copy_back_keeps_the_temporary_index():
+    client = FakeClient()
+    reindex = client.reindex
+
+    def failing_reindex(source, dest, **kwargs):
+        if dest["index"] == INDEX:
+            raise ConnectionError("connection lost")
+        reindex(source, dest, **kwargs)
+    client.reindex = failing_reindex
+
+    with pytest.raises(vectorstore.ElasticError):
+        reindex_to_knn(client, INDEX)
+    assert client.data[TEMP_INDEX]["docs"] == list(range(10))
+
+
+def test_metadata_filter_matches_every_pair():
+    assert metadata_filter(None) == []
+    assert metadata_filter({"source": "a.pdf", "page": 2}) == [
+        {"match": {"metadata.source.keyword": "a.pdf"}},
+        {"match": {"metadata.page.keyword": "2"}}]
+
+
+@pytest.mark.parametrize("knn", [True, False])
+def test_vector_search_is_filtered_on_metadata(monkeypatch, knn):
+    store = LingtelliVectorStore.__new__(LingtelliVectorStore)
+    monkeypatch.setattr(store, "_vector_mapping", lambda: {"index": knn})
+    monkeypatch.setattr(store, "_rescoring", lambda: False)
+
+    body = store._vector_body([0.1, 0.2], 4, filter={"source": "a.pdf"})
+    clauses = body["knn"]["filter"] if knn else \
+        body["query"]["script_score"]["query"]["bool"]["filter"]
+    assert clauses == [{"match": {"metadata.source.keyword": "a.pdf"}}]
+
+
+def test_bm25_search_is_filtered_on_metadata():
+    store = LingtelliVectorStore.__new__(LingtelliVectorStore)
+
+    assert "bool" not in store._bm25_body("hours", 4)["query"]
+    body = store._bm25_body("hours", 4, filter={"source": "a.pdf"})
+    assert body["query"]["bool"]["filter"] == [
+        {"match": {"metadata.source.keyword": "a.pdf"}}]